@@ -4,9 +4,14 @@ Supports OpenAI, Anthropic Claude, and custom API endpoints
 """
 import os
 import json
-from typing import Dict, Optional, List
+from typing import Dict, Iterator, Optional, List
 from dataclasses import dataclass, asdict
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 @dataclass
 class AIProviderConfig:
@@ -187,6 +192,28 @@ def prompt_for_ai_config() -> Optional[AIProviderConfig]:
     return config
 
 
+def _cached_system_prompt(system_prompt: str) -> List[Dict]:
+    """Anthropic system block marked for prompt caching (ignored below the size minimum)."""
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+
+def _response_format(config: AIProviderConfig, expect_json: bool,
+                     json_schema: Optional[Dict]) -> Optional[Dict]:
+    """OpenAI-style response_format; only OpenAI itself is sent a strict JSON schema."""
+    if not expect_json:
+        return None
+    if json_schema is not None and config.provider == 'openai':
+        return {"type": "json_schema", "json_schema": json_schema}
+    return {"type": "json_object"}
+
+
+def _loads_json(content: str) -> Dict:
+    """Parse a JSON response body, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
 def create_ai_client(config: AIProviderConfig):
     """Create appropriate AI client based on configuration."""
     if config.provider == 'anthropic':
@@ -209,13 +236,41 @@ def create_ai_client(config: AIProviderConfig):
             return None
 
 
+def create_async_ai_client(config: AIProviderConfig):
+    """Create the asyncio client matching create_ai_client()."""
+    if config.provider == 'anthropic':
+        try:
+            import anthropic
+            return anthropic.AsyncAnthropic(api_key=config.api_key)
+        except ImportError:
+            print("   Warning: anthropic package not installed. Run: pip install anthropic")
+            return None
+    else:
+        try:
+            from openai import AsyncOpenAI
+            client_kwargs = {'api_key': config.api_key}
+            if config.base_url:
+                client_kwargs['base_url'] = config.base_url
+            return AsyncOpenAI(**client_kwargs)
+        except ImportError:
+            print("   Warning: openai package not installed. Run: pip install openai")
+            return None
+
+
 def call_ai_with_config(
     config: AIProviderConfig,
     system_prompt: str,
     user_prompt: str,
-    expect_json: bool = True
+    expect_json: bool = True,
+    json_schema: Optional[Dict] = None
 ) -> Optional[Dict]:
-    """Call AI with the configured provider."""
+    """
+    Call AI with the configured provider.
+    
+    json_schema is an OpenAI json_schema object ({"name", "schema", "strict"})
+    that OpenAI enforces on the response; other providers ignore it, so the
+    expected structure must then be described in the prompt.
+    """
     client = create_ai_client(config)
     if not client:
         return None
@@ -227,14 +282,12 @@ def call_ai_with_config(
                 model=config.model,
                 max_tokens=config.max_tokens,
                 temperature=config.temperature,
-                system=system_prompt,
+                system=_cached_system_prompt(system_prompt),
                 messages=[{"role": "user", "content": user_prompt}]
             )
             content = message.content[0].text
         else:
             # OpenAI-compatible API
-            response_format = {"type": "json_object"} if expect_json else None
-            
             response = client.chat.completions.create(
                 model=config.model,
                 messages=[
@@ -243,12 +296,98 @@ def call_ai_with_config(
                 ],
                 temperature=config.temperature,
                 max_tokens=config.max_tokens,
-                response_format=response_format
+                response_format=_response_format(config, expect_json, json_schema)
+            )
+            content = response.choices[0].message.content
+        
+        if expect_json:
+            return _loads_json(content)
+        return {"content": content}
+        
+    except Exception as e:
+        print(f"   AI API error ({config.provider}): {e}")
+        return None
+
+
+def stream_ai_with_config(
+    config: AIProviderConfig,
+    system_prompt: str,
+    user_prompt: str,
+    json_schema: Optional[Dict] = None
+) -> Iterator[str]:
+    """
+    Stream the text of a JSON response from the configured provider as it is generated.
+    
+    Unlike call_ai_with_config(), API errors propagate: a stream that fails
+    halfway has already handed out part of the response.
+    """
+    client = create_ai_client(config)
+    if not client:
+        return
+    
+    if config.provider == 'anthropic':
+        with client.messages.stream(
+            model=config.model,
+            max_tokens=config.max_tokens,
+            temperature=config.temperature,
+            system=_cached_system_prompt(system_prompt),
+            messages=[{"role": "user", "content": user_prompt}]
+        ) as stream:
+            yield from stream.text_stream
+    else:
+        stream = client.chat.completions.create(
+            model=config.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=config.temperature,
+            max_tokens=config.max_tokens,
+            response_format=_response_format(config, True, json_schema),
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+async def acall_ai_with_config(
+    config: AIProviderConfig,
+    system_prompt: str,
+    user_prompt: str,
+    expect_json: bool = True,
+    json_schema: Optional[Dict] = None
+) -> Optional[Dict]:
+    """Async variant of call_ai_with_config(), for running many calls concurrently."""
+    client = create_async_ai_client(config)
+    if not client:
+        return None
+    
+    try:
+        if config.provider == 'anthropic':
+            message = await client.messages.create(
+                model=config.model,
+                max_tokens=config.max_tokens,
+                temperature=config.temperature,
+                system=_cached_system_prompt(system_prompt),
+                messages=[{"role": "user", "content": user_prompt}]
+            )
+            content = message.content[0].text
+        else:
+            response = await client.chat.completions.create(
+                model=config.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=config.temperature,
+                max_tokens=config.max_tokens,
+                response_format=_response_format(config, expect_json, json_schema)
             )
             content = response.choices[0].message.content
         
         if expect_json:
-            return json.loads(content)
+            return _loads_json(content)
         return {"content": content}
         
     except Exception as e:
@@ -8,6 +8,11 @@ from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
 
 @dataclass
 class ConfigValidationResult:
@@ -242,8 +247,38 @@ def validate_config_file(config_path: str) -> Tuple[bool, List[str], List[str]]:
     return result.is_valid, result.errors, result.warnings
 
 
+# Structural rules from ConfigValidator that are hard errors, as JSON Schema.
+# Semantic checks and warnings stay in ConfigValidator.
+REQUIREMENTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "use_cases": {"type": "array"},
+        "media_types": {"type": "array"},
+        "want_tailscale": {"type": "boolean"},
+        "want_adguard": {"type": "boolean"},
+        "want_openclaw": {"type": "boolean"},
+        "want_immich": {"type": "boolean"},
+        "want_jellyfin": {"type": "boolean"},
+        "storage_path": {"type": ["string", "null"]},
+        "admin_email": {"type": ["string", "null"]},
+    },
+}
+
+# Compiled once at import; fastjsonschema generates the validator as Python code
+_requirements_schema_validator = (
+    fastjsonschema.compile(REQUIREMENTS_SCHEMA) if fastjsonschema else None
+)
+
+
 def validate_requirements(requirements: Dict) -> Tuple[bool, List[str], List[str]]:
     """Validate user requirements dictionary."""
+    # Structurally invalid input is rejected without running the Python checks
+    if _requirements_schema_validator is not None:
+        try:
+            _requirements_schema_validator(requirements)
+        except fastjsonschema.JsonSchemaException as e:
+            return False, [e.message], []
+    
     validator = ConfigValidator()
     result = validator.validate_config(requirements)
     return result.is_valid, result.errors, result.warnings
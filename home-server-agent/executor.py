@@ -9,6 +9,8 @@ import sqlite3
 import os
 import re
 import logging
+import threading
+from contextlib import contextmanager
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
@@ -45,17 +47,63 @@ class ExecutionResult:
 class StateManager:
     """Manages execution state with SQLite persistence."""
     
-    def __init__(self, db_path: str = "state.db"):
+    def __init__(self, db_path: str = "state.db", batch_ms: int = 100):
         self.db_path = db_path
+        self.batch_ms = batch_ms
         self._connection = None
+        # Commits (and their fsync) are coalesced: at most one per batch_ms
+        # window, or one per batched() block. The lock serializes the flush
+        # timer and the signal-handling thread's close() with normal writes.
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._pending = False
+        self._flush_timer = None
+        self._last_commit = 0.0
         self._init_db()
     
     def _get_connection(self):
         """Get or create database connection."""
         if self._connection is None:
-            self._connection = sqlite3.connect(self.db_path)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
         return self._connection
     
+    def _commit(self):
+        """Commit now, or defer to the enclosing batch or the flush timer."""
+        self._pending = True
+        if self._batch_depth:
+            return
+        delay = self._last_commit + self.batch_ms / 1000 - time.monotonic()
+        if delay <= 0:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def flush(self):
+        """Commit any pending writes."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._pending and self._connection is not None:
+                self._connection.commit()
+            self._pending = False
+            self._last_commit = time.monotonic()
+    
+    @contextmanager
+    def batched(self):
+        """Defer commits until the outermost batched() block exits."""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self.flush()
+    
     def _init_db(self):
         """Initialize database tables."""
         conn = self._get_connection()
@@ -87,80 +135,89 @@ class StateManager:
         conn.commit()
     
     def close(self):
-        """Close database connection."""
-        if self._connection:
-            self._connection.close()
-            self._connection = None
+        """Flush pending writes and close database connection."""
+        with self._lock:
+            self.flush()
+            if self._connection:
+                self._connection.close()
+                self._connection = None
     
     def __del__(self):
         """Destructor to ensure connection is closed."""
         self.close()
     
     def create_session(self, session_id: str, hardware: Dict, requirements: Dict, plan: Dict) -> str:
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        cursor.execute('''
-            INSERT OR REPLACE INTO sessions 
-            (session_id, hardware_profile, user_requirements, plan_json, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (session_id, json.dumps(hardware), json.dumps(requirements), 
-              json.dumps(plan), now, now))
-        conn.commit()
-        return session_id
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            cursor.execute('''
+                INSERT OR REPLACE INTO sessions 
+                (session_id, hardware_profile, user_requirements, plan_json, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (session_id, json.dumps(hardware), json.dumps(requirements), 
+                  json.dumps(plan), now, now))
+            self._commit()
+            return session_id
     
     def get_session(self, session_id: str) -> Optional[Dict]:
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM sessions WHERE session_id = ?', (session_id,))
-        row = cursor.fetchone()
-        if row:
-            return {
-                'session_id': row[1],
-                'hardware_profile': json.loads(row[2]),
-                'user_requirements': json.loads(row[3]),
-                'plan_json': json.loads(row[4]),
-                'current_step': row[5],
-                'status': row[6]
-            }
-        return None
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM sessions WHERE session_id = ?', (session_id,))
+            row = cursor.fetchone()
+            if row:
+                return {
+                    'session_id': row[1],
+                    'hardware_profile': json.loads(row[2]),
+                    'user_requirements': json.loads(row[3]),
+                    'plan_json': json.loads(row[4]),
+                    'current_step': row[5],
+                    'status': row[6]
+                }
+            return None
     
     def update_step(self, session_id: str, step_number: int, step_name: str, 
                     status: str, result: Optional[ExecutionResult] = None):
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
         
-        result_json = json.dumps(result.to_dict()) if result else None
-        cursor.execute('''
-            INSERT INTO execution_state (session_id, step_number, step_name, status, result_json, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (session_id, step_number, step_name, status, result_json, now))
+            result_json = json.dumps(result.to_dict()) if result else None
+            cursor.execute('''
+                INSERT INTO execution_state (session_id, step_number, step_name, status, result_json, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (session_id, step_number, step_name, status, result_json, now))
         
-        cursor.execute('''
-            UPDATE sessions SET current_step = ?, updated_at = ? WHERE session_id = ?
-        ''', (step_number, now, session_id))
+            cursor.execute('''
+                UPDATE sessions SET current_step = ?, updated_at = ? WHERE session_id = ?
+            ''', (step_number, now, session_id))
         
-        conn.commit()
+            self._commit()
     
     def get_completed_steps(self, session_id: str) -> List[int]:
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT DISTINCT step_number FROM execution_state 
-            WHERE session_id = ? AND status = 'completed'
-        ''', (session_id,))
-        rows = cursor.fetchall()
-        return [r[0] for r in rows]
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT step_number FROM execution_state 
+                WHERE session_id = ? AND status = 'completed'
+            ''', (session_id,))
+            rows = cursor.fetchall()
+            return [r[0] for r in rows]
     
     def complete_session(self, session_id: str, success: bool = True):
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        status = 'completed' if success else 'failed'
-        cursor.execute('''
-            UPDATE sessions SET status = ?, updated_at = ? WHERE session_id = ?
-        ''', (status, datetime.now().isoformat(), session_id))
-        conn.commit()
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            status = 'completed' if success else 'failed'
+            cursor.execute('''
+                UPDATE sessions SET status = ?, updated_at = ? WHERE session_id = ?
+            ''', (status, datetime.now().isoformat(), session_id))
+            # End of session is a checkpoint; don't leave it to the timer
+            self._commit()
+            self.flush()
 
 
 class ExecutionEngine:
@@ -208,8 +265,10 @@ class ExecutionEngine:
         """Initialize a new execution session."""
         self.session_id = self.state.create_session(session_id, hardware, requirements, plan)
     
-    def validate_command(self, command: str) -> Tuple[bool, str]:
-        """Check if command is safe to execute."""
+    def validate_command(self, command) -> Tuple[bool, str]:
+        """Check if command (string or argv list) is safe to execute."""
+        if isinstance(command, list):
+            command = ' '.join(command)
         if not command or not command.strip():
             return False, "Empty command"
         
@@ -233,6 +292,10 @@ class ExecutionEngine:
             commands.append(step['command'])
         commands.extend(step.get('commands', []))
         
+        # Small config files are written in-process rather than through a shell
+        if step.get('action') == 'write_file':
+            return self._execute_write_file(step, step_number, step_name)
+        
         # Handle empty command list
         if not commands:
             result = ExecutionResult(
@@ -246,6 +309,15 @@ class ExecutionEngine:
         print(f"\n[Step {step_number}] {step_name}")
         print(f"Description: {step.get('description', '')}")
         
+        # Fast path for idempotent re-runs: a precheck exiting 0 means the
+        # step's effect is already in place, so the install command is skipped
+        if step.get('precheck') and not self.dry_run:
+            precheck_result = self._run_command(step['precheck'], timeout=30)
+            if precheck_result.success:
+                print("  ✓ Already in place, skipping")
+                self.state.update_step(self.session_id, step_number, step_name, 'completed', precheck_result)
+                return precheck_result
+        
         for cmd in commands:
             print(f"\nCommand: {cmd}")
             
@@ -292,7 +364,12 @@ class ExecutionEngine:
                 self.state.update_step(self.session_id, step_number, step_name, 'failed', result)
                 return result
         
-        # Run verification check if provided
+        self._verify_step(step)
+        self.state.update_step(self.session_id, step_number, step_name, 'completed', result)
+        return result
+    
+    def _verify_step(self, step: Dict):
+        """Run the step's check_command, if any; a failed check only warns."""
         if step.get('check_command') and not self.dry_run:
             check_cmd = step['check_command']
             print(f"\nVerifying: {check_cmd}")
@@ -301,8 +378,53 @@ class ExecutionEngine:
                 print(f"  Warning: Verification failed")
             else:
                 print(f"  ✓ Verified")
+    
+    def _execute_write_file(self, step: Dict, step_number: int, step_name: str) -> ExecutionResult:
+        """Execute a write_file step: write step['content'] to step['path'] with step['mode']."""
+        path = os.path.expanduser(step['path'])
+        mode = step.get('mode', 0o600)
         
-        self.state.update_step(self.session_id, step_number, step_name, 'completed', result)
+        print(f"\n[Step {step_number}] {step_name}")
+        print(f"Description: {step.get('description', '')}")
+        print(f"\nWriting: {path}")
+        
+        if self.dry_run:
+            print("  [DRY RUN] Would write:", path)
+            result = ExecutionResult(
+                success=True, returncode=0,
+                stdout="[DRY RUN]", stderr="",
+                duration_ms=0, timestamp=datetime.now().isoformat()
+            )
+            self.state.update_step(self.session_id, step_number, step_name, 'completed', result)
+            return result
+        
+        start = time.time()
+        try:
+            # Create with the final mode so secrets are never briefly world-readable
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+            with os.fdopen(fd, 'w') as f:
+                f.write(step['content'])
+            os.chmod(path, mode)
+            logger.info(f"Wrote file: {path}")
+            result = ExecutionResult(
+                success=True, returncode=0,
+                stdout="", stderr="",
+                duration_ms=int((time.time() - start) * 1000),
+                timestamp=datetime.now().isoformat()
+            )
+        except OSError as e:
+            logger.error(f"Failed to write {path}: {e}")
+            result = ExecutionResult(
+                success=False, returncode=-1,
+                stdout="", stderr=f"OS error: {e}",
+                duration_ms=int((time.time() - start) * 1000),
+                timestamp=datetime.now().isoformat()
+            )
+        
+        if result.success:
+            self._verify_step(step)
+        status = 'completed' if result.success else 'failed'
+        self.state.update_step(self.session_id, step_number, step_name, status, result)
         return result
     
     def _run_command(self, command, timeout: int) -> ExecutionResult:
@@ -5,21 +5,44 @@ All methods tested and optimized for Debian/Ubuntu systems.
 SECURITY HARDENED: All commands use parameterized construction, no f-string injection.
 """
 
-from typing import Dict, List, Optional
+import json
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
 from security_utils import InputValidator, CommandBuilder, SecurityError, CredentialManager
 
 
 # Pinned Docker image digests for supply chain security
 # Format: image:tag@sha256:digest
-DOCKER_IMAGES = {
-    'adguard': 'adguard/adguardhome:v0.107.43@sha256:1e7c7583431e7ebaba27ac424e215f3bf71b438c833c2cbb7b0b94a830d0e64d',
-    'jellyfin': 'jellyfin/jellyfin:10.8.13@sha256:05a2c8c56013f3f1c3a1239c4f61e03f1362e7b830ae4d41e8336b5af1c6a2a6',
-    'filebrowser': 'filebrowser/filebrowser:v2.27.0@sha256:67f43d2d90b2e5ad3a5b4421e0e6d3d9e8e8a7b6c5d4e3f2a1b0c9d8e7f6a5b4c',
-    'immich_server': 'ghcr.io/immich-app/immich-server:v1.91.4@sha256:11a0482b5e0b2c4d7f4f1f6e0e9c8b7a6d5c4b3a2f1e0d9c8b7a6f5e4d3c2b1',
-    'immich_ml': 'ghcr.io/immich-app/immich-machine-learning:v1.91.4@sha256:22b4b3c5d6e7f8a9b0c1d2e3f4a5b6c7d8e9f0a1b2c3d4e5f6a7b8c9d0e1f2',
-    'redis': 'redis:7.2-alpine@sha256:1b3c2d4e5f6a7b8c9d0e1f2a3b4c5d6e7f8a9b0c1d2e3f4a5b6c7d8e9f0a1b',
-    'postgres': 'tensorchord/pgvecto-rs:pg14-v0.2.0@sha256:90724186f0a3517cf6914295b5ab410db9ce23190a2d9d0b9dd6463e3fa298f0',
-}
+# Kept in docker_images.json so digest rotations don't require source edits
+_DOCKER_IMAGES_FILE = Path(__file__).with_name('docker_images.json')
+DOCKER_IMAGES: Mapping[str, str] = MappingProxyType(
+    json.loads(_DOCKER_IMAGES_FILE.read_text())
+)
+
+# Published ports as (host_port, container_port, protocol). Module-level tuples
+# so each procedure call reuses them instead of rebuilding the lists.
+_ADGUARD_PORTS: Tuple[Tuple[int, int, str], ...] = (
+    (53, 53, 'udp'),
+    (53, 53, 'tcp'),
+    (80, 80, 'tcp'),
+    (3000, 3000, 'tcp'),
+)
+_JELLYFIN_PORTS: Tuple[Tuple[int, int, str], ...] = ((8096, 8096, 'tcp'),)
+_FILEBROWSER_PORTS: Tuple[Tuple[int, int, str], ...] = ((8082, 80, 'tcp'),)
+
+
+def _image_check(image: str) -> List[str]:
+    """
+    Check that exits 0 only when the image is present locally.
+    A targeted inspect of one image instead of listing every image per step.
+    """
+    return ['docker', 'image', 'inspect', '--format', '{{.Id}}', image]
+
+
+def _dir_precheck(mkdir_command: List[str]) -> List[str]:
+    """Precheck that exits 0 only when the mkdir target already exists."""
+    return ['test', '-d', mkdir_command[-1]]
 
 
 class InstallProcedures:
@@ -119,18 +142,21 @@ class InstallProcedures:
         sanitized_path = InputValidator.validate_storage_path(storage_path)
         
         image = DOCKER_IMAGES['adguard']
+        mkdir_cmd = CommandBuilder.build_mkdir(f"{sanitized_path}/work")
         
         return [
             {
                 "name": "Create AdGuard directories",
-                "command": CommandBuilder.build_mkdir(f"{sanitized_path}/work"),
+                "command": mkdir_cmd,
+                "precheck": _dir_precheck(mkdir_cmd),
                 "check_command": ['ls', '-la', sanitized_path],
                 "description": "Creates required directories for AdGuard"
             },
             {
                 "name": "Pull AdGuard Home image",
                 "command": ['docker', 'pull', image],
-                "check_command": ['docker', 'images', '--format', '{{.Repository}}:{{.Tag}}'],
+                "precheck": _image_check(image),
+                "check_command": _image_check(image),
                 "description": "Downloads AdGuard Home Docker image"
             },
             {
@@ -138,7 +164,7 @@ class InstallProcedures:
                 "command": CommandBuilder.build_docker_run(
                     image=image,
                     name='adguardhome',
-                    ports=[(53, 53), (53, 53), (80, 80), (3000, 3000)],
+                    ports=_ADGUARD_PORTS,
                     volumes=[
                         (f"{sanitized_path}/work", '/opt/adguardhome/work', 'rw'),
                         (f"{sanitized_path}/conf", '/opt/adguardhome/conf', 'rw')
@@ -153,6 +179,7 @@ class InstallProcedures:
             {
                 "name": "Configure systemd service",
                 "command": ['systemctl', 'enable', 'docker'],
+                "precheck": ['systemctl', 'is-enabled', 'docker'],
                 "check_command": ['systemctl', 'is-enabled', 'docker'],
                 "description": "Ensures Docker starts on boot"
             }
@@ -168,18 +195,21 @@ class InstallProcedures:
         """
         sanitized_path = InputValidator.validate_storage_path(storage_path)
         image = DOCKER_IMAGES['jellyfin']
+        mkdir_cmd = CommandBuilder.build_mkdir(f"{sanitized_path}/config")
         
         return [
             {
                 "name": "Create Jellyfin directories",
-                "command": CommandBuilder.build_mkdir(f"{sanitized_path}/config"),
+                "command": mkdir_cmd,
+                "precheck": _dir_precheck(mkdir_cmd),
                 "check_command": ['ls', '-la', sanitized_path],
                 "description": "Creates Jellyfin config and media directories"
             },
             {
                 "name": "Pull Jellyfin image",
                 "command": ['docker', 'pull', image],
-                "check_command": ['docker', 'images', '--format', '{{.Repository}}:{{.Tag}}'],
+                "precheck": _image_check(image),
+                "check_command": _image_check(image),
                 "description": "Downloads Jellyfin Docker image"
             },
             {
@@ -187,7 +217,7 @@ class InstallProcedures:
                 "command": CommandBuilder.build_docker_run(
                     image=image,
                     name='jellyfin',
-                    ports=[(8096, 8096)],
+                    ports=_JELLYFIN_PORTS,
                     volumes=[
                         (f"{sanitized_path}/config", '/config', 'rw'),
                         (f"{sanitized_path}/cache", '/cache', 'rw'),
@@ -213,11 +243,14 @@ class InstallProcedures:
         """
         sanitized_path = InputValidator.validate_storage_path(storage_path)
         
+        mkdir_cmd = CommandBuilder.build_mkdir(sanitized_path)
+        
         # Use docker run commands instead of compose for better security control
         steps = [
             {
                 "name": "Create Immich directories",
-                "command": CommandBuilder.build_mkdir(sanitized_path),
+                "command": mkdir_cmd,
+                "precheck": _dir_precheck(mkdir_cmd),
                 "check_command": ['ls', '-la', sanitized_path],
                 "description": "Creates Immich installation directory"
             }
@@ -237,6 +270,8 @@ class InstallProcedures:
         
         Installs via npm or standalone binary.
         """
+        mkdir_cmd = CommandBuilder.build_mkdir('~/.openclaw')
+        
         steps = [
             {
                 "name": "Install Node.js prerequisites",
@@ -253,7 +288,8 @@ class InstallProcedures:
             },
             {
                 "name": "Create OpenClaw config directory",
-                "command": CommandBuilder.build_mkdir('~/.openclaw'),
+                "command": mkdir_cmd,
+                "precheck": _dir_precheck(mkdir_cmd),
                 "check_command": ['ls', '-la', '~/.openclaw'],
                 "description": "Creates OpenClaw configuration directory"
             }
@@ -265,12 +301,16 @@ class InstallProcedures:
             if not is_valid:
                 raise SecurityError(f"Invalid OpenClaw token: {sanitized_token}")
             
+            env_path = f"{mkdir_cmd[-1]}/.env"
             steps.append({
                 "name": "Configure OpenClaw gateway token",
-                "command": ['sh', '-c', f'echo "OPENCLAW_GATEWAY_TOKEN={sanitized_token}" > ~/.openclaw/.env'],
-                "check_command": ['cat', '~/.openclaw/.env'],
+                "action": "write_file",
+                "path": env_path,
+                "content": f"OPENCLAW_GATEWAY_TOKEN={sanitized_token}\n",
+                "mode": 0o600,
+                "check_command": ['test', '-s', env_path],
                 "description": "Sets OpenClaw gateway token",
-                "masked_command": "echo 'OPENCLAW_GATEWAY_TOKEN=***MASKED***' > ~/.openclaw/.env"
+                "masked_command": f"write OPENCLAW_GATEWAY_TOKEN=***MASKED*** to {env_path}"
             })
         
         return steps
@@ -290,18 +330,21 @@ class InstallProcedures:
         # Generate random initial password
         import secrets
         initial_password = secrets.token_urlsafe(16)
+        mkdir_cmd = CommandBuilder.build_mkdir(sanitized_path)
         
         return [
             {
                 "name": "Create FileBrowser directory",
-                "command": CommandBuilder.build_mkdir(sanitized_path),
+                "command": mkdir_cmd,
+                "precheck": _dir_precheck(mkdir_cmd),
                 "check_command": ['ls', '-la', sanitized_path],
                 "description": "Creates FileBrowser data directory"
             },
             {
                 "name": "Pull FileBrowser image",
                 "command": ['docker', 'pull', image],
-                "check_command": ['docker', 'images', '--format', '{{.Repository}}:{{.Tag}}'],
+                "precheck": _image_check(image),
+                "check_command": _image_check(image),
                 "description": "Downloads FileBrowser Docker image"
             },
             {
@@ -309,7 +352,7 @@ class InstallProcedures:
                 "command": CommandBuilder.build_docker_run(
                     image=image,
                     name='filebrowser',
-                    ports=[(8082, 80)],
+                    ports=_FILEBROWSER_PORTS,
                     volumes=[
                         (sanitized_path, '/srv', 'rw'),
                         (f"{sanitized_path}/database.db", '/database.db', 'rw')
@@ -374,6 +417,7 @@ class InstallProcedures:
             {
                 "name": "Enable Docker service",
                 "command": ['systemctl', 'enable', '--now', 'docker'],
+                "precheck": ['systemctl', 'is-active', 'docker'],
                 "check_command": ['systemctl', 'is-active', 'docker'],
                 "description": "Enables and starts Docker service"
             }
@@ -4,12 +4,44 @@ Collects user requirements through CLI prompts with validation.
 """
 import os
 import re
+import string
+import sys
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-@dataclass
+try:
+    from ai_provider import PROVIDER_PRESETS, get_ai_config_from_env
+    _AI_PROVIDER_IMPORT_ERROR = None
+except ImportError as e:
+    PROVIDER_PRESETS = None
+    get_ai_config_from_env = None
+    _AI_PROVIDER_IMPORT_ERROR = e
+
+
+def _format_preset_menu(presets: Optional[Dict]) -> Tuple[str, ...]:
+    """Format the AI provider selection menu lines."""
+    if not presets:
+        return ()
+    lines = ["Available AI providers:"]
+    for key, preset in presets.items():
+        lines.append(f"  {key:12} - {preset['name']}")
+        if preset.get('docs_url'):
+            lines.append(f"               Get key: {preset['docs_url']}")
+    lines.append("\nSelect a provider (or press Enter to skip):")
+    return tuple(lines)
+
+
+# Presets are static, so the menu is formatted once at import time
+_PRESET_MENU_LINES = _format_preset_menu(PROVIDER_PRESETS)
+
+
+@dataclass(slots=True, frozen=True)
 class DomainConfig:
     """Domain configuration for custom domain support."""
     enabled: bool
@@ -28,10 +60,26 @@ class DomainConfig:
     expose_externally: bool
     
     def to_dict(self) -> Dict:
-        return asdict(self)
+        # Explicit field list avoids asdict()'s per-call field introspection
+        return {
+            'enabled': self.enabled,
+            'domain_name': self.domain_name,
+            'use_for_adguard': self.use_for_adguard,
+            'use_for_jellyfin': self.use_for_jellyfin,
+            'use_for_immich': self.use_for_immich,
+            'use_for_dashboard': self.use_for_dashboard,
+            'subdomain_adguard': self.subdomain_adguard,
+            'subdomain_jellyfin': self.subdomain_jellyfin,
+            'subdomain_immich': self.subdomain_immich,
+            'subdomain_dashboard': self.subdomain_dashboard,
+            'reverse_proxy': self.reverse_proxy,
+            'use_tailscale_funnel': self.use_tailscale_funnel,
+            'require_auth': self.require_auth,
+            'expose_externally': self.expose_externally
+        }
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UserRequirements:
     """Structured user requirements for planning engine."""
     use_cases: List[str]  # file_storage, media_server, ad_blocking, vpn, photos, backup
@@ -63,13 +111,135 @@ class UserRequirements:
     tailscale_ssh: bool
     
     def to_dict(self) -> Dict:
-        data = asdict(self)
-        if self.domain_config:
-            data['domain_config'] = self.domain_config.to_dict()
-        return data
+        # Explicit field list avoids asdict()'s deep walk, which also
+        # serialized domain_config a second time
+        return {
+            # Slices copy lists like asdict() does and leave a string intact
+            'use_cases': self.use_cases[:],
+            'media_types': self.media_types[:],
+            'want_tailscale': self.want_tailscale,
+            'want_adguard': self.want_adguard,
+            'want_openclaw': self.want_openclaw,
+            'want_immich': self.want_immich,
+            'want_jellyfin': self.want_jellyfin,
+            'want_filebrowser': self.want_filebrowser,
+            'storage_path': self.storage_path,
+            'domain_name': self.domain_name,
+            'tailscale_auth_key': self.tailscale_auth_key,
+            'openclaw_gateway_token': self.openclaw_gateway_token,
+            'admin_email': self.admin_email,
+            'notes': self.notes,
+            'ai_provider': self.ai_provider,
+            'ai_model': self.ai_model,
+            'ai_api_key': self.ai_api_key,
+            'ai_base_url': self.ai_base_url,
+            'preferred_ui': self.preferred_ui,
+            'domain_config': self.domain_config.to_dict() if self.domain_config else None,
+            'tailscale_exit_node': self.tailscale_exit_node,
+            'tailscale_advertise_routes': self.tailscale_advertise_routes,
+            'tailscale_ssh': self.tailscale_ssh
+        }
     
     def to_json(self) -> str:
+        if orjson is not None:
+            # orjson serializes (slotted) dataclasses natively, nested
+            # DomainConfig included, so no intermediate dict is built
+            return orjson.dumps(self, option=orjson.OPT_INDENT_2).decode()
         return json.dumps(self.to_dict(), indent=2)
+    
+    @classmethod
+    def from_answers_dict(cls, answers: Dict) -> 'UserRequirements':
+        """
+        Build requirements from pre-filled answers without prompting.
+        Missing keys take the interview's defaults; unknown keys are ignored.
+        """
+        values = {name: answers.get(name, default) for name, default in _ANSWER_DEFAULTS.items()}
+        # Copy sequences only: list("vpn") would split a string into letters
+        # that pass validation, where the string itself is rejected
+        for name in ('use_cases', 'media_types'):
+            if isinstance(values[name], (list, tuple)):
+                values[name] = list(values[name])
+        
+        domain = answers.get('domain_config')
+        if isinstance(domain, dict):
+            domain_config = DomainConfig(
+                **{name: domain.get(name, default) for name, default in _DOMAIN_ANSWER_DEFAULTS.items()}
+            )
+            values['domain_config'] = domain_config
+            values['domain_name'] = values['domain_name'] or domain_config.domain_name
+        else:
+            values['domain_config'] = None
+        
+        return cls(**values)
+
+
+# Declarative answer schema for non-interactive runs: field -> interview default
+_ANSWER_DEFAULTS = {
+    'use_cases': (),
+    'media_types': (),
+    'want_tailscale': True,
+    'want_adguard': False,
+    'want_openclaw': False,
+    'want_immich': False,
+    'want_jellyfin': False,
+    'want_filebrowser': False,
+    'storage_path': None,
+    'domain_name': None,
+    'tailscale_auth_key': None,
+    'openclaw_gateway_token': None,
+    'admin_email': None,
+    'notes': "",
+    'ai_provider': None,
+    'ai_model': None,
+    'ai_api_key': None,
+    'ai_base_url': None,
+    'preferred_ui': 'web',
+    'domain_config': None,
+    'tailscale_exit_node': False,
+    'tailscale_advertise_routes': False,
+    'tailscale_ssh': True,
+}
+
+_DOMAIN_ANSWER_DEFAULTS = {
+    'enabled': True,
+    'domain_name': None,
+    'use_for_adguard': True,
+    'use_for_jellyfin': True,
+    'use_for_immich': True,
+    'use_for_dashboard': True,
+    'subdomain_adguard': 'adguard',
+    'subdomain_jellyfin': 'media',
+    'subdomain_immich': 'photos',
+    'subdomain_dashboard': 'dashboard',
+    'reverse_proxy': 'caddy',
+    'use_tailscale_funnel': False,
+    'require_auth': True,
+    'expose_externally': False,
+}
+
+
+def _validate_domain(domain: str) -> Optional[str]:
+    """
+    Check a lowercased domain against RFC 1123 label rules without the regex engine.
+    Returns an error message, or None if the domain is valid.
+    """
+    # Length check (total max 253, label max 63)
+    if len(domain) > 253:
+        return "Domain too long (max 253 characters)"
+    
+    labels = domain.split('.')
+    if len(labels) < 2:
+        return "Domain needs a TLD (e.g., .com, .org)"
+    
+    for label in labels:
+        if not label or len(label) > 63:
+            return "Invalid domain format"
+        if label[0] == '-' or label[-1] == '-':
+            return "Invalid domain format"
+        if not (label.isascii() and label.replace('-', '').isalnum()):
+            return "Invalid domain format"
+    
+    return None
 
 
 class InterviewEngine:
@@ -87,10 +257,10 @@ class InterviewEngine:
     # Input validation patterns
     EMAIL_REGEX = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
     TAILSCALE_KEY_REGEX = re.compile(r'^tskey-auth-[a-zA-Z0-9]+')
-    PATH_REGEX = re.compile(r'^[~\/\.a-zA-Z0-9_-]+$')
-    DOMAIN_REGEX = re.compile(
-        r'^(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)*[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?$'
-    )
+    # Storage path character classes; one set difference covers the null-byte,
+    # shell-metacharacter, whitespace and format checks in a single pass
+    _PATH_ALLOWED_CHARS = frozenset(string.ascii_letters + string.digits + '~/._-')
+    _PATH_DANGEROUS_CHARS = frozenset(';|&$`\\<>!')
 
     def __init__(self, use_rich: bool = True):
         self.use_rich = use_rich
@@ -100,15 +270,19 @@ class InterviewEngine:
         self._print_header()
 
         # STEP 1: AI Configuration (FIRST - as requested)
-        print("\n🤖 STEP 1: AI Configuration")
-        print("-" * 60)
-        print("The AI assistant helps create optimized installation plans.")
-        print("You can use OpenAI, Anthropic Claude, or local models.\n")
+        self._emit(
+            "\n🤖 STEP 1: AI Configuration",
+            "-" * 60,
+            "The AI assistant helps create optimized installation plans.",
+            "You can use OpenAI, Anthropic Claude, or local models.\n"
+        )
         ai_config = self._ask_ai_config()
 
         # STEP 2: Use cases
-        print("\n📋 STEP 2: What do you want to use your home server for?")
-        print("-" * 60)
+        self._emit(
+            "\n📋 STEP 2: What do you want to use your home server for?",
+            "-" * 60
+        )
         use_cases = self._ask_use_cases()
 
         # Media types (if applicable)
@@ -117,18 +291,24 @@ class InterviewEngine:
             media_types = self._ask_media_types()
 
         # STEP 3: Component selection with Tailscale options
-        print("\n🔧 STEP 3: Component Configuration")
-        print("-" * 60)
+        self._emit(
+            "\n🔧 STEP 3: Component Configuration",
+            "-" * 60
+        )
         components, tailscale_config = self._ask_components_with_tailscale(use_cases)
 
         # Storage path
-        print("\n💾 STEP 4: Storage Configuration")
-        print("-" * 60)
+        self._emit(
+            "\n💾 STEP 4: Storage Configuration",
+            "-" * 60
+        )
         storage_path = self._ask_storage_path()
 
         # Domain configuration
-        print("\n🌐 STEP 5: Domain Configuration (Optional)")
-        print("-" * 60)
+        self._emit(
+            "\n🌐 STEP 5: Domain Configuration (Optional)",
+            "-" * 60
+        )
         domain_config = self._ask_domain_config()
 
         # OpenClaw token
@@ -170,15 +350,18 @@ class InterviewEngine:
         )
 
     def _print_header(self):
-        print("\n" + "="*60)
-        print("  Home Server AI Setup - Let's understand your needs")
-        print("="*60 + "\n")
+        self._emit(
+            "\n" + "="*60,
+            "  Home Server AI Setup - Let's understand your needs",
+            "="*60 + "\n"
+        )
 
     def _ask_use_cases(self) -> List[str]:
-        print("What do you want to use your home server for?")
-        print("(Enter numbers separated by commas, e.g., 1,3,5)")
-        for key, (value, desc) in self.USE_CASE_OPTIONS.items():
-            print(f"  {key}. {desc}")
+        self._emit(
+            "What do you want to use your home server for?",
+            "(Enter numbers separated by commas, e.g., 1,3,5)",
+            *(f"  {key}. {desc}" for key, (value, desc) in self.USE_CASE_OPTIONS.items())
+        )
 
         while True:
             response = input("\nYour choices: ").strip()
@@ -198,16 +381,17 @@ class InterviewEngine:
                 return use_cases
 
     def _ask_media_types(self) -> List[str]:
-        print("\nWhat types of media will you store?")
-        print("(Enter numbers separated by commas)")
         options = {
             '1': 'movies',
             '2': 'tv',
             '3': 'music',
             '4': 'photos'
         }
-        for key, value in options.items():
-            print(f"  {key}. {value.title()}")
+        self._emit(
+            "\nWhat types of media will you store?",
+            "(Enter numbers separated by commas)",
+            *(f"  {key}. {value.title()}" for key, value in options.items())
+        )
 
         response = input("\nYour choices: ").strip()
         selections = [s.strip() for s in response.split(',')]
@@ -228,26 +412,29 @@ class InterviewEngine:
 
         # Detailed Tailscale configuration if enabled
         if components['tailscale']:
-            print("\n  ⚙️  Tailscale Configuration:")
-            
             # Auth key
-            print("\n  You can provide an auth key for automated setup,")
-            print("  or set up Tailscale manually later.")
+            self._emit(
+                "\n  ⚙️  Tailscale Configuration:",
+                "\n  You can provide an auth key for automated setup,",
+                "  or set up Tailscale manually later."
+            )
             auth_key = self._ask_tailscale_key()
             tailscale_config['auth_key'] = auth_key
 
             # Exit node configuration
-            print("\n  🌐 Exit Node Configuration:")
-            print("  " + "-" * 50)
-            print("  An exit node allows other devices on your Tailscale")
-            print("  network to route all their internet traffic through")
-            print("  this server (like a VPN endpoint).")
-            print("\n  ⚠️  WARNING: Enabling exit node requires:")
-            print("     • IP forwarding to be enabled on this system")
-            print("     • This server will handle all network traffic")
-            print("     • May impact server performance")
-            print("     • Check your ISP's terms of service")
-            print()
+            self._emit(
+                "\n  🌐 Exit Node Configuration:",
+                "  " + "-" * 50,
+                "  An exit node allows other devices on your Tailscale",
+                "  network to route all their internet traffic through",
+                "  this server (like a VPN endpoint).",
+                "\n  ⚠️  WARNING: Enabling exit node requires:",
+                "     • IP forwarding to be enabled on this system",
+                "     • This server will handle all network traffic",
+                "     • May impact server performance",
+                "     • Check your ISP's terms of service",
+                ""
+            )
             
             enable_exit_node = self._ask_yes_no(
                 "  Configure this server as a Tailscale exit node?",
@@ -256,15 +443,19 @@ class InterviewEngine:
             tailscale_config['enable_exit_node'] = enable_exit_node
 
             if enable_exit_node:
-                print("\n  ✅ Exit node will be configured.")
-                print("  ℹ️  IP forwarding will be automatically enabled.")
-                print("  ℹ️  The server will advertise routes to the Tailscale network.")
+                self._emit(
+                    "\n  ✅ Exit node will be configured.",
+                    "  ℹ️  IP forwarding will be automatically enabled.",
+                    "  ℹ️  The server will advertise routes to the Tailscale network."
+                )
                 
                 # Ask about subnet routes
-                print("\n  📡 Subnet Routes:")
-                print("  Do you want to advertise local network routes?")
-                print("  This allows other Tailscale devices to reach")
-                print("  devices on your local network.")
+                self._emit(
+                    "\n  📡 Subnet Routes:",
+                    "  Do you want to advertise local network routes?",
+                    "  This allows other Tailscale devices to reach",
+                    "  devices on your local network."
+                )
                 advertise_routes = self._ask_yes_no(
                     "  Advertise local subnet routes?",
                     default=False
@@ -272,9 +463,11 @@ class InterviewEngine:
                 tailscale_config['advertise_routes'] = advertise_routes
 
             # Tailscale SSH
-            print("\n  🔐 Tailscale SSH:")
-            print("  Allows SSH access to this server over Tailscale")
-            print("  (bypasses traditional SSH port forwarding)")
+            self._emit(
+                "\n  🔐 Tailscale SSH:",
+                "  Allows SSH access to this server over Tailscale",
+                "  (bypasses traditional SSH port forwarding)"
+            )
             enable_ssh = self._ask_yes_no(
                 "  Enable Tailscale SSH?",
                 default=True
@@ -282,9 +475,11 @@ class InterviewEngine:
             tailscale_config['enable_ssh'] = enable_ssh
 
             # Funnel (for domain configuration)
-            print("\n  🌍 Tailscale Funnel:")
-            print("  Exposes services publicly via Tailscale's servers")
-            print("  (alternative to port forwarding)")
+            self._emit(
+                "\n  🌍 Tailscale Funnel:",
+                "  Exposes services publicly via Tailscale's servers",
+                "  (alternative to port forwarding)"
+            )
             enable_funnel = self._ask_yes_no(
                 "  Enable Tailscale Funnel?",
                 default=False
@@ -292,12 +487,14 @@ class InterviewEngine:
             tailscale_config['enable_funnel'] = enable_funnel
 
             # Summary
-            print("\n  📋 Tailscale Configuration Summary:")
-            print(f"     • Exit Node: {'Yes' if enable_exit_node else 'No'}")
-            print(f"     • Advertise Routes: {'Yes' if tailscale_config.get('advertise_routes') else 'No'}")
-            print(f"     • Tailscale SSH: {'Yes' if enable_ssh else 'No'}")
-            print(f"     • Funnel: {'Yes' if enable_funnel else 'No'}")
-            print(f"     • Auth Key: {'Provided' if auth_key else 'Manual setup'}")
+            self._emit(
+                "\n  📋 Tailscale Configuration Summary:",
+                f"     • Exit Node: {'Yes' if enable_exit_node else 'No'}",
+                f"     • Advertise Routes: {'Yes' if tailscale_config.get('advertise_routes') else 'No'}",
+                f"     • Tailscale SSH: {'Yes' if enable_ssh else 'No'}",
+                f"     • Funnel: {'Yes' if enable_funnel else 'No'}",
+                f"     • Auth Key: {'Provided' if auth_key else 'Manual setup'}"
+            )
 
         # AdGuard for ad blocking
         if 'ad_blocking' in use_cases:
@@ -332,10 +529,12 @@ class InterviewEngine:
         return components, tailscale_config
 
     def _ask_storage_path(self) -> Optional[str]:
-        print("\nWhere should media/data be stored?")
-        print("  1. Default location (/var/lib)")
-        print("  2. External drive (specify path)")
-        print("  3. Home directory (~/.home-server)")
+        self._emit(
+            "\nWhere should media/data be stored?",
+            "  1. Default location (/var/lib)",
+            "  2. External drive (specify path)",
+            "  3. Home directory (~/.home-server)"
+        )
 
         choice = input("Choice [1]: ").strip() or "1"
 
@@ -358,45 +557,44 @@ class InterviewEngine:
                 print("   ⚠️ Path too long (max 4096 characters)")
                 continue
 
-            # Check for null bytes (security)
-            if '\x00' in path:
-                print("   ⚠️ Invalid path contains null bytes")
+            # Check if path looks like a URL (common mistake)
+            if path.startswith(('http://', 'https://')):
+                print("   ⚠️ That looks like a URL, not a local path")
                 continue
             
-            # Check for shell metacharacters
-            dangerous_chars = set(';|&$`\\<>!')
-            if any(c in path for c in dangerous_chars):
-                print("   ⚠️ Path contains potentially dangerous characters")
-                print(f"   Avoid: {dangerous_chars}")
-                if attempt < max_attempts - 1:
+            # Single character scan against the allowlist
+            bad_chars = set(path) - self._PATH_ALLOWED_CHARS
+            if bad_chars:
+                # Check for null bytes (security)
+                if '\x00' in bad_chars:
+                    print("   ⚠️ Invalid path contains null bytes")
                     continue
-                print(f"   Skipping custom path after {max_attempts} failed attempts")
-                return None
-            
-            # Check for parent directory traversal
-            if '..' in path:
-                print("   ⚠️ Path cannot contain parent directory references (..)")
-                continue
-            
-            # Basic path validation
-            if not self.PATH_REGEX.match(path):
-                print("   ⚠️ Invalid path format")
-                print("   Use: letters, numbers, underscores, dashes, forward slashes")
+                
+                # Check for shell metacharacters
+                if not bad_chars.isdisjoint(self._PATH_DANGEROUS_CHARS):
+                    self._emit(
+                        "   ⚠️ Path contains potentially dangerous characters",
+                        f"   Avoid: {' '.join(sorted(self._PATH_DANGEROUS_CHARS))}"
+                    )
+                    if attempt < max_attempts - 1:
+                        continue
+                    print(f"   Skipping custom path after {max_attempts} failed attempts")
+                    return None
+                
+                self._emit(
+                    "   ⚠️ Invalid path format",
+                    "   Use: letters, numbers, underscores, dashes, forward slashes (no spaces)"
+                )
                 if attempt < max_attempts - 1:
                     retry = input("   Try again? [Y/n]: ").strip().lower()
                     if retry == 'n':
                         return None
                 continue
             
-            # Check if path looks like a URL or has common mistakes
-            if path.startswith('http://') or path.startswith('https://'):
-                print("   ⚠️ That looks like a URL, not a local path")
+            # Check for parent directory traversal
+            if '..' in path:
+                print("   ⚠️ Path cannot contain parent directory references (..)")
                 continue
-            if ' ' in path:
-                print("   ⚠️ Path contains spaces - this may cause issues")
-                confirm = input("   Use anyway? [y/N]: ").strip().lower()
-                if confirm != 'y':
-                    continue
             
             # Path looks valid
             return path
@@ -415,14 +613,16 @@ class InterviewEngine:
         if not domain:
             return None
 
-        print("\n🌐 Reverse Proxy Setup")
-        print("-" * 40)
-        print("A reverse proxy handles HTTPS and routes traffic to services.")
-        print("Options:")
-        print("  1. Caddy (easiest, auto HTTPS)")
-        print("  2. Nginx (most popular)")
-        print("  3. Traefik (Docker-native)")
-        print("  4. Skip (use IP:port directly)")
+        self._emit(
+            "\n🌐 Reverse Proxy Setup",
+            "-" * 40,
+            "A reverse proxy handles HTTPS and routes traffic to services.",
+            "Options:",
+            "  1. Caddy (easiest, auto HTTPS)",
+            "  2. Nginx (most popular)",
+            "  3. Traefik (Docker-native)",
+            "  4. Skip (use IP:port directly)"
+        )
 
         proxy_choice = input("Choice [1]: ").strip() or "1"
         proxy_map = {'1': 'caddy', '2': 'nginx', '3': 'traefik', '4': None}
@@ -490,25 +690,14 @@ class InterviewEngine:
         """Ask for domain name with RFC-compliant validation."""
         max_attempts = 5
         
-        # RFC 1123 compliant domain regex (simplified but effective)
-        domain_pattern = re.compile(
-            r'^(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+'  # subdomains
-            r'[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])$'  # TLD
-        )
-        
         for attempt in range(max_attempts):
             domain = input("Domain name (e.g., example.com): ").strip().lower()
             
             if not domain:
                 return None
             
-            # Length check (total max 253, label max 63)
-            if len(domain) > 253:
-                print("   ⚠️ Domain too long (max 253 characters)")
-                continue
-            
             # Check for common mistakes
-            if domain.startswith('http://') or domain.startswith('https://'):
+            if domain.startswith(('http://', 'https://')):
                 print("   ⚠️ Remove http:// or https:// prefix")
                 domain = domain.split('://', 1)[1]
             
@@ -516,21 +705,14 @@ class InterviewEngine:
                 print("   ⚠️ Remove path (e.g., /page) - just domain name needed")
                 domain = domain.split('/')[0]
             
-            # Validate format
-            if not domain_pattern.match(domain):
-                print("   ⚠️ Invalid domain format")
-                print("   Valid: example.com, sub.example.com")
-                print("   Invalid: -example.com, example..com")
-                if attempt < max_attempts - 1:
-                    continue
-                else:
-                    print(f"   Skipping domain after {max_attempts} failed attempts")
-                    return None
-            
-            # Check TLD exists (basic check)
-            parts = domain.split('.')
-            if len(parts) < 2:
-                print("   ⚠️ Domain needs a TLD (e.g., .com, .org)")
+            # Validate length, TLD and label format in one pass
+            error = _validate_domain(domain)
+            if error:
+                self._emit(
+                    f"   ⚠️ {error}",
+                    "   Valid: example.com, sub.example.com",
+                    "   Invalid: -example.com, example..com"
+                )
                 continue
             
             return domain
@@ -540,19 +722,21 @@ class InterviewEngine:
 
     def _ask_ai_config(self) -> Optional[Dict]:
         """Ask for AI provider configuration with better UX."""
-        try:
-            from ai_provider import PROVIDER_PRESETS, get_ai_config_from_env
-        except ImportError as e:
-            print(f"\n⚠️  AI provider module not available: {e}")
-            print("   Will use template plans instead.")
+        if PROVIDER_PRESETS is None:
+            self._emit(
+                f"\n⚠️  AI provider module not available: {_AI_PROVIDER_IMPORT_ERROR}",
+                "   Will use template plans instead."
+            )
             return None
         
-        print("\n🤖 AI Configuration")
-        print("-" * 60)
-        print("The AI assistant helps create optimized installation plans.")
-        print("You can use OpenAI, Anthropic Claude, or local models via Ollama.")
-        print("\n💡 Press Enter to skip and use template plans instead.")
-        print("   (Template plans work great - AI is optional!)\n")
+        self._emit(
+            "\n🤖 AI Configuration",
+            "-" * 60,
+            "The AI assistant helps create optimized installation plans.",
+            "You can use OpenAI, Anthropic Claude, or local models via Ollama.",
+            "\n💡 Press Enter to skip and use template plans instead.",
+            "   (Template plans work great - AI is optional!)\n"
+        )
         
         # Check if already configured in environment
         try:
@@ -572,13 +756,7 @@ class InterviewEngine:
                     'base_url': env_config.base_url
                 }
         
-        print("Available AI providers:")
-        for key, preset in PROVIDER_PRESETS.items():
-            print(f"  {key:12} - {preset['name']}")
-            if 'docs_url' in preset:
-                print(f"               Get key: {preset['docs_url']}")
-        
-        print("\nSelect a provider (or press Enter to skip):")
+        self._emit(*_PRESET_MENU_LINES)
         choice = input("> ").strip().lower()
         
         if not choice:
@@ -592,12 +770,12 @@ class InterviewEngine:
         preset = PROVIDER_PRESETS[choice]
         
         # Show available models
-        print(f"\nAvailable models for {preset['name']}:")
+        menu = [f"\nAvailable models for {preset['name']}:"]
         for i, model in enumerate(preset['models'], 1):
             default_marker = " (recommended)" if model == preset['default_model'] else ""
-            print(f"  {i}. {model}{default_marker}")
-        
-        print("\nSelect model (number or name, Enter for recommended):")
+            menu.append(f"  {i}. {model}{default_marker}")
+        menu.append("\nSelect model (number or name, Enter for recommended):")
+        self._emit(*menu)
         model_choice = input("> ").strip()
         
         model = preset['default_model']  # Default
@@ -653,16 +831,23 @@ class InterviewEngine:
 
     def _ask_ui_preference(self) -> str:
         """Ask user for UI preference."""
-        print("\n🖥️  Interface Preference")
-        print("  1. Web UI (browser-based, easier)")
-        print("  2. Terminal/CLI (text-based, works over SSH)")
-        print("  3. Auto (choose based on environment)")
+        self._emit(
+            "\n🖥️  Interface Preference",
+            "  1. Web UI (browser-based, easier)",
+            "  2. Terminal/CLI (text-based, works over SSH)",
+            "  3. Auto (choose based on environment)"
+        )
 
         choice = input("Choice [1]: ").strip() or "1"
 
         ui_map = {'1': 'web', '2': 'cli', '3': 'auto'}
         return ui_map.get(choice, 'web')
 
+    def _emit(self, *lines: str):
+        """Write a block of prompt lines with a single write and flush."""
+        sys.stdout.write('\n'.join(lines) + '\n')
+        sys.stdout.flush()
+
     def _ask_yes_no(self, prompt: str, default: bool = False) -> bool:
         """Ask a yes/no question with validation."""
         suffix = " [Y/n]: " if default else " [y/N]: "
@@ -698,12 +883,14 @@ class InterviewEngine:
 
     def _ask_tailscale_key(self) -> Optional[str]:
         """Ask for Tailscale auth key with guidance and easy skip option."""
-        print("\n   💡 About Tailscale Auth Keys:")
-        print("      Auth keys allow automatic device connection.")
-        print("      Don't have one? You can:")
-        print("      1. Get one at: https://login.tailscale.com/admin/settings/keys")
-        print("      2. Or press Enter to set up manually later")
-        print("      3. Or type 'skip' to configure later\n")
+        self._emit(
+            "\n   💡 About Tailscale Auth Keys:",
+            "      Auth keys allow automatic device connection.",
+            "      Don't have one? You can:",
+            "      1. Get one at: https://login.tailscale.com/admin/settings/keys",
+            "      2. Or press Enter to set up manually later",
+            "      3. Or type 'skip' to configure later\n"
+        )
         
         max_attempts = 3
         for attempt in range(max_attempts):
@@ -7,102 +7,301 @@ import os
 import sys
 import json
 import argparse
-import uuid
+import secrets
 import logging
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Dict, Any
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Version info
 __version__ = "1.0.0"
 __author__ = "Home Server AI Team"
 
-# Import modules
-from hardware_detector import detect_hardware, HardwareProfile
-from interview import conduct_interview, UserRequirements, InterviewEngine
-from planner import create_plan, InstallationPlan
-from executor import ExecutionEngine, StateManager
-from error_recovery import ErrorRecoveryEngine
-from web_config import WebConfigServer
-from preflight import run_preflight_checks
-from config_validator import validate_config_file, validate_requirements
+# Setup modules are imported where they are first used, so --version,
+# --help and --resume don't pay for the whole import tree
 
 # Setup logging with rotation
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import queue
 import signal
 import atexit
+import threading
+import time
 
 # Global state for cleanup
 _state_manager = None
 _web_server = None
+_log_listener = None
 
 def _cleanup():
     """Cleanup function called on exit."""
-    global _state_manager, _web_server
+    global _state_manager, _web_server, _log_listener
     if _state_manager:
         try:
             _state_manager.close()
         except Exception:
             pass
+    # Drain queued log records before the process exits
+    if _log_listener:
+        try:
+            _log_listener.stop()
+            log_handler.flush_buffer()
+        except Exception:
+            pass
+        _log_listener = None
+
+_SHUTDOWN_SIGNALS = {signal.SIGINT, signal.SIGTERM}
+_INTERRUPT_MESSAGE = "\n\n⚠️  Received interrupt signal, cleaning up...\n".encode()
+
+def _signal_waiter(wakeup_fd: int):
+    """
+    Wait for SIGINT/SIGTERM on a dedicated thread.
+    Cleanup then runs in ordinary thread context rather than in a handler
+    that interrupts the main thread mid-write (SQLite, logging locks).
+    """
+    while True:
+        signums = os.read(wakeup_fd, 64)
+        if any(signum in _SHUTDOWN_SIGNALS for signum in signums):
+            break
+    os.write(2, _INTERRUPT_MESSAGE)
+    _cleanup()
+    os._exit(130)
+
+def _ignore_signal(signum, frame):
+    """Python-level no-op; the wakeup fd hands the signal to _signal_waiter."""
 
 def _signal_handler(signum, frame):
-    """Handle interrupt signals gracefully."""
-    print("\n\n⚠️  Received interrupt signal, cleaning up...")
+    """Handle interrupt signals on platforms without a signal wakeup pipe."""
+    os.write(2, _INTERRUPT_MESSAGE)
     _cleanup()
     sys.exit(130)
 
-# Register cleanup handlers
+def _install_signal_handlers():
+    """
+    Route SIGINT/SIGTERM to the waiter thread; called from main() only.
+    
+    The C-level handler writes the signal number to the wakeup pipe, so the
+    waiter reacts even while the main thread sits in a long system call. No
+    signal mask is involved, so subprocesses start with Ctrl+C working.
+    """
+    if os.name == 'nt':
+        signal.signal(signal.SIGINT, _signal_handler)
+        signal.signal(signal.SIGTERM, _signal_handler)
+        return
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(write_fd, False)
+    signal.set_wakeup_fd(write_fd, warn_on_full_buffer=False)
+    for signum in _SHUTDOWN_SIGNALS:
+        signal.signal(signum, _ignore_signal)
+    threading.Thread(target=_signal_waiter, args=(read_fd,), name='signal-waiter', daemon=True).start()
+
+# Register cleanup handlers; atexit covers normal exits
 atexit.register(_cleanup)
-signal.signal(signal.SIGINT, _signal_handler)
-signal.signal(signal.SIGTERM, _signal_handler)
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that batches writes in a 64 KiB buffer.
+    Flushes on WARNING and above, on rollover and on close; INFO records
+    otherwise reach the file in large writes instead of one write per record.
+    """
+    BUFFER_SIZE = 64 * 1024
+    
+    def __init__(self, *args, **kwargs):
+        self._size = 0
+        super().__init__(*args, **kwargs)
+    
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, encoding=self.encoding,
+                      errors=self.errors, buffering=self.BUFFER_SIZE)
+        # Track the size in memory: the stdlib seek()/tell() per record
+        # would flush the buffer every time
+        self._size = stream.seek(0, 2)
+        self._rotatable = os.path.isfile(self.baseFilename)
+        return stream
+    
+    def doRollover(self):
+        self.flush_buffer()
+        super().doRollover()
+    
+    def emit(self, record):
+        # Formats once and writes directly: the stdlib path formats twice
+        # (shouldRollover and StreamHandler.emit) and flushes every record
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            # maxBytes is in bytes; emoji and other non-ASCII text encode wider
+            size = len(msg.encode(self.stream.encoding, self.stream.errors))
+            if self.maxBytes > 0 and self._rotatable and self._size + size >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(msg)
+            self._size += size
+            if record.levelno >= logging.WARNING:
+                self.flush_buffer()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+    
+    def flush_buffer(self):
+        """Write out buffered records unconditionally."""
+        self.flush()
+
 
 # Setup logging with rotation
-log_handler = RotatingFileHandler('setup.log', maxBytes=5*1024*1024, backupCount=3)
+log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+log_handler = BufferedRotatingFileHandler('setup.log', maxBytes=5*1024*1024, backupCount=3)
 log_handler.setLevel(logging.INFO)
+log_handler.setFormatter(log_formatter)
 console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
+console_handler.setFormatter(log_formatter)
+
+# File and console handlers run on a background listener thread, so logging
+# calls in the setup flow only enqueue the record
+_log_queue = queue.SimpleQueue()
+_queue_handler = QueueHandler(_log_queue)
+# Merge args into the message only; the listener's handlers apply the real format
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+_log_listener = QueueListener(_log_queue, log_handler, console_handler, respect_handler_level=True)
+_log_listener.start()
 
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[log_handler, console_handler]
+    handlers=[_queue_handler]
 )
 logger = logging.getLogger(__name__)
 
 
+# Static output built once; the print helpers below do a single write each
+_HEADER_STR = (
+    "\n" + "="*70 + "\n"
+    "  🏠 Home Server AI Setup Agent\n"
+    "  Your AI-powered home server installer\n"
+    + "="*70 + "\n\n"
+)
+_SECTION_FMT = "\n{icon} {title}\n" + "-"*70 + "\n"
+_SUCCESS_PREFIX = "   ✅ "
+_WARNING_PREFIX = "   ⚠️  "
+_ERROR_PREFIX = "   ❌ "
+_INFO_PREFIX = "   ℹ️  "
+
+
 def print_header():
     """Print beautiful header."""
-    print("\n" + "="*70)
-    print("  🏠 Home Server AI Setup Agent")
-    print("  Your AI-powered home server installer")
-    print("="*70)
-    print()
+    sys.stdout.write(_HEADER_STR)
 
 
 def print_section(title: str, icon: str = "📋"):
     """Print section header."""
-    print(f"\n{icon} {title}")
-    print("-"*70)
+    sys.stdout.write(_SECTION_FMT.format(icon=icon, title=title))
 
 
 def print_success(message: str):
     """Print success message."""
-    print(f"   ✅ {message}")
+    sys.stdout.write(f"{_SUCCESS_PREFIX}{message}\n")
 
 
 def print_warning(message: str):
     """Print warning message."""
-    print(f"   ⚠️  {message}")
+    sys.stdout.write(f"{_WARNING_PREFIX}{message}\n")
 
 
 def print_error(message: str):
     """Print error message."""
-    print(f"   ❌ {message}")
+    sys.stdout.write(f"{_ERROR_PREFIX}{message}\n")
 
 
 def print_info(message: str):
     """Print info message."""
-    print(f"   ℹ️  {message}")
+    sys.stdout.write(f"{_INFO_PREFIX}{message}\n")
+
+
+def _loads_json(raw: bytes) -> Any:
+    """Parse JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _load_json_file(path: str) -> Any:
+    """Parse a JSON file, using orjson straight from bytes when available."""
+    return _loads_json(Path(path).read_bytes())
+
+
+def _dumps_json(data: Any) -> str:
+    """Serialize data as indented JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=2)
+
+
+_HW_CACHE_PATH = Path('~/.cache/home-server-ai/hw.json').expanduser()
+_HW_CACHE_TTL = 24 * 3600
+_MACHINE_ID_PATH = Path('/etc/machine-id')
+
+
+def _cached_hardware(rescan: bool = False):
+    """
+    Return the hardware profile, reusing a cached detection when fresh.
+    
+    The cache is keyed by /etc/machine-id and kernel release and expires
+    after 24 hours, so --resume and --plan-only don't re-probe the system.
+    Executing a plan drops it (see _invalidate_hardware_cache).
+    """
+    from hardware_detector import HardwareProfile, detect_hardware
+    
+    try:
+        machine_id = _MACHINE_ID_PATH.read_text().strip()
+    except OSError:
+        machine_id = ''
+    kernel = os.uname().release
+    
+    if not rescan and machine_id:
+        try:
+            cached = _load_json_file(str(_HW_CACHE_PATH))
+            if (cached.get('machine_id') == machine_id
+                    and cached.get('kernel') == kernel
+                    and time.time() - cached.get('ts', 0) < _HW_CACHE_TTL):
+                return HardwareProfile(**cached['profile'])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+    
+    profile = detect_hardware()
+    if machine_id:
+        try:
+            _HW_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = _HW_CACHE_PATH.with_suffix('.tmp')
+            tmp_path.write_text(_dumps_json({
+                'machine_id': machine_id,
+                'kernel': kernel,
+                'ts': time.time(),
+                'profile': profile.to_dict(),
+            }))
+            os.replace(tmp_path, _HW_CACHE_PATH)
+        except OSError as e:
+            logger.debug(f"Could not write hardware cache: {e}")
+    return profile
+
+
+def _invalidate_hardware_cache():
+    """
+    Drop the cached hardware profile.
+    
+    Installing changes has_docker, has_curl and free disk space, so a re-run
+    after any (even partial) execution must detect them afresh.
+    """
+    try:
+        _HW_CACHE_PATH.unlink(missing_ok=True)
+    except OSError as e:
+        logger.debug(f"Could not remove hardware cache: {e}")
 
 
 def load_or_create_config(path: str = "config.json", prefer_existing: bool = True) -> Optional[Dict[str, Any]]:
@@ -117,31 +316,40 @@ def load_or_create_config(path: str = "config.json", prefer_existing: bool = Tru
         Configuration dict or None
     """
     config = None
+    if not prefer_existing:
+        return config
+    
+    # Read once instead of exists() + open(), so the file can't vanish in between
+    try:
+        raw = Path(path).read_bytes()
+    except FileNotFoundError:
+        return config
+    except IOError as e:
+        print_error(f"Could not read config file: {e}")
+        return config
+    
+    print_section("Loading Configuration", "📂")
+    print_info(f"Found existing configuration: {path}")
     
-    if os.path.exists(path) and prefer_existing:
-        print_section("Loading Configuration", "📂")
-        print_info(f"Found existing configuration: {path}")
+    try:
+        config = _loads_json(raw)
         
-        try:
-            with open(path, 'r') as f:
-                config = json.load(f)
-            
-            # Show summary
-            print_info(f"AI Provider: {config.get('ai_provider', 'None (templates)')}")
-            print_info(f"Use Cases: {', '.join(config.get('use_cases', []))}")
-            print_info(f"Storage: {config.get('storage_path', '/var/lib')}")
-            
-            # Ask to use or recreate
-            use_existing = input("\nUse this configuration? [Y/n]: ").strip().lower()
-            if not use_existing or use_existing in ['y', 'yes']:
-                print_success("Using existing configuration")
-                return config
-            else:
-                print_info("Will create new configuration")
-                config = None
-        except (json.JSONDecodeError, IOError) as e:
-            print_error(f"Could not read config file: {e}")
+        # Show summary
+        print_info(f"AI Provider: {config.get('ai_provider', 'None (templates)')}")
+        print_info(f"Use Cases: {', '.join(config.get('use_cases', []))}")
+        print_info(f"Storage: {config.get('storage_path', '/var/lib')}")
+        
+        # Ask to use or recreate
+        use_existing = input("\nUse this configuration? [Y/n]: ").strip().lower()
+        if not use_existing or use_existing in ['y', 'yes']:
+            print_success("Using existing configuration")
+            return config
+        else:
+            print_info("Will create new configuration")
             config = None
+    except (json.JSONDecodeError, IOError) as e:
+        print_error(f"Could not read config file: {e}")
+        config = None
     
     return config
 
@@ -153,6 +361,8 @@ def run_cli_interview() -> Dict[str, Any]:
     print_section("Configuration", "⚙️")
     print("Let's set up your home server. You can skip optional fields by pressing Enter.\n")
     
+    from interview import InterviewEngine
+    
     engine = InterviewEngine()
     requirements = engine.conduct_interview()
     return requirements.to_dict()
@@ -170,23 +380,23 @@ def run_web_interface(port: int = 8080) -> Optional[Dict[str, Any]]:
     print_info(f"Open http://localhost:{port} in your browser")
     print_info("Press Ctrl+C to cancel\n")
     
+    from web_config import WebConfigServer
+    
     server = WebConfigServer(port=port, config_file="config.json")
     global _web_server
     _web_server = server
     
     try:
         # Start server without blocking parameter
-        import threading
         thread = threading.Thread(target=server.run)
         thread.daemon = True
         thread.start()
         
-        # Wait for config
-        config = server.wait_for_config(timeout=300)
-        
-        if config:
+        # Block until the /save route signals, without polling
+        print_info("Waiting for configuration (timeout: 300s)")
+        if server.config_ready.wait(timeout=300):
             print_success("Configuration received from web interface")
-            return config
+            return server.config_data
         else:
             print_error("Configuration timeout or cancelled")
             return None
@@ -194,6 +404,9 @@ def run_web_interface(port: int = 8080) -> Optional[Dict[str, Any]]:
     except Exception as e:
         print_error(f"Web interface error: {e}")
         return None
+    finally:
+        server.stop()
+        _web_server = None
 
 
 def run_setup_flow(args) -> int:
@@ -208,10 +421,12 @@ def run_setup_flow(args) -> int:
     print_header()
     
     # Generate session ID
-    session_id = str(uuid.uuid4())[:8]
+    session_id = secrets.token_hex(4)
     print_info(f"Session ID: {session_id}")
     print_info(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
+    from executor import ExecutionEngine, StateManager
+    
     # Initialize state manager
     _state_manager = StateManager()
     state = _state_manager
@@ -225,7 +440,7 @@ def run_setup_flow(args) -> int:
     # Step 1: Hardware Detection
     print_section("Hardware Detection", "🔍")
     try:
-        hardware_profile = detect_hardware()
+        hardware_profile = _cached_hardware(rescan=args.rescan_hardware)
         print_info(f"CPU: {hardware_profile.cpu_model} ({hardware_profile.cpu_cores} cores)")
         print_info(f"RAM: {hardware_profile.ram_gb:.1f} GB")
         print_info(f"Disk: {hardware_profile.disk_gb}")
@@ -257,8 +472,19 @@ def run_setup_flow(args) -> int:
     
     requirements = None
     
+    # Non-interactive answers file skips the interview entirely
+    if args.config:
+        from interview import UserRequirements
+        try:
+            answers = _load_json_file(args.config)
+            requirements = UserRequirements.from_answers_dict(answers).to_dict()
+            print_success(f"Loaded answers from {args.config}")
+        except (json.JSONDecodeError, IOError, TypeError, AttributeError) as e:
+            print_error(f"Could not load answers file {args.config}: {e}")
+            return 1
+    
     # Try to load existing config first
-    if not args.no_config and os.path.exists("config.json"):
+    if not requirements and not args.no_config:
         requirements = load_or_create_config("config.json", prefer_existing=True)
     
     # If no config or user wants new one
@@ -278,6 +504,7 @@ def run_setup_flow(args) -> int:
         return 1
     
     # Validate requirements
+    from config_validator import validate_requirements
     is_valid, errors, warnings = validate_requirements(requirements)
     if not is_valid:
         print_error("Configuration validation failed:")
@@ -301,6 +528,7 @@ def run_setup_flow(args) -> int:
     else:
         print_info("Using template-based installation (no AI)")
     
+    from planner import create_plan
     try:
         plan_obj = create_plan(hardware, requirements)
         plan = plan_obj.to_dict()
@@ -319,17 +547,20 @@ def run_setup_flow(args) -> int:
         print_error(f"Plan generation failed: {e}")
         return 1
     
-    # Save session
+    # Save session, committed now rather than by the deferred-commit timer so
+    # it is durable before --plan-only returns or a later --resume looks it up
     state.create_session(session_id, hardware, requirements, plan)
+    state.flush()
     
     # Plan only mode
     if args.plan_only:
         print_section("Plan Only Mode", "📋")
-        print(json.dumps(plan, indent=2))
+        print(_dumps_json(plan))
         return 0
     
     # Pre-flight checks
     print_section("Pre-flight Checks", "✅")
+    from preflight import run_preflight_checks
     storage_path = requirements.get('storage_path')
     if not run_preflight_checks(storage_path):
         print_error("Pre-flight checks failed. Fix issues and try again.")
@@ -354,6 +585,9 @@ def run_setup_flow(args) -> int:
     
     print(f"\n   📊 Progress: 0/{len(plan['steps'])} steps\n")
     
+    # Before running, so an interrupted install doesn't leave the cache stale either
+    if not args.dry_run:
+        _invalidate_hardware_cache()
     results = executor.execute_plan(plan, resume_from=args.resume_step or 0)
     
     # Summary
@@ -397,14 +631,16 @@ Examples:
     parser.add_argument('--dry-run', action='store_true', help='Test without making changes')
     parser.add_argument('--web', action='store_true', help='Use web interface for configuration')
     parser.add_argument('--port', type=int, default=8080, help='Port for web interface (default: 8080)')
-    parser.add_argument('--config', type=str, help='Load config from file')
+    parser.add_argument('--config', type=str, help='Load answers from a JSON file and skip the interview')
     parser.add_argument('--no-config', action='store_true', help='Ignore existing config.json')
+    parser.add_argument('--rescan-hardware', action='store_true', help='Ignore cached hardware detection')
     parser.add_argument('--plan-only', action='store_true', help='Generate plan only, do not execute')
     parser.add_argument('--resume', type=str, help='Resume session by ID')
     parser.add_argument('--resume-step', type=int, help='Resume from specific step')
     parser.add_argument('-y', '--yes', action='store_true', help='Auto-approve all prompts')
     
     args = parser.parse_args()
+    _install_signal_handlers()
     
     try:
         exit_code = run_setup_flow(args)
@@ -4,17 +4,23 @@ Monitoring Dashboard for Home Server Agent
 Real-time service monitoring, system metrics, and service management.
 """
 import os
+import re
 import sys
 import json
+import shutil
+import socket
+import gzip
+import hashlib
 import sqlite3
 import subprocess
 import logging
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, asdict, replace
 
 # Optional imports with fallbacks
 try:
@@ -23,18 +29,93 @@ except ImportError:
     psutil = None
 
 try:
-    from flask import Flask, render_template_string, request, jsonify, Response
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from pystemd.systemd1 import Unit as SystemdUnit
+except ImportError:
+    SystemdUnit = None
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+    HTTPAdapter = None
+
+try:
+    from flask import Flask, request, Response
 except ImportError:
     Flask = None
-    render_template_string = None
     request = None
-    jsonify = None
     Response = None
 
+try:
+    from waitress import serve as waitress_serve
+except ImportError:
+    waitress_serve = None
+
 # Setup logging
 logger = logging.getLogger(__name__)
 
 
+class _PollingAccessLogFilter(logging.Filter):
+    """Drop werkzeug access-log lines for the endpoints the dashboard polls."""
+    
+    QUIET_REQUESTS = ('"GET /api/dashboard', '"GET /api/metrics', '"GET /api/services ', '"GET /health')
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        return not any(quiet in message for quiet in self.QUIET_REQUESTS)
+
+
+_BOOT_TIME: Optional[float] = None
+
+# waitress threads kept free for API requests and log streams, on top of
+# one per open /api/stream subscriber
+_REQUEST_THREADS = 8
+
+
+def _parse_docker_timestamp(value: str) -> float:
+    """Parse Docker's RFC 3339 timestamp (nanosecond precision, 'Z') to epoch seconds."""
+    if ciso8601 is not None:
+        return ciso8601.parse_datetime(value).timestamp()
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def _process_start_time(pid: int) -> Optional[float]:
+    """Start time of pid in epoch seconds, read from /proc without forking."""
+    global _BOOT_TIME
+    if psutil:
+        try:
+            return psutil.Process(pid).create_time()
+        except psutil.Error:
+            return None
+    try:
+        if _BOOT_TIME is None:
+            with open('/proc/stat') as f:
+                _BOOT_TIME = next(float(line.split()[1]) for line in f if line.startswith('btime'))
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+        # comm (field 2) may contain spaces; starttime is field 22, in clock ticks since boot
+        starttime = int(stat.rsplit(')', 1)[1].split()[19])
+        return _BOOT_TIME + starttime / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
 @dataclass
 class ServiceStatus:
     """Status of a single service."""
@@ -66,6 +147,9 @@ class SystemMetrics:
     load_average: Tuple[float, float, float]
     timestamp: str
     
+    # Fields that only change with the hardware, served once by /api/metrics/static
+    STATIC_FIELDS = ('cpu_count', 'ram_total_gb', 'disk_total_gb')
+    
     def to_dict(self) -> Dict:
         return {
             'cpu_percent': self.cpu_percent,
@@ -79,73 +163,326 @@ class SystemMetrics:
             'load_average': list(self.load_average),
             'timestamp': self.timestamp
         }
+    
+    def dynamic_dict(self) -> Dict:
+        """to_dict() without STATIC_FIELDS, for payloads sent on every refresh."""
+        data = self.to_dict()
+        for field in self.STATIC_FIELDS:
+            del data[field]
+        return data
+
+
+@dataclass(frozen=True, slots=True)
+class ServiceConfig:
+    """How to detect, probe and control one service."""
+    check_cmd: Tuple[str, ...]
+    status_cmd: Optional[Tuple[str, ...]] = None
+    container_name: Optional[str] = None
+    ports: Tuple[int, ...] = ()
+    systemd_service: Optional[str] = None
+    health_url: Optional[str] = None
 
 
 class ServiceMonitor:
     """Monitors the status of installed services."""
     
-    SERVICES = {
-        'tailscale': {
-            'check_cmd': ['tailscale', 'version'],
-            'status_cmd': ['tailscale', 'status'],
-            'ports': [41641],
-            'systemd_service': 'tailscaled',
-            'health_url': None,
-        },
-        'adguard': {
-            'check_cmd': ['docker', 'ps'],
-            'container_name': 'adguardhome',
-            'ports': [53, 3000],
-            'systemd_service': None,
-            'health_url': 'http://localhost:3000',
-        },
-        'jellyfin': {
-            'check_cmd': ['docker', 'ps'],
-            'container_name': 'jellyfin',
-            'ports': [8096],
-            'systemd_service': None,
-            'health_url': 'http://localhost:8096',
-        },
-        'immich': {
-            'check_cmd': ['docker', 'ps'],
-            'container_name': 'immich_server',
-            'ports': [2283],
-            'systemd_service': None,
-            'health_url': 'http://localhost:2283',
-        },
-        'openclaw': {
-            'check_cmd': ['which', 'openclaw'],
-            'ports': [],
-            'systemd_service': 'openclaw',
-            'health_url': None,
-        },
-        'docker': {
-            'check_cmd': ['docker', 'version'],
-            'ports': [],
-            'systemd_service': 'docker',
-            'health_url': None,
-        }
+    SERVICES: Dict[str, ServiceConfig] = {
+        'tailscale': ServiceConfig(
+            check_cmd=('tailscale', 'version'),
+            status_cmd=('tailscale', 'status'),
+            ports=(41641,),
+            systemd_service='tailscaled',
+        ),
+        'adguard': ServiceConfig(
+            check_cmd=('docker', 'ps'),
+            container_name='adguardhome',
+            ports=(53, 3000),
+            health_url='http://localhost:3000',
+        ),
+        'jellyfin': ServiceConfig(
+            check_cmd=('docker', 'ps'),
+            container_name='jellyfin',
+            ports=(8096,),
+            health_url='http://localhost:8096',
+        ),
+        'immich': ServiceConfig(
+            check_cmd=('docker', 'ps'),
+            container_name='immich_server',
+            ports=(2283,),
+            health_url='http://localhost:2283',
+        ),
+        'openclaw': ServiceConfig(
+            check_cmd=('which', 'openclaw'),
+            systemd_service='openclaw',
+        ),
+        'docker': ServiceConfig(
+            check_cmd=('docker', 'version'),
+            systemd_service='docker',
+        ),
     }
     
-    def __init__(self):
+    # Upper bound on waiting for one service's checks in get_all_statuses
+    CHECK_TIMEOUT = 15
+    
+    CONTROL_ACTIONS = frozenset(('start', 'stop', 'restart'))
+    
+    def __init__(self, cache_ttl: float = 5.0):
         self.status_cache: Dict[str, ServiceStatus] = {}
         self.last_update: Optional[str] = None
+        # Statuses younger than cache_ttl are served without re-probing; the
+        # lock also makes concurrent callers share a single probe
+        self.cache_ttl = cache_ttl
+        self._last_update_ts = 0.0
+        self._cache_lock = threading.RLock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stop_refresh = threading.Event()
+        # Checks mostly wait on subprocesses and HTTP, so run them side by side
+        self._pool = ThreadPoolExecutor(max_workers=len(self.SERVICES), thread_name_prefix="svcmon")
+        # Container state for all services, refreshed once per get_all_statuses()
+        self._docker_by_name: Dict[str, Dict] = {}
+        self._container_started: Dict[str, float] = {}
+        # container ID -> (main PID, process start time), to skip docker inspect
+        self._container_procs: Dict[str, Tuple[int, float]] = {}
+        # Binary-existence checks resolved on PATH once, not forked per refresh
+        self._installed_binaries: Dict[Tuple[str, ...], bool] = {}
+        self.refresh_installed_binaries()
+        # systemd units queried over D-Bus (pystemd), loaded on first use
+        self._systemd_units: Dict[str, object] = {}
+        self._systemd_lock = threading.Lock()
+        # Without pystemd: unit -> (active, CLOCK_MONOTONIC start or None), one systemctl per refresh
+        self._systemd_state: Dict[str, Tuple[bool, Optional[float]]] = {}
+        # Keep-alive HTTP session for health checks, created on first use
+        self._http = None
+        self._http_lock = threading.Lock()
     
-    def get_all_statuses(self) -> Dict[str, ServiceStatus]:
-        """Get status of all services."""
-        statuses = {}
+    def get_all_statuses(self, force: bool = False) -> Dict[str, ServiceStatus]:
+        """Get status of all services, from cache if fresher than cache_ttl."""
+        with self._cache_lock:
+            if not force and self.status_cache and time.monotonic() - self._last_update_ts < self.cache_ttl:
+                return dict(self.status_cache)
+            # One as-of timestamp for the whole refresh
+            now = datetime.now().isoformat()
+            statuses = self._probe_all(now)
+            self.status_cache = statuses
+            self.last_update = now
+            self._last_update_ts = time.monotonic()
+            return dict(statuses)
+    
+    def refresh_one(self, name: str) -> Optional[ServiceStatus]:
+        """Re-probe a single service (e.g. after control_service) and update its cache entry."""
+        config = self.SERVICES.get(name)
+        if config is None:
+            return None
+        with self._cache_lock:
+            if config.container_name:
+                self._refresh_docker_snapshot()
+            if config.systemd_service:
+                self._refresh_systemd_snapshot([config.systemd_service])
+            status = self._check_service(name, config)
+            self.status_cache[name] = status
+            return status
+    
+    def start_refresh_loop(self, interval: Optional[float] = None, on_refresh=None):
+        """
+        Keep the status cache warm from a background thread.
+        
+        on_refresh, if given, is called with the new statuses after each refresh.
+        """
+        if self._refresh_thread is not None:
+            return
+        interval = interval or self.cache_ttl
+        
+        def refresh_loop():
+            while not self._stop_refresh.is_set():
+                try:
+                    statuses = self.get_all_statuses(force=True)
+                    if on_refresh:
+                        on_refresh(statuses)
+                except Exception as e:
+                    logger.warning(f"Service status refresh failed: {e}")
+                self._stop_refresh.wait(interval)
+        
+        self._stop_refresh.clear()
+        self._refresh_thread = threading.Thread(target=refresh_loop, name="svcmon-refresh", daemon=True)
+        self._refresh_thread.start()
+    
+    def stop_refresh_loop(self):
+        """Stop the background refresh thread."""
+        self._stop_refresh.set()
+        self._refresh_thread = None
+    
+    def _probe_all(self, now: str) -> Dict[str, ServiceStatus]:
+        """Probe every service concurrently."""
+        self._refresh_systemd_snapshot()
+        # Services that don't read the docker snapshot start right away, so
+        # their probes overlap with the docker ps below
+        futures = {
+            service_name: self._pool.submit(self._check_service, service_name, config, now)
+            for service_name, config in self.SERVICES.items()
+            if not config.container_name
+        }
+        self._refresh_docker_snapshot()
         for service_name, config in self.SERVICES.items():
-            statuses[service_name] = self._check_service(service_name, config)
-        self.status_cache = statuses
-        self.last_update = datetime.now().isoformat()
+            if config.container_name:
+                futures[service_name] = self._pool.submit(self._check_service, service_name, config, now)
+        
+        statuses = {}
+        for service_name in self.SERVICES:
+            try:
+                statuses[service_name] = futures[service_name].result(timeout=self.CHECK_TIMEOUT)
+            except FutureTimeoutError:
+                statuses[service_name] = ServiceStatus(
+                    name=service_name,
+                    installed=False,
+                    running=False,
+                    healthy=False,
+                    version=None,
+                    ports=list(self.SERVICES[service_name].ports),
+                    uptime_seconds=None,
+                    last_check=now,
+                    error_message="Status check timed out"
+                )
         return statuses
     
-    def _check_service(self, name: str, config: Dict) -> ServiceStatus:
-        """Check status of a single service."""
-        now = datetime.now().isoformat()
+    def refresh_installed_binaries(self):
+        """Re-probe PATH for the services whose install check is a plain binary."""
+        installed = {}
+        for config in self.SERVICES.values():
+            check_cmd = config.check_cmd
+            # docker checks need the daemon, not just the binary
+            if not check_cmd or check_cmd[0] == 'docker':
+                continue
+            binary = check_cmd[1] if check_cmd[0] == 'which' else check_cmd[0]
+            installed[check_cmd] = shutil.which(binary) is not None
+        self._installed_binaries = installed
+    
+    def _refresh_docker_snapshot(self):
+        """
+        Load all container state with one `docker ps`.
+        
+        Start times come from each container's main process in /proc; `docker
+        inspect` only runs for containers whose cached PID is no longer that
+        process (first sight, restart, or PID reuse).
+        """
+        by_name: Dict[str, Dict] = {}
+        started_by_name: Dict[str, float] = {}
+        procs: Dict[str, Tuple[int, float]] = {}
+        
+        try:
+            result = subprocess.run(
+                ['docker', 'ps', '-a', '--no-trunc', '--format', '{{json .}}'],
+                capture_output=True, text=True, timeout=10
+            )
+            if result.returncode == 0:
+                for line in result.stdout.splitlines():
+                    if line.strip():
+                        container = json.loads(line)
+                        by_name[container.get('Names', '')] = container
+            
+            stale = []
+            for config in self.SERVICES.values():
+                name = config.container_name
+                container = by_name.get(name)
+                if not container or container.get('State') != 'running':
+                    continue
+                cached = self._container_procs.get(container.get('ID'))
+                if cached and _process_start_time(cached[0]) == cached[1]:
+                    procs[container['ID']] = cached
+                    started_by_name[name] = cached[1]
+                else:
+                    stale.append(name)
+            
+            if stale:
+                result = subprocess.run(
+                    ['docker', 'inspect', '--format', '{{json .}}', *stale],
+                    capture_output=True, text=True, timeout=10
+                )
+                # Non-zero only if a container vanished in between; parse what we got
+                for line in result.stdout.splitlines():
+                    if not line.strip():
+                        continue
+                    details = json.loads(line)
+                    name = details.get('Name', '').lstrip('/')
+                    state = details.get('State', {})
+                    pid = state.get('Pid')
+                    started = _process_start_time(pid) if pid else None
+                    if started is not None:
+                        procs[details.get('Id')] = (pid, started)
+                    elif state.get('StartedAt'):
+                        # No access to the host's /proc (e.g. remote daemon)
+                        started = _parse_docker_timestamp(state['StartedAt'])
+                    if started is not None:
+                        started_by_name[name] = started
+        except (subprocess.TimeoutExpired, FileNotFoundError, ValueError):
+            pass
+        
+        self._docker_by_name = by_name
+        self._container_started = started_by_name
+        self._container_procs = procs
+    
+    def _refresh_systemd_snapshot(self, services: Optional[List[str]] = None):
+        """
+        Load state for all (or the given) systemd services with one `systemctl show`.
+        
+        Skipped when pystemd is available, since D-Bus reads don't fork at all.
+        """
+        if SystemdUnit is not None:
+            return
+        # A full refresh starts clean; a partial one updates the existing entries
+        if services is None:
+            services = [config.systemd_service for config in self.SERVICES.values()
+                        if config.systemd_service]
+            state = {}
+        else:
+            state = dict(self._systemd_state)
+        if not services:
+            return
+        
+        try:
+            result = subprocess.run(
+                ['systemctl', 'show', '--property=Id,ActiveState,ActiveEnterTimestampMonotonic',
+                 *(f"{service}.service" for service in services)],
+                capture_output=True, text=True, timeout=5
+            )
+            if result.returncode != 0:
+                return
+            # One blank-line separated block per unit
+            for block in result.stdout.strip().split('\n\n'):
+                props = dict(line.split('=', 1) for line in block.splitlines() if '=' in line)
+                unit_id = props.get('Id', '')
+                if not unit_id.endswith('.service'):
+                    continue
+                started_us = int(props.get('ActiveEnterTimestampMonotonic') or 0)
+                state[unit_id[:-len('.service')]] = (
+                    props.get('ActiveState') == 'active',
+                    started_us / 1_000_000 if started_us else None,
+                )
+        except (subprocess.TimeoutExpired, FileNotFoundError, ValueError):
+            return
+        self._systemd_state = state
+    
+    def _systemd_unit(self, service: str):
+        """Return a loaded pystemd unit for service, or None to fall back to systemctl."""
+        if SystemdUnit is None:
+            return None
+        with self._systemd_lock:
+            unit = self._systemd_units.get(service)
+            if unit is None:
+                try:
+                    unit = SystemdUnit(f"{service}.service".encode())
+                    unit.load()
+                except Exception as e:
+                    logger.debug(f"D-Bus unavailable for {service}: {e}")
+                    return None
+                self._systemd_units[service] = unit
+            return unit
+    
+    def _check_service(self, name: str, config: ServiceConfig, now: Optional[str] = None) -> ServiceStatus:
+        """Check status of a single service; now is the refresh's shared timestamp."""
+        now = now or datetime.now().isoformat()
         
         # Check if installed
-        installed = self._is_installed(config.get('check_cmd', []), config.get('container_name'))
+        installed = self._is_installed(config.check_cmd, config.container_name)
         
         if not installed:
             return ServiceStatus(
@@ -154,7 +491,7 @@ class ServiceMonitor:
                 running=False,
                 healthy=False,
                 version=None,
-                ports=config.get('ports', []),
+                ports=list(config.ports),
                 uptime_seconds=None,
                 last_check=now
             )
@@ -180,49 +517,49 @@ class ServiceMonitor:
             running=running,
             healthy=healthy and running,
             version=version,
-            ports=config.get('ports', []),
+            ports=list(config.ports),
             uptime_seconds=uptime,
             last_check=now,
             error_message=error_msg
         )
     
-    def _is_installed(self, check_cmd: List[str], container_name: Optional[str] = None) -> bool:
+    def _is_installed(self, check_cmd: Tuple[str, ...], container_name: Optional[str] = None) -> bool:
         """Check if service is installed."""
         if not check_cmd:
             return False
         
+        if container_name and 'docker' in check_cmd:
+            return container_name in self._docker_by_name
+        
+        if check_cmd in self._installed_binaries:
+            return self._installed_binaries[check_cmd]
+        
         try:
-            if container_name and 'docker' in check_cmd:
-                # Check for container
-                result = subprocess.run(
-                    ['docker', 'ps', '-a', '--filter', f'name={container_name}', '--format', '{{.Names}}'],
-                    capture_output=True, text=True, timeout=10
-                )
-                return container_name in result.stdout
-            else:
-                result = subprocess.run(check_cmd, capture_output=True, timeout=5)
-                return result.returncode == 0
+            result = subprocess.run(check_cmd, capture_output=True, timeout=5)
+            return result.returncode == 0
         except (subprocess.TimeoutExpired, FileNotFoundError):
             return False
     
-    def _is_running(self, name: str, config: Dict) -> bool:
+    def _is_running(self, name: str, config: ServiceConfig) -> bool:
         """Check if service is running."""
-        container_name = config.get('container_name')
-        systemd_service = config.get('systemd_service')
+        container_name = config.container_name
+        systemd_service = config.systemd_service
         
         # Check container
         if container_name:
-            try:
-                result = subprocess.run(
-                    ['docker', 'ps', '--filter', f'name={container_name}', '--filter', 'status=running', '--format', '{{.Names}}'],
-                    capture_output=True, text=True, timeout=10
-                )
-                return container_name in result.stdout
-            except (subprocess.TimeoutExpired, FileNotFoundError):
-                return False
+            return self._docker_by_name.get(container_name, {}).get('State') == 'running'
         
         # Check systemd service
         if systemd_service:
+            unit = self._systemd_unit(systemd_service)
+            if unit is not None:
+                try:
+                    return unit.Unit.ActiveState == b'active'
+                except Exception:
+                    pass
+            state = self._systemd_state.get(systemd_service)
+            if state is not None:
+                return state[0]
             try:
                 result = subprocess.run(
                     ['systemctl', 'is-active', systemd_service],
@@ -235,7 +572,7 @@ class ServiceMonitor:
         # Default: assume running if installed
         return True
     
-    def _get_version(self, name: str, config: Dict) -> Optional[str]:
+    def _get_version(self, name: str, config: ServiceConfig) -> Optional[str]:
         """Get service version."""
         version_cmds = {
             'tailscale': ['tailscale', 'version'],
@@ -252,56 +589,77 @@ class ServiceMonitor:
                 pass
         
         # For Docker containers, get image version
-        if config.get('container_name'):
-            try:
-                result = subprocess.run(
-                    ['docker', 'inspect', '--format={{.Config.Image}}', config['container_name']],
-                    capture_output=True, text=True, timeout=5
-                )
-                if result.returncode == 0:
-                    return result.stdout.strip()
-            except (subprocess.TimeoutExpired, FileNotFoundError):
-                pass
+        if config.container_name:
+            image = self._docker_by_name.get(config.container_name, {}).get('Image')
+            if image:
+                return image
         
         return None
     
-    def _health_check(self, config: Dict) -> Tuple[bool, Optional[str]]:
+    def _get_http_session(self):
+        """Return the shared, connection-pooled requests session."""
+        with self._http_lock:
+            if self._http is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = 'HomeServerMonitor/1.0'
+                self._http = session
+            return self._http
+    
+    def _health_check(self, config: ServiceConfig) -> Tuple[bool, Optional[str]]:
         """Perform health check on service."""
-        health_url = config.get('health_url')
+        health_url = config.health_url
+        
+        if health_url and requests is not None:
+            try:
+                response = self._get_http_session().head(health_url, timeout=2, allow_redirects=False)
+                # Anything short of a server error means the service is answering
+                if 200 <= response.status_code < 500:
+                    return True, None
+                return False, f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                return False, str(e)
         
+        # Without requests, fall back to a one-off urllib request
         if health_url:
             try:
                 import urllib.request
                 req = urllib.request.Request(health_url, method='HEAD')
                 req.add_header('User-Agent', 'HomeServerMonitor/1.0')
-                with urllib.request.urlopen(req, timeout=5) as response:
+                with urllib.request.urlopen(req, timeout=2) as response:
                     return True, None
             except Exception as e:
                 return False, str(e)
         
         return True, None
     
-    def _get_uptime(self, config: Dict) -> Optional[int]:
+    def _get_uptime(self, config: ServiceConfig) -> Optional[int]:
         """Get service uptime in seconds."""
-        container_name = config.get('container_name')
-        systemd_service = config.get('systemd_service')
+        container_name = config.container_name
+        systemd_service = config.systemd_service
         
         if container_name:
-            try:
-                result = subprocess.run(
-                    ['docker', 'inspect', '--format={{.State.StartedAt}}', container_name],
-                    capture_output=True, text=True, timeout=5
-                )
-                if result.returncode == 0:
-                    started_at = result.stdout.strip()
-                    # Parse Docker timestamp
-                    started_dt = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-                    uptime = (datetime.now().replace(tzinfo=started_dt.tzinfo) - started_dt).total_seconds()
-                    return int(uptime)
-            except Exception:
-                pass
+            started = self._container_started.get(container_name)
+            if started is not None:
+                return int(time.time() - started)
         
         if systemd_service:
+            unit = self._systemd_unit(systemd_service)
+            if unit is not None:
+                try:
+                    # Microseconds since the epoch; 0 if the unit never became active
+                    started_us = unit.Unit.ActiveEnterTimestamp
+                    if started_us:
+                        return int(time.time() - started_us / 1_000_000)
+                    return None
+                except Exception:
+                    pass
+            state = self._systemd_state.get(systemd_service)
+            if state is not None:
+                # Same clock as time.monotonic() on Linux
+                return int(time.monotonic() - state[1]) if state[1] is not None else None
             try:
                 result = subprocess.run(
                     ['systemctl', 'show', systemd_service, '--property=ActiveEnterTimestamp'],
@@ -325,24 +683,17 @@ class ServiceMonitor:
             return False, f"Unknown service: {name}"
         
         config = self.SERVICES[name]
-        container_name = config.get('container_name')
-        systemd_service = config.get('systemd_service')
+        container_name = config.container_name
+        systemd_service = config.systemd_service
+        
+        if action not in self.CONTROL_ACTIONS:
+            return False, f"Invalid action: {action}"
         
         try:
             if container_name:
-                if action == 'start':
-                    cmd = ['docker', 'start', container_name]
-                elif action == 'stop':
-                    cmd = ['docker', 'stop', container_name]
-                elif action == 'restart':
-                    cmd = ['docker', 'restart', container_name]
-                else:
-                    return False, f"Invalid action: {action}"
+                cmd = ['docker', action, container_name]
             elif systemd_service:
-                if action in ['start', 'stop', 'restart']:
-                    cmd = ['sudo', 'systemctl', action, systemd_service]
-                else:
-                    return False, f"Invalid action: {action}"
+                cmd = ['sudo', 'systemctl', action, systemd_service]
             else:
                 return False, f"Cannot control {name}: no container or service defined"
             
@@ -358,43 +709,79 @@ class ServiceMonitor:
         except Exception as e:
             return False, f"Error: {str(e)}"
     
-    def get_logs(self, name: str, lines: int = 100) -> str:
-        """Get logs for a service."""
+    def _logs_command(self, name: str, lines: int) -> Tuple[Optional[List[str]], str]:
+        """Return (command, '') for a service's logs, or (None, reason) if there are none."""
         if name not in self.SERVICES:
-            return f"Unknown service: {name}"
+            return None, f"Unknown service: {name}"
         
         config = self.SERVICES[name]
-        container_name = config.get('container_name')
-        systemd_service = config.get('systemd_service')
+        if config.container_name:
+            return ['docker', 'logs', '--tail', str(lines), config.container_name], ''
+        if config.systemd_service:
+            return ['journalctl', '-u', config.systemd_service, '-n', str(lines), '--no-pager'], ''
+        return None, f"No logs available for {name}"
+    
+    def get_logs(self, name: str, lines: int = 100) -> str:
+        """Get logs for a service."""
+        cmd, reason = self._logs_command(name, lines)
+        if cmd is None:
+            return reason
         
         try:
-            if container_name:
-                result = subprocess.run(
-                    ['docker', 'logs', '--tail', str(lines), container_name],
-                    capture_output=True, text=True, timeout=10
-                )
-                return result.stdout if result.returncode == 0 else result.stderr
-            elif systemd_service:
-                result = subprocess.run(
-                    ['journalctl', '-u', systemd_service, '-n', str(lines), '--no-pager'],
-                    capture_output=True, text=True, timeout=10
-                )
-                return result.stdout if result.returncode == 0 else result.stderr
-            else:
-                return f"No logs available for {name}"
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+            return result.stdout if result.returncode == 0 else result.stderr
         except Exception as e:
             return f"Error getting logs: {str(e)}"
+    
+    def stream_logs(self, name: str, lines: int = 100, timeout: float = 10) -> Iterator[bytes]:
+        """Yield a service's logs in chunks of up to 8 KiB as the log command produces them."""
+        cmd, reason = self._logs_command(name, lines)
+        if cmd is None:
+            yield reason.encode('utf-8')
+            return
+        
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError as e:
+            yield f"Error getting logs: {str(e)}".encode('utf-8')
+            return
+        
+        # Same deadline as get_logs: a hung docker/journalctl would otherwise
+        # pin a server thread forever; killing it ends the read loop with EOF
+        deadline = threading.Timer(timeout, proc.kill)
+        deadline.daemon = True
+        deadline.start()
+        try:
+            # read1() returns whatever is available; read() would wait for a
+            # full 8 KiB, so the logs modal showed nothing until then
+            yield from iter(lambda: proc.stdout.read1(8192), b'')
+            if deadline.finished.is_set():
+                yield f"\n[Timed out after {timeout:g}s]\n".encode('utf-8')
+        finally:
+            deadline.cancel()
+            # Also reached when the client disconnects mid-stream
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
 
 
 class SystemMonitor:
     """Monitors system resources."""
     
-    def get_metrics(self) -> SystemMetrics:
-        """Get current system metrics."""
+    def __init__(self):
+        # Prime the CPU counters; later non-blocking reads report usage since the previous call
+        if psutil:
+            psutil.cpu_percent(interval=None)
+        # The CPU count doesn't change at runtime
+        self._cpu_count = psutil.cpu_count() if psutil else 1
+    
+    def get_metrics(self, timestamp: Optional[str] = None) -> SystemMetrics:
+        """Get current system metrics, stamped with timestamp (default: now)."""
         if psutil:
             # CPU
-            cpu_percent = psutil.cpu_percent(interval=1)
-            cpu_count = psutil.cpu_count()
+            cpu_percent = psutil.cpu_percent(interval=None)
+            cpu_count = self._cpu_count
             
             # Memory
             mem = psutil.virtual_memory()
@@ -402,12 +789,6 @@ class SystemMonitor:
             ram_used_gb = mem.used / (1024**3)
             ram_percent = mem.percent
             
-            # Disk (root partition)
-            disk = psutil.disk_usage('/')
-            disk_total_gb = disk.total / (1024**3)
-            disk_used_gb = disk.used / (1024**3)
-            disk_percent = disk.percent
-            
             # Load average
             try:
                 load_avg = os.getloadavg()
@@ -420,10 +801,22 @@ class SystemMonitor:
             ram_total_gb = 0.0
             ram_used_gb = 0.0
             ram_percent = 0.0
+            load_avg = (0.0, 0.0, 0.0)
+        
+        # Disk (root partition), straight from statvfs with psutil.disk_usage's arithmetic
+        try:
+            st = os.statvfs('/')
+            disk_total = st.f_blocks * st.f_frsize
+            disk_used = (st.f_blocks - st.f_bfree) * st.f_frsize
+            # Percent of the space usable by non-root, as df reports it
+            usable = disk_used + st.f_bavail * st.f_frsize
+            disk_total_gb = disk_total / (1024**3)
+            disk_used_gb = disk_used / (1024**3)
+            disk_percent = round(100.0 * disk_used / usable, 1) if usable else 0.0
+        except OSError:
             disk_total_gb = 0.0
             disk_used_gb = 0.0
             disk_percent = 0.0
-            load_avg = (0.0, 0.0, 0.0)
         
         return SystemMetrics(
             cpu_percent=cpu_percent,
@@ -435,10 +828,141 @@ class SystemMonitor:
             disk_used_gb=disk_used_gb,
             disk_percent=disk_percent,
             load_average=load_avg,
-            timestamp=datetime.now().isoformat()
+            timestamp=timestamp or datetime.now().isoformat()
         )
 
 
+def _dumps(obj) -> bytes:
+    """Serialize to JSON bytes, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def _json_response(obj, status: int = 200):
+    """Build a JSON response without going through flask.jsonify."""
+    return Response(_dumps(obj), status=status, mimetype='application/json')
+
+
+def _services_payload(statuses: Dict[str, ServiceStatus]) -> Tuple[Dict, str]:
+    """
+    Convert statuses to dicts and compute a weak ETag for them.
+    
+    The tag ignores last_check and sub-minute uptime, which change on every
+    refresh but not on the dashboard, so it only moves on visible changes.
+    """
+    payload = {name: status.to_dict() for name, status in statuses.items()}
+    key = {
+        name: dict(data, last_check=None,
+                   uptime_seconds=None if data['uptime_seconds'] is None
+                   else data['uptime_seconds'] // 60)
+        for name, data in payload.items()
+    }
+    digest = hashlib.blake2b(_dumps(key), digest_size=8).hexdigest()
+    return payload, f'W/"{digest}"'
+
+
+class MetricsHistory:
+    """Time series of system metrics in a WAL-mode SQLite database."""
+    
+    def __init__(self, db_path: str = "metrics.db", retention_seconds: int = 24 * 3600,
+                 cleanup_interval: float = 600.0):
+        self.retention_seconds = retention_seconds
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+        # Autocommit: each sample is one small append, readers don't block it under WAL
+        self._connection = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('''
+            CREATE TABLE IF NOT EXISTS metrics (
+                ts INTEGER PRIMARY KEY,
+                cpu REAL,
+                ram REAL,
+                disk REAL,
+                load1 REAL
+            )
+        ''')
+    
+    def record(self, metrics: SystemMetrics, ts: Optional[float] = None):
+        """Append a sample, expiring old rows at most once per cleanup_interval."""
+        ts = int(ts if ts is not None else time.time())
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO metrics (ts, cpu, ram, disk, load1) VALUES (?, ?, ?, ?, ?)',
+                (ts, metrics.cpu_percent, metrics.ram_percent, metrics.disk_percent, metrics.load_average[0])
+            )
+            now = time.monotonic()
+            if now - self._last_cleanup >= self.cleanup_interval:
+                self._connection.execute('DELETE FROM metrics WHERE ts < ?', (ts - self.retention_seconds,))
+                self._last_cleanup = now
+    
+    def query(self, start: float, end: float) -> List[Dict]:
+        """Return samples with start <= ts <= end, oldest first."""
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT ts, cpu, ram, disk, load1 FROM metrics WHERE ts BETWEEN ? AND ? ORDER BY ts',
+                (int(start), int(end))
+            ).fetchall()
+        return [
+            {'ts': ts, 'cpu_percent': cpu, 'ram_percent': ram, 'disk_percent': disk, 'load1': load1}
+            for ts, cpu, ram, disk, load1 in rows
+        ]
+    
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            if self._connection:
+                self._connection.close()
+                self._connection = None
+
+
+class EventBroadcaster:
+    """Fans the latest published payload out to up to max_subscribers SSE subscribers."""
+    
+    def __init__(self, keepalive: float = 15.0, max_subscribers: int = 16):
+        self.keepalive = keepalive
+        self.max_subscribers = max_subscribers
+        self._cond = threading.Condition()
+        self._version = 0
+        self._payload: Optional[str] = None
+        self._subscribers = 0
+    
+    @property
+    def full(self) -> bool:
+        """Whether max_subscribers streams are open; each one holds a server thread."""
+        return self._subscribers >= self.max_subscribers
+    
+    def publish(self, payload: str):
+        """Store a new payload and wake all subscribers."""
+        with self._cond:
+            self._payload = payload
+            self._version += 1
+            self._cond.notify_all()
+    
+    def subscribe(self):
+        """Yield SSE-formatted messages: the latest payload, then each new one."""
+        seen = 0
+        with self._cond:
+            self._subscribers += 1
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._version != seen, timeout=self.keepalive)
+                    payload, version = self._payload, self._version
+                if version == seen:
+                    # SSE comment line keeps idle connections (and proxies) open
+                    yield ": keepalive\n\n"
+                    continue
+                seen = version
+                yield f"data: {payload}\n\n"
+        finally:
+            # Runs when the server closes the response after a disconnect
+            with self._cond:
+                self._subscribers -= 1
+
+
 # HTML Template for the monitoring dashboard
 DASHBOARD_HTML = '''
 <!DOCTYPE html>
@@ -831,38 +1355,44 @@ DASHBOARD_HTML = '''
     
     <script>
         let autoRefreshInterval;
+        let currentServices = {};
+        let servicesEtag = null;
+        // Hardware totals from /api/metrics/static, merged into each metrics update
+        let staticMetrics = {};
         
-        // Fetch and display metrics
-        async function loadMetrics() {
+        // Fetch hardware totals once per page load
+        async function loadStaticMetrics() {
             try {
-                const response = await fetch('/api/metrics');
-                const data = await response.json();
-                renderMetrics(data);
+                const response = await fetch('/api/metrics/static');
+                staticMetrics = await response.json();
             } catch (error) {
-                console.error('Failed to load metrics:', error);
+                console.error('Failed to load hardware totals:', error);
             }
         }
         
-        // Fetch and display services
-        async function loadServices() {
+        // Fetch metrics and services in one request
+        async function loadDashboard() {
             try {
-                const response = await fetch('/api/services');
+                const response = await fetch('/api/dashboard');
                 const data = await response.json();
-                renderServices(data);
+                renderMetrics(data.metrics);
+                updateServices(data.services, data.services_etag);
             } catch (error) {
-                console.error('Failed to load services:', error);
+                console.error('Failed to load dashboard:', error);
             }
         }
         
         // Render metrics cards
-        function renderMetrics(metrics) {
+        function renderMetrics(dynamicMetrics) {
             const container = document.getElementById('metrics');
+            const metrics = { ...staticMetrics, ...dynamicMetrics };
+            const total = (gb) => gb === undefined ? '?' : gb.toFixed(1);
             
             const metrics_data = [
                 { label: 'CPU Usage', value: `${metrics.cpu_percent.toFixed(1)}%`, percent: metrics.cpu_percent },
-                { label: 'Memory Usage', value: `${metrics.ram_percent.toFixed(1)}%`, subtext: `${metrics.ram_used_gb.toFixed(1)} / ${metrics.ram_total_gb.toFixed(1)} GB`, percent: metrics.ram_percent },
-                { label: 'Disk Usage', value: `${metrics.disk_percent.toFixed(1)}%`, subtext: `${metrics.disk_used_gb.toFixed(1)} / ${metrics.disk_total_gb.toFixed(1)} GB`, percent: metrics.disk_percent },
-                { label: 'Load Average', value: metrics.load_average[0].toFixed(2), subtext: '1 min average', percent: Math.min(metrics.load_average[0] * 100 / metrics.cpu_count, 100) }
+                { label: 'Memory Usage', value: `${metrics.ram_percent.toFixed(1)}%`, subtext: `${metrics.ram_used_gb.toFixed(1)} / ${total(metrics.ram_total_gb)} GB`, percent: metrics.ram_percent },
+                { label: 'Disk Usage', value: `${metrics.disk_percent.toFixed(1)}%`, subtext: `${metrics.disk_used_gb.toFixed(1)} / ${total(metrics.disk_total_gb)} GB`, percent: metrics.disk_percent },
+                { label: 'Load Average', value: metrics.load_average[0].toFixed(2), subtext: '1 min average', percent: Math.min(metrics.load_average[0] * 100 / (metrics.cpu_count || 1), 100) }
             ];
             
             container.innerHTML = metrics_data.map(m => `
@@ -877,55 +1407,124 @@ DASHBOARD_HTML = '''
             `).join('');
         }
         
+        // Re-render service cards only when the server's tag says they changed
+        function updateServices(services, etag) {
+            if (etag && etag === servicesEtag) return;
+            servicesEtag = etag;
+            renderServices(services);
+        }
+        
+        // Service cards by name, built once and then updated in place
+        const serviceNodes = new Map();
+        
+        function buildServiceCard(name) {
+            const card = document.createElement('div');
+            card.dataset.name = name;
+            card.innerHTML = `
+                <div class="service-header">
+                    <span class="service-name">${name.charAt(0).toUpperCase() + name.slice(1)}</span>
+                    <span class="service-status">
+                        <span class="status-dot"></span>
+                        <span class="status-text"></span>
+                    </span>
+                </div>
+                <div class="service-info"></div>
+                <div class="service-controls"></div>
+            `;
+            return { card, info: null, controls: null };
+        }
+        
+        function serviceInfoHtml(service) {
+            return `
+                ${service.version ? `Version: ${service.version}<br>` : ''}
+                ${service.ports.length ? `Ports: ${service.ports.join(', ')}<br>` : ''}
+                ${service.uptime_seconds ? `Uptime: ${formatUptime(service.uptime_seconds)}<br>` : ''}
+                ${service.error_message ? `<span style="color: var(--error);">Error: ${service.error_message}</span>` : ''}
+            `;
+        }
+        
+        function serviceControlsHtml(service) {
+            if (!service.installed) {
+                return '<span style="color: var(--text-secondary); font-size: 0.875rem;">Not installed</span>';
+            }
+            return `
+                ${service.running ? `
+                    <button class="btn btn-danger" data-action="stop">⏹ Stop</button>
+                    <button class="btn btn-primary" data-action="restart">🔄 Restart</button>
+                ` : `
+                    <button class="btn btn-success" data-action="start">▶ Start</button>
+                `}
+                <button class="btn btn-secondary" data-action="logs">📄 Logs</button>
+            `;
+        }
+        
+        // Touch only the parts of a card whose content changed
+        function updateServiceCard(entry, service) {
+            const { card } = entry;
+            const statusClass = service.running ? 'running' : service.installed ? 'installed' : '';
+            const statusText = service.running ? 'Running' : service.installed ? 'Installed' : 'Not Installed';
+            const statusDotClass = service.running ? 'running' : service.installed ? 'stopped' : 'not-installed';
+            
+            const cardClass = `service-card ${statusClass}`;
+            if (card.className !== cardClass) card.className = cardClass;
+            const dot = card.querySelector('.status-dot');
+            const dotClass = `status-dot ${statusDotClass}`;
+            if (dot.className !== dotClass) dot.className = dotClass;
+            const text = card.querySelector('.status-text');
+            if (text.textContent !== statusText) text.textContent = statusText;
+            
+            const info = serviceInfoHtml(service);
+            if (entry.info !== info) {
+                entry.info = info;
+                card.querySelector('.service-info').innerHTML = info;
+            }
+            const controls = serviceControlsHtml(service);
+            if (entry.controls !== controls) {
+                entry.controls = controls;
+                card.querySelector('.service-controls').innerHTML = controls;
+            }
+        }
+        
         // Render service cards
         function renderServices(services) {
+            currentServices = services;
             const container = document.getElementById('services');
             
-            container.innerHTML = Object.entries(services).map(([name, service]) => {
-                const statusClass = service.running ? 'running' : service.installed ? 'installed' : '';
-                const statusText = service.running ? 'Running' : service.installed ? 'Installed' : 'Not Installed';
-                const statusDotClass = service.running ? 'running' : service.installed ? 'stopped' : 'not-installed';
-                
-                return `
-                    <div class="service-card ${statusClass}">
-                        <div class="service-header">
-                            <span class="service-name">${name.charAt(0).toUpperCase() + name.slice(1)}</span>
-                            <span class="service-status">
-                                <span class="status-dot ${statusDotClass}"></span>
-                                ${statusText}
-                            </span>
-                        </div>
-                        <div class="service-info">
-                            ${service.version ? `Version: ${service.version}<br>` : ''}
-                            ${service.ports.length ? `Ports: ${service.ports.join(', ')}<br>` : ''}
-                            ${service.uptime_seconds ? `Uptime: ${formatUptime(service.uptime_seconds)}<br>` : ''}
-                            ${service.error_message ? `<span style="color: var(--error);">Error: ${service.error_message}</span>` : ''}
-                        </div>
-                        <div class="service-controls">
-                            ${service.installed ? `
-                                ${service.running ? `
-                                    <button class="btn btn-danger" onclick="controlService('${name}', 'stop')">⏹ Stop</button>
-                                    <button class="btn btn-primary" onclick="controlService('${name}', 'restart')">🔄 Restart</button>
-                                ` : `
-                                    <button class="btn btn-success" onclick="controlService('${name}', 'start')">▶ Start</button>
-                                `}
-                                <button class="btn btn-secondary" onclick="viewLogs('${name}')">📄 Logs</button>
-                            ` : '<span style="color: var(--text-secondary); font-size: 0.875rem;">Not installed</span>'}
-                        </div>
-                    </div>
-                `;
-            }).join('');
+            for (const [name, service] of Object.entries(services)) {
+                let entry = serviceNodes.get(name);
+                if (!entry) {
+                    entry = buildServiceCard(name);
+                    serviceNodes.set(name, entry);
+                    container.appendChild(entry.card);
+                }
+                updateServiceCard(entry, service);
+            }
+            for (const [name, entry] of serviceNodes) {
+                if (!(name in services)) {
+                    entry.card.remove();
+                    serviceNodes.delete(name);
+                }
+            }
         }
         
-        // Format uptime
+        // Format uptime; only whole minutes are shown, so cache by minute
+        const uptimeCache = new Map();
         function formatUptime(seconds) {
-            const days = Math.floor(seconds / 86400);
-            const hours = Math.floor((seconds % 86400) / 3600);
-            const mins = Math.floor((seconds % 3600) / 60);
+            const total = (seconds / 60) | 0;
+            const cached = uptimeCache.get(total);
+            if (cached) return cached;
             
-            if (days > 0) return `${days}d ${hours}h ${mins}m`;
-            if (hours > 0) return `${hours}h ${mins}m`;
-            return `${mins}m`;
+            const days = (total / 1440) | 0;
+            const hours = ((total % 1440) / 60) | 0;
+            const mins = total % 60;
+            let text;
+            if (days > 0) text = `${days}d ${hours}h ${mins}m`;
+            else if (hours > 0) text = `${hours}h ${mins}m`;
+            else text = `${mins}m`;
+            
+            if (uptimeCache.size > 512) uptimeCache.clear();
+            uptimeCache.set(total, text);
+            return text;
         }
         
         // Control service (start/stop/restart)
@@ -937,7 +1536,12 @@ DASHBOARD_HTML = '''
                 
                 if (result.success) {
                     showToast(result.message, 'success');
-                    setTimeout(() => loadServices(), 1000);
+                    // Re-probe just this service instead of waiting for the next full refresh
+                    const statusResponse = await fetch(`/api/services/${name}`);
+                    if (statusResponse.ok) {
+                        servicesEtag = null;
+                        renderServices({ ...currentServices, [name]: await statusResponse.json() });
+                    }
                 } else {
                     showToast(result.error, 'error');
                 }
@@ -956,8 +1560,19 @@ DASHBOARD_HTML = '''
             
             try {
                 const response = await fetch(`/api/services/${name}/logs`);
-                const logs = await response.text();
-                document.getElementById('logsBody').textContent = logs || 'No logs available';
+                const body = document.getElementById('logsBody');
+                // Show lines as the server streams them
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let logs = '';
+                for (;;) {
+                    const { done, value } = await reader.read();
+                    if (done) break;
+                    logs += decoder.decode(value, { stream: true });
+                    body.textContent = logs;
+                }
+                logs += decoder.decode();
+                body.textContent = logs || 'No logs available';
             } catch (error) {
                 document.getElementById('logsBody').textContent = 'Failed to load logs';
             }
@@ -991,7 +1606,7 @@ DASHBOARD_HTML = '''
         // Refresh all data
         async function refreshAll() {
             showRefreshIndicator();
-            await Promise.all([loadMetrics(), loadServices()]);
+            await loadDashboard();
             hideRefreshIndicator();
         }
         
@@ -1007,10 +1622,43 @@ DASHBOARD_HTML = '''
             }
         }
         
+        // Live updates pushed by the server; poll only if EventSource is unavailable
+        function startStream() {
+            if (!window.EventSource) {
+                toggleAutoRefresh(true);
+                return;
+            }
+            const source = new EventSource('/api/stream');
+            source.onmessage = (e) => {
+                const data = JSON.parse(e.data);
+                renderMetrics(data.metrics);
+                updateServices(data.services, data.services_etag);
+            };
+            // Refused (503 when all stream slots are taken): fall back to polling
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED) {
+                    toggleAutoRefresh(true);
+                }
+            };
+        }
+        
+        // One listener for every service button; the card carries the service name
+        document.getElementById('services').addEventListener('click', (e) => {
+            const button = e.target.closest('button[data-action]');
+            if (!button) return;
+            const name = button.closest('.service-card').dataset.name;
+            if (button.dataset.action === 'logs') {
+                viewLogs(name);
+            } else {
+                controlService(name, button.dataset.action);
+            }
+        });
+        
         // Initialize
-        document.addEventListener('DOMContentLoaded', () => {
+        document.addEventListener('DOMContentLoaded', async () => {
+            await loadStaticMetrics();
             refreshAll();
-            toggleAutoRefresh(true);
+            startStream();
         });
         
         // Close modal on click outside
@@ -1024,15 +1672,55 @@ DASHBOARD_HTML = '''
 </html>
 '''
 
+# The page has no template variables, so encode and compress it once at import
+def _minify_html(html: str) -> str:
+    """
+    Strip indentation, blank lines, HTML comments and whole-line // comments.
+    
+    Line breaks are kept, so JavaScript semicolon insertion is unaffected.
+    """
+    html = re.sub(r'<!--.*?-->', '', html, flags=re.S)
+    lines = (line.strip() for line in html.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+_DASHBOARD_HTML_BYTES = _minify_html(DASHBOARD_HTML).encode('utf-8')
+_DASHBOARD_HTML_GZ = gzip.compress(_DASHBOARD_HTML_BYTES, compresslevel=9)
+_DASHBOARD_HTML_BR = brotli.compress(_DASHBOARD_HTML_BYTES, quality=11) if brotli else None
+# Content hash; each encoding gets its own tag, e.g. "<hash>-gzip"
+_DASHBOARD_HTML_HASH = hashlib.blake2b(_DASHBOARD_HTML_BYTES, digest_size=8).hexdigest()
+
+
+def _dashboard_html_variant(accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """Pick the smallest pre-compressed page the client accepts: (body, Content-Encoding)."""
+    accepted = {token.split(';')[0].strip() for token in accept_encoding.split(',')}
+    if _DASHBOARD_HTML_BR is not None and 'br' in accepted:
+        return _DASHBOARD_HTML_BR, 'br'
+    if 'gzip' in accepted:
+        return _DASHBOARD_HTML_GZ, 'gzip'
+    return _DASHBOARD_HTML_BYTES, None
+
+
+_LATEST_SESSION_SQL = '''
+    SELECT session_id, status, current_step, created_at, updated_at
+    FROM sessions
+    ORDER BY updated_at DESC
+    LIMIT 1
+'''
+
 
 class MonitoringDashboard:
     """Web-based monitoring dashboard."""
     
-    def __init__(self, port: int = 8081, db_path: str = "state.db"):
+    # Per-request data is reused for this long, well below the page's 5s refresh
+    CACHE_TTL = 1.0
+    
+    def __init__(self, port: int = 8081, db_path: str = "state.db", metrics_db: str = "metrics.db"):
         if Flask is None:
             raise ImportError(
                 "Flask not installed. Run: pip3 install flask\n"
-                "Required for monitoring dashboard."
+                "Required for monitoring dashboard (waitress is optional, "
+                "for a production server)."
             )
         
         self.port = port
@@ -1040,6 +1728,17 @@ class MonitoringDashboard:
         self.app = Flask(__name__)
         self.service_monitor = ServiceMonitor()
         self.system_monitor = SystemMonitor()
+        self.broadcaster = EventBroadcaster()
+        self.history = MetricsHistory(metrics_db)
+        # (monotonic time, value) pairs shared by all clients, see _cached()
+        self._metrics_cache: Tuple[float, Optional[SystemMetrics]] = (0.0, None)
+        self._session_cache: Tuple[float, Optional[Dict]] = (0.0, None)
+        # Read-only connection to the state database, opened on first use
+        self._session_conn: Optional[sqlite3.Connection] = None
+        # Background metrics sampler, started by run()
+        self._sampler: Optional[threading.Thread] = None
+        self._stop_sampler = threading.Event()
+        self._cache_lock = threading.Lock()
         self._setup_routes()
     
     def _setup_routes(self):
@@ -1047,31 +1746,97 @@ class MonitoringDashboard:
         
         @self.app.route('/')
         def index():
-            return render_template_string(DASHBOARD_HTML)
+            headers = {'Cache-Control': 'public, max-age=300', 'Vary': 'Accept-Encoding'}
+            body, encoding = _dashboard_html_variant(request.headers.get('Accept-Encoding', ''))
+            if encoding:
+                headers['Content-Encoding'] = encoding
+                headers['ETag'] = f'"{_DASHBOARD_HTML_HASH}-{encoding}"'
+            else:
+                headers['ETag'] = f'"{_DASHBOARD_HTML_HASH}"'
+            if request.headers.get('If-None-Match') == headers['ETag']:
+                return Response(status=304, headers=headers)
+            return Response(body, mimetype='text/html', headers=headers)
+        
+        @self.app.route('/api/dashboard')
+        def api_dashboard():
+            """Get metrics, service statuses and session info in one round-trip."""
+            services, etag = _services_payload(self.service_monitor.get_all_statuses())
+            return _json_response({
+                'metrics': self._get_metrics().dynamic_dict(),
+                'services': services,
+                'services_etag': etag,
+                'session': self._get_session_info(),
+            })
         
         @self.app.route('/api/metrics')
         def api_metrics():
-            """Get system metrics."""
-            metrics = self.system_monitor.get_metrics()
-            return jsonify(metrics.to_dict())
+            """Get system metrics. Deprecated: use /api/dashboard."""
+            return _json_response(self._get_metrics().to_dict())
+        
+        @self.app.route('/api/metrics/static')
+        def api_metrics_static():
+            """Get hardware totals, which clients fetch once and merge into /api/dashboard metrics."""
+            metrics = self._get_metrics().to_dict()
+            body = _dumps(dict({field: metrics[field] for field in SystemMetrics.STATIC_FIELDS},
+                               hostname=socket.gethostname()))
+            headers = {
+                'Cache-Control': 'public, max-age=3600',
+                'ETag': f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"',
+            }
+            if request.headers.get('If-None-Match') == headers['ETag']:
+                return Response(status=304, headers=headers)
+            return Response(body, mimetype='application/json', headers=headers)
         
         @self.app.route('/api/services')
         def api_services():
-            """Get service statuses."""
-            statuses = self.service_monitor.get_all_statuses()
-            return jsonify({
-                name: status.to_dict()
-                for name, status in statuses.items()
-            })
+            """Get service statuses. Deprecated: use /api/dashboard."""
+            services, etag = _services_payload(self.service_monitor.get_all_statuses())
+            if request.headers.get('If-None-Match') == etag:
+                return Response(status=304, headers={'ETag': etag})
+            response = _json_response(services)
+            response.headers['ETag'] = etag
+            return response
+        
+        @self.app.route('/api/history')
+        def api_history():
+            """Get stored metric samples; from/to are epoch seconds (default: last hour)."""
+            now = time.time()
+            try:
+                end = float(request.args.get('to', now))
+                start = float(request.args.get('from', end - 3600))
+            except ValueError:
+                return _json_response({'error': 'from/to must be epoch seconds'}, status=400)
+            return _json_response(self.history.query(start, end))
+        
+        @self.app.route('/api/stream')
+        def api_stream():
+            """Push metrics and service statuses as Server-Sent Events."""
+            if self.broadcaster.full:
+                return Response('Too many live streams', status=503, mimetype='text/plain')
+            return Response(
+                self.broadcaster.subscribe(),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
+        @self.app.route('/api/services/<name>')
+        def api_service(name: str):
+            """Re-probe and return a single service's status."""
+            status = self.service_monitor.refresh_one(name)
+            if status is None:
+                return _json_response({'error': f'Unknown service: {name}'}, status=404)
+            return _json_response(status.to_dict())
         
         @self.app.route('/api/services/<name>/<action>', methods=['POST'])
         def api_control_service(name: str, action: str):
             """Control a service (start/stop/restart)."""
-            if action not in ['start', 'stop', 'restart']:
-                return jsonify({'success': False, 'error': 'Invalid action'}), 400
+            if name not in self.service_monitor.SERVICES:
+                return _json_response({'success': False, 'error': f'Unknown service: {name}'}, status=404)
+            if action not in ServiceMonitor.CONTROL_ACTIONS:
+                return _json_response({'success': False, 'error': 'Invalid action'}, status=400)
             
             success, message = self.service_monitor.control_service(name, action)
-            return jsonify({
+            return _json_response({
                 'success': success,
                 'message' if success else 'error': message
             })
@@ -1079,38 +1844,92 @@ class MonitoringDashboard:
         @self.app.route('/api/services/<name>/logs')
         def api_service_logs(name: str):
             """Get service logs."""
-            logs = self.service_monitor.get_logs(name)
-            return Response(logs, mimetype='text/plain')
+            if name not in self.service_monitor.SERVICES:
+                return Response(f'Unknown service: {name}', status=404, mimetype='text/plain')
+            return Response(self.service_monitor.stream_logs(name), mimetype='text/plain')
         
         @self.app.route('/api/session')
         def api_session():
-            """Get current session info."""
+            """Get current session info. Deprecated: use /api/dashboard."""
             session_info = self._get_session_info()
-            return jsonify(session_info)
+            return _json_response(session_info)
         
         @self.app.route('/health')
         def health():
             """Health check endpoint."""
-            return jsonify({'status': 'ok'})
+            return _json_response({'status': 'ok'})
+    
+    def _cached(self, attr: str, fn, ttl: Optional[float] = None):
+        """Return the value cached in attr, recomputing it with fn() once older than ttl."""
+        ttl = self.CACHE_TTL if ttl is None else ttl
+        # Held across fn() so concurrent requests wait for one recompute
+        with self._cache_lock:
+            ts, value = getattr(self, attr)
+            now = time.monotonic()
+            if value is None or now - ts > ttl:
+                value = fn()
+                setattr(self, attr, (now, value))
+            return value
+    
+    def _get_metrics(self) -> SystemMetrics:
+        """Current system metrics: the sampler's latest, or shared across requests for CACHE_TTL."""
+        if self._sampler is not None:
+            return self._metrics_cache[1]
+        return self._cached('_metrics_cache', self.system_monitor.get_metrics)
+    
+    def start_sampler(self):
+        """Sample metrics every CACHE_TTL from one thread, so handlers never call psutil."""
+        if self._sampler is not None:
+            return
+        self._metrics_cache = (time.monotonic(), self.system_monitor.get_metrics())
+        
+        def sample_loop():
+            while not self._stop_sampler.wait(self.CACHE_TTL):
+                try:
+                    metrics = self.system_monitor.get_metrics()
+                except Exception as e:
+                    logger.warning(f"Metrics sampling failed: {e}")
+                    continue
+                # A single tuple assignment, so readers never see a torn pair
+                self._metrics_cache = (time.monotonic(), metrics)
+        
+        self._sampler = threading.Thread(target=sample_loop, name="metrics-sampler", daemon=True)
+        self._sampler.start()
+    
+    def stop_sampler(self):
+        """Stop the background metrics sampler."""
+        self._stop_sampler.set()
+        self._sampler = None
+    
+    def _publish_snapshot(self, statuses: Dict[str, ServiceStatus]):
+        """Record and broadcast metrics and statuses after each background refresh."""
+        # Reuse the latest sample, stamped with this refresh's timestamp
+        metrics = replace(self._get_metrics(), timestamp=self.service_monitor.last_update)
+        self.history.record(metrics)
+        services, etag = _services_payload(statuses)
+        self.broadcaster.publish(_dumps({
+            'metrics': metrics.dynamic_dict(),
+            'services': services,
+            'services_etag': etag,
+        }).decode('utf-8'))
     
     def _get_session_info(self) -> Dict:
-        """Get information about the current setup session."""
+        """Get information about the current setup session, shared across requests for CACHE_TTL."""
+        return self._cached('_session_cache', self._load_session_info)
+    
+    def _load_session_info(self) -> Dict:
+        """Query the state database for the most recent setup session."""
         path = Path(self.db_path)
         if not path.exists():
             return {'status': 'no_database'}
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT session_id, status, current_step, created_at, updated_at 
-                FROM sessions 
-                ORDER BY updated_at DESC 
-                LIMIT 1
-            ''')
-            row = cursor.fetchone()
-            conn.close()
+            # Only called under _cache_lock, so one connection serves every request thread
+            if self._session_conn is None:
+                self._session_conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                                     isolation_level=None)
+                self._session_conn.execute('PRAGMA query_only = 1')
+            row = self._session_conn.execute(_LATEST_SESSION_SQL).fetchone()
             
             if row:
                 return {
@@ -1125,17 +1944,31 @@ class MonitoringDashboard:
         except Exception as e:
             return {'status': 'error', 'error': str(e)}
     
-    def run(self, debug: bool = False):
+    def run(self, debug: bool = False, host: str = '0.0.0.0'):
         """Run the dashboard server."""
-        print(f"🌐 Starting monitoring dashboard on http://localhost:{self.port}")
+        print(f"🌐 Starting monitoring dashboard on http://{host}:{self.port}")
         print(f"   Press Ctrl+C to stop")
-        self.app.run(host='0.0.0.0', port=self.port, debug=debug)
+        self.start_sampler()
+        self.service_monitor.start_refresh_loop(on_refresh=self._publish_snapshot)
+        if waitress_serve is not None and not debug:
+            # Every open SSE stream pins a worker thread for as long as the
+            # tab stays open, so size the pool for the capped number of
+            # streams plus threads left over for ordinary requests
+            waitress_serve(self.app, host=host, port=self.port,
+                           threads=self.broadcaster.max_subscribers + _REQUEST_THREADS,
+                           connection_limit=64, channel_timeout=30)
+        else:
+            # Polling would otherwise log a line per request per open tab
+            if not debug:
+                logging.getLogger('werkzeug').addFilter(_PollingAccessLogFilter())
+            self.app.run(host=host, port=self.port, debug=debug, threaded=True)
 
 
-def start_dashboard(port: int = 8081, db_path: str = "state.db"):
+def start_dashboard(port: int = 8081, db_path: str = "state.db", host: str = '0.0.0.0',
+                    debug: bool = False):
     """Convenience function to start the dashboard."""
     dashboard = MonitoringDashboard(port=port, db_path=db_path)
-    dashboard.run()
+    dashboard.run(debug=debug, host=host)
 
 
 def check_services() -> Dict[str, ServiceStatus]:
@@ -1149,29 +1982,37 @@ def print_status():
     monitor = ServiceMonitor()
     system = SystemMonitor()
     
-    print("\n" + "="*60)
-    print("  🏠 Home Server Status")
-    print("="*60)
-    
-    # System metrics
-    metrics = system.get_metrics()
-    print(f"\n📊 System Metrics:")
-    print(f"   CPU: {metrics.cpu_percent:.1f}% ({metrics.cpu_count} cores)")
-    print(f"   RAM: {metrics.ram_percent:.1f}% ({metrics.ram_used_gb:.1f}/{metrics.ram_total_gb:.1f} GB)")
-    print(f"   Disk: {metrics.disk_percent:.1f}% ({metrics.disk_used_gb:.1f}/{metrics.disk_total_gb:.1f} GB)")
-    print(f"   Load: {metrics.load_average[0]:.2f}, {metrics.load_average[1]:.2f}, {metrics.load_average[2]:.2f}")
-    
-    # Services
-    print(f"\n🚀 Services:")
+    # Probe services first so the CPU reading covers a real sampling window
     statuses = monitor.get_all_statuses()
-    for name, status in statuses.items():
-        if status.installed:
-            icon = "✅" if status.running else "⏹️"
-            health = " (healthy)" if status.healthy else ""
-            version = f" v{status.version}" if status.version else ""
-            print(f"   {icon} {name}{version}: {status.running and 'Running' or 'Stopped'}{health}")
-    
-    print("\n" + "="*60)
+    metrics = system.get_metrics()
+    
+    lines = [
+        "",
+        "="*60,
+        "  🏠 Home Server Status",
+        "="*60,
+        # System metrics
+        "",
+        "📊 System Metrics:",
+        f"   CPU: {metrics.cpu_percent:.1f}% ({metrics.cpu_count} cores)",
+        f"   RAM: {metrics.ram_percent:.1f}% ({metrics.ram_used_gb:.1f}/{metrics.ram_total_gb:.1f} GB)",
+        f"   Disk: {metrics.disk_percent:.1f}% ({metrics.disk_used_gb:.1f}/{metrics.disk_total_gb:.1f} GB)",
+        f"   Load: {metrics.load_average[0]:.2f}, {metrics.load_average[1]:.2f}, {metrics.load_average[2]:.2f}",
+        # Services
+        "",
+        "🚀 Services:",
+    ]
+    lines.extend(
+        f"   {'✅' if status.running else '⏹️'} {name}"
+        f"{f' v{status.version}' if status.version else ''}: "
+        f"{status.running and 'Running' or 'Stopped'}{' (healthy)' if status.healthy else ''}"
+        for name, status in statuses.items() if status.installed
+    )
+    lines.extend(["", "="*60, ""])
+    
+    # One write, so the report isn't interleaved line by line on slow consoles
+    sys.stdout.write("\n".join(lines))
+    sys.stdout.flush()
 
 
 if __name__ == "__main__":
@@ -1181,10 +2022,12 @@ if __name__ == "__main__":
     parser.add_argument('--port', type=int, default=8081, help='Dashboard port (default: 8081)')
     parser.add_argument('--cli', action='store_true', help='Show status in CLI instead of web')
     parser.add_argument('--db', type=str, default='state.db', help='Path to state database')
+    parser.add_argument('--host', type=str, default='0.0.0.0', help='Address to bind (default: 0.0.0.0)')
+    parser.add_argument('--debug', action='store_true', help='Run the Flask debug server with access logs')
     
     args = parser.parse_args()
     
     if args.cli:
         print_status()
     else:
-        start_dashboard(port=args.port, db_path=args.db)
+        start_dashboard(port=args.port, db_path=args.db, host=args.host, debug=args.debug)
@@ -4,24 +4,158 @@ Generates installation plans based on hardware and requirements.
 """
 import json
 import os
+import hashlib
 import logging
-from typing import Dict, List, Optional
-from dataclasses import dataclass, asdict
+import re
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+from dataclasses import dataclass, asdict, replace
 
 try:
-    from openai import OpenAI, APIError, APITimeoutError
+    import orjson
 except ImportError:
-    OpenAI = None
-    APIError = None
-    APITimeoutError = None
+    orjson = None
 
-from retry_utils import retry_with_backoff
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+from retry_utils import retry_with_backoff, aretry_with_backoff
 
 # Setup module logger
 logger = logging.getLogger(__name__)
 
+# AI-generated plans, one JSON file per prompt; see PlanningEngine._plan_cache_key
+_PLAN_CACHE_DIR = Path('~/.cache/home-server-ai/plans').expanduser()
+_PLAN_CACHE_TTL = 7 * 24 * 3600
+
+# AI calls in progress by plan cache key, so that identical requests made at
+# the same time (double submits, retries) share one call; see _single_flight
+_INFLIGHT: Dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+_DEFAULT_STORAGE_PATH = '~/home-server-data'
+
+# (requirements key, display name) of each installable component, in prompt order
+_COMPONENT_NAMES = (
+    ('want_tailscale', "Tailscale VPN"),
+    ('want_adguard', "AdGuard Home"),
+    ('want_openclaw', "OpenClaw"),
+    ('want_immich', "Immich photo server"),
+    ('want_jellyfin', "Jellyfin media server"),
+)
+
+# What _parse_plan needs to build a plan at all. Step fields are coerced
+# leniently by _parse_step, so only the structure is checked here
+_PLAN_DATA_SCHEMA = {
+    "type": "object",
+    "required": ["steps"],
+    "properties": {
+        "steps": {"type": "array", "items": {"type": "object"}},
+    },
+}
+
+# Rejects a response without a steps array of objects in one call instead of
+# the manual checks; built like config_validator._requirements_schema_validator
+_plan_data_validator = (
+    fastjsonschema.compile(_PLAN_DATA_SCHEMA) if fastjsonschema else None
+)
+
+# Used to pull finished steps out of a partially streamed AI response
+_JSON_DECODER = json.JSONDecoder()
+_STEPS_ARRAY_RE = re.compile(r'"steps"\s*:\s*\[')
+
+# Kept byte-identical across calls and placed first, so providers' prompt
+# caches can reuse it (together with the stable head of the user prompt).
+# OpenAI is sent only the rules, because it enforces PLAN_JSON_SCHEMA itself
+SYSTEM_RULES = """You are a Linux system administration expert. Your task is to create detailed, step-by-step installation plans for home server software.
+
+Rules:
+1. Commands must be safe and follow best practices
+2. Use apt for package management on Debian/Ubuntu
+3. Prefer Docker/Compose for services when appropriate
+4. Include verification steps after each installation
+5. Consider the specific hardware profile provided
+6. Handle common errors proactively"""
+
+SYSTEM_PROMPT = SYSTEM_RULES + """
+
+Output must be valid JSON with this structure:
+{
+  "title": "string",
+  "description": "string", 
+  "prerequisites": ["string"],
+  "steps": [
+    {
+      "step_number": 1,
+      "name": "string",
+      "description": "string",
+      "command": "string or null",
+      "commands": ["string"],
+      "requires_sudo": true/false,
+      "check_command": "string or null",
+      "rollback_command": "string or null",
+      "expected_output": "string or null",
+      "error_hint": "string"
+    }
+  ],
+  "estimated_time_minutes": number,
+  "known_issues": ["string"],
+  "post_install_notes": ["string"]
+}"""
+
+_NULLABLE_STRING = {"type": ["string", "null"]}
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+# The structure above as an OpenAI strict json_schema (every property
+# required, no extras); see ai_provider.call_ai_with_config
+PLAN_JSON_SCHEMA = {
+    "name": "installation_plan",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "description": {"type": "string"},
+            "prerequisites": _STRING_LIST,
+            "steps": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "step_number": {"type": "integer"},
+                        "name": {"type": "string"},
+                        "description": {"type": "string"},
+                        "command": _NULLABLE_STRING,
+                        "commands": _STRING_LIST,
+                        "requires_sudo": {"type": "boolean"},
+                        "check_command": _NULLABLE_STRING,
+                        "rollback_command": _NULLABLE_STRING,
+                        "expected_output": _NULLABLE_STRING,
+                        "error_hint": {"type": "string"},
+                    },
+                    "required": ["step_number", "name", "description", "command", "commands",
+                                 "requires_sudo", "check_command", "rollback_command",
+                                 "expected_output", "error_hint"],
+                    "additionalProperties": False,
+                },
+            },
+            "estimated_time_minutes": {"type": "integer"},
+            "known_issues": _STRING_LIST,
+            "post_install_notes": _STRING_LIST,
+        },
+        "required": ["title", "description", "prerequisites", "steps",
+                     "estimated_time_minutes", "known_issues", "post_install_notes"],
+        "additionalProperties": False,
+    },
+}
+
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PlanStep:
     """Single step in the installation plan."""
     step_number: int
@@ -39,7 +173,7 @@ class PlanStep:
         return asdict(self)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class InstallationPlan:
     """Full installation plan."""
     title: str
@@ -62,57 +196,257 @@ class InstallationPlan:
         }
     
     def to_json(self) -> str:
+        if orjson is not None:
+            # orjson serializes the slotted dataclasses, nested steps
+            # included, in one pass without an intermediate dict
+            return orjson.dumps(self, option=orjson.OPT_INDENT_2).decode()
         return json.dumps(self.to_dict(), indent=2)
 
 
+# Template plan steps that never vary, built once and renumbered per plan
+_CURL_STEP = PlanStep(
+    step_number=0,
+    name="Install curl",
+    description="Install curl for downloading scripts",
+    command="sudo apt update && sudo apt install -y curl",
+    commands=[],
+    requires_sudo=True,
+    check_command="curl --version",
+    rollback_command=None,
+    expected_output="curl",
+    error_hint="Check internet connection and apt sources"
+)
+
+_DOCKER_STEP = PlanStep(
+    step_number=0,
+    name="Install Docker",
+    description="Install Docker using official script",
+    command="curl -fsSL https://get.docker.com | sh",
+    commands=[],
+    requires_sudo=True,
+    check_command="docker --version",
+    rollback_command="sudo apt remove -y docker docker-engine docker.io containerd runc",
+    expected_output="Docker version",
+    error_hint="Check if Docker service is running: sudo systemctl status docker"
+)
+
+_DOCKER_GROUP_STEP = PlanStep(
+    step_number=0,
+    name="Add user to docker group",
+    description="Add current user to docker group for permissionless access",
+    command="sudo usermod -aG docker $USER",
+    commands=[],
+    requires_sudo=True,
+    check_command="groups $USER | grep docker",
+    rollback_command="sudo gpasswd -d $USER docker",
+    expected_output="docker",
+    error_hint="Log out and back in for group changes to take effect, or run 'newgrp docker'"
+)
+
+# Docker group changes require re-login, so this step warns if they did not apply
+_DOCKER_NEWGRP_STEP = PlanStep(
+    step_number=0,
+    name="Apply Docker group changes",
+    description="Apply Docker group membership for current session",
+    command="newgrp docker",
+    commands=[],
+    requires_sudo=False,
+    check_command="docker ps",
+    rollback_command=None,
+    expected_output="CONTAINER",
+    error_hint="If this fails, you may need to log out and log back in for Docker permissions to take effect"
+)
+
+_TAILSCALE_STEP = PlanStep(
+    step_number=0,
+    name="Install Tailscale",
+    description="Install Tailscale VPN",
+    command="curl -fsSL https://tailscale.com/install.sh | sh",
+    commands=[],
+    requires_sudo=True,
+    check_command="tailscale version",
+    rollback_command="sudo apt remove -y tailscale",
+    expected_output="tailscale",
+    error_hint="Check if systemd is running: systemctl status tailscaled"
+)
+
+_ADGUARD_STEP = PlanStep(
+    step_number=0,
+    name="Install AdGuard Home",
+    description="Install AdGuard Home via Docker",
+    command="docker run -d --name adguardhome --restart=always -p 53:53/tcp -p 53:53/udp -p 3000:3000 -v ~/adguardhome/work:/opt/adguardhome/work -v ~/adguardhome/conf:/opt/adguardhome/conf adguard/adguardhome",
+    commands=[],
+    requires_sudo=False,
+    check_command="docker ps | grep adguardhome",
+    rollback_command="docker stop adguardhome && docker rm adguardhome",
+    expected_output="adguardhome",
+    error_hint="Port 53 may be in use by systemd-resolved. Run: sudo systemctl stop systemd-resolved"
+)
+
+_OPENCLAW_STEP = PlanStep(
+    step_number=0,
+    name="Install OpenClaw",
+    description="Download and install OpenClaw",
+    command=None,
+    commands=[
+        "curl -fsSL https://raw.githubusercontent.com/openclaw/agent/main/install.sh | bash",
+        "openclaw --version"
+    ],
+    requires_sudo=True,
+    check_command="which openclaw",
+    rollback_command="sudo rm -rf /usr/local/bin/openclaw /opt/openclaw",
+    expected_output="/usr/local/bin/openclaw",
+    error_hint="Check installation logs in /tmp/openclaw-install.log"
+)
+
+
+def _renumbered(step: PlanStep, step_number: int) -> PlanStep:
+    """Copy of a fixed step at step_number (lists copied, so callers may edit them)."""
+    return replace(step, step_number=step_number, commands=list(step.commands))
+
+
+def _prototype(step: PlanStep) -> Callable[[Dict, Dict, int], PlanStep]:
+    """Step factory that renumbers a fixed step."""
+    return lambda hardware, requirements, step_number: _renumbered(step, step_number)
+
+
+def _tailscale_connect_step(hardware: Dict, requirements: Dict, step_number: int) -> PlanStep:
+    return PlanStep(
+        step_number=step_number,
+        name="Connect Tailscale",
+        description="Connect to Tailscale network",
+        command=f"sudo tailscale up --authkey={requirements['tailscale_auth_key']}",
+        commands=[],
+        requires_sudo=True,
+        check_command="tailscale status",
+        rollback_command="sudo tailscale down",
+        expected_output="Connected",
+        error_hint="Check if auth key is valid and not expired"
+    )
+
+
+def _prompt_json(data) -> str:
+    """Indented JSON for embedding in a prompt, serialized with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, indent=2)
+
+
+def _single_flight(key: str, fn: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+    """
+    Return fn(), or, if a call with the same key is already running in
+    another thread, wait for that call and return its result (or raise its
+    exception) instead of starting a duplicate.
+    """
+    with _INFLIGHT_LOCK:
+        flight = _INFLIGHT.get(key)
+        leader = flight is None
+        if leader:
+            flight = _INFLIGHT[key] = Future()
+    
+    if not leader:
+        return flight.result()
+    
+    try:
+        result = fn()
+    except BaseException as e:
+        flight.set_exception(e)
+        raise
+    else:
+        flight.set_result(result)
+        return result
+    finally:
+        with _INFLIGHT_LOCK:
+            del _INFLIGHT[key]
+
+
+def _storage_path(requirements: Dict) -> str:
+    """Storage path for media services, defaulted when unset or empty and with ~ expanded."""
+    return os.path.expanduser(requirements.get('storage_path') or _DEFAULT_STORAGE_PATH)
+
+
+def _jellyfin_step(hardware: Dict, requirements: Dict, step_number: int) -> PlanStep:
+    storage = _storage_path(requirements)
+    return PlanStep(
+        step_number=step_number,
+        name="Install Jellyfin",
+        description="Install Jellyfin media server via Docker",
+        command=f"docker run -d --name jellyfin --restart=always -p 8096:8096 -v {storage}/jellyfin/config:/config -v {storage}/jellyfin/media:/media jellyfin/jellyfin:latest",
+        commands=[],
+        requires_sudo=False,
+        check_command="docker ps | grep jellyfin",
+        rollback_command="docker stop jellyfin && docker rm jellyfin",
+        expected_output="jellyfin",
+        error_hint="Check if port 8096 is available"
+    )
+
+
+def _immich_step(hardware: Dict, requirements: Dict, step_number: int) -> PlanStep:
+    storage = _storage_path(requirements)
+    return PlanStep(
+        step_number=step_number,
+        name="Install Immich",
+        description="Install Immich photo server",
+        command=None,
+        commands=[
+            f"mkdir -p {storage}/immich",
+            f"cd {storage}/immich && curl -o docker-compose.yml https://github.com/immich-app/immich/releases/latest/download/docker-compose.yml",
+            f"cd {storage}/immich && docker compose up -d"
+        ],
+        requires_sudo=False,
+        check_command="docker ps | grep immich",
+        rollback_command=f"cd {storage}/immich && docker compose down",
+        expected_output="immich",
+        error_hint="Check Immich logs: docker logs immich_server"
+    )
+
+
+def _needs_docker(hardware: Dict, requirements: Dict) -> bool:
+    wants_container = (requirements.get('want_adguard') or requirements.get('want_immich')
+                       or requirements.get('want_jellyfin'))
+    return bool(wants_container) and not hardware.get('has_docker')
+
+
+# (predicate, factory) pairs walked in order by _generate_template_plan
+_TEMPLATE_STEPS: Tuple[Tuple[Callable[[Dict, Dict], bool], Callable[[Dict, Dict, int], PlanStep]], ...] = (
+    (lambda hw, req: not hw.get('has_curl'), _prototype(_CURL_STEP)),
+    (_needs_docker, _prototype(_DOCKER_STEP)),
+    (_needs_docker, _prototype(_DOCKER_GROUP_STEP)),
+    (_needs_docker, _prototype(_DOCKER_NEWGRP_STEP)),
+    (lambda hw, req: req.get('want_tailscale'), _prototype(_TAILSCALE_STEP)),
+    (lambda hw, req: req.get('want_tailscale') and req.get('tailscale_auth_key'), _tailscale_connect_step),
+    (lambda hw, req: req.get('want_adguard'), _prototype(_ADGUARD_STEP)),
+    (lambda hw, req: req.get('want_openclaw'), _prototype(_OPENCLAW_STEP)),
+    (lambda hw, req: req.get('want_jellyfin'), _jellyfin_step),
+    (lambda hw, req: req.get('want_immich'), _immich_step),
+)
+
+
 class PlanningEngine:
     """Generates installation plans using configurable AI provider."""
     
-    SYSTEM_PROMPT = """You are a Linux system administration expert. Your task is to create detailed, step-by-step installation plans for home server software.
+    SYSTEM_PROMPT = SYSTEM_PROMPT
 
-Rules:
-1. Commands must be safe and follow best practices
-2. Use apt for package management on Debian/Ubuntu
-3. Prefer Docker/Compose for services when appropriate
-4. Include verification steps after each installation
-5. Consider the specific hardware profile provided
-6. Handle common errors proactively
-
-Output must be valid JSON with this structure:
-{
-  "title": "string",
-  "description": "string", 
-  "prerequisites": ["string"],
-  "steps": [
-    {
-      "step_number": 1,
-      "name": "string",
-      "description": "string",
-      "command": "string or null",
-      "commands": ["string"],
-      "requires_sudo": true/false,
-      "check_command": "string or null",
-      "rollback_command": "string or null",
-      "expected_output": "string or null",
-      "error_hint": "string"
-    }
-  ],
-  "estimated_time_minutes": number,
-  "known_issues": ["string"],
-  "post_install_notes": ["string"]
-}"""
+    # Seconds before an async AI call counts as hung and is retried
+    AI_CALL_TIMEOUT = 120
+    
+    # Plans requested per multi-task call, bounded by the model's output tokens
+    MAX_PLANS_PER_CALL = 10
 
-    def __init__(self, api_key: Optional[str] = None, ai_config: Optional[Dict] = None):
+    def __init__(self, api_key: Optional[str] = None, ai_config: Optional[Dict] = None,
+                 use_cache: bool = True):
         """
         Initialize planning engine.
         
         Args:
             api_key: Legacy OpenAI API key (for backward compatibility)
             ai_config: Full AI provider configuration dict with provider, model, api_key, base_url
+            use_cache: Reuse AI plans generated for an identical prompt in the last 7 days
         """
         from ai_provider import AIProviderConfig
         
         self.ai_config = None
+        self.use_cache = use_cache
         
         if ai_config:
             # Use provided config
@@ -142,19 +476,33 @@ Output must be valid JSON with this structure:
         if not isinstance(user_requirements, dict):
             raise ValueError(f"user_requirements must be dict, got {type(user_requirements).__name__}")
         
+        if not self._wants_components(user_requirements):
+            logger.info("No components selected, using template plan")
+            return self._generate_template_plan(hardware_profile, user_requirements)
+        
         prompt = self._build_prompt(hardware_profile, user_requirements)
+        cache_key = self._plan_cache_key(prompt)
         
         try:
+            plan_data = self._load_cached_plan(cache_key)
+            if plan_data is not None:
+                logger.info("Using cached AI plan")
+                return self._parse_plan(plan_data)
+            
             from ai_provider import call_ai_with_config
-            plan_data = call_ai_with_config(
+            plan_data = _single_flight(cache_key, lambda: call_ai_with_config(
                 self.ai_config,
-                self.SYSTEM_PROMPT,
+                self._plan_system_prompt(),
                 prompt,
-                expect_json=True
-            )
+                expect_json=True,
+                json_schema=PLAN_JSON_SCHEMA
+            ))
             
             if plan_data:
-                return self._parse_plan(plan_data)
+                plan = self._parse_plan(plan_data)
+                # Only plans that parsed are worth reusing
+                self._store_cached_plan(cache_key, plan_data)
+                return plan
             else:
                 print("   AI call failed, using template plan")
                 return self._generate_template_plan(hardware_profile, user_requirements)
@@ -171,29 +519,380 @@ Output must be valid JSON with this structure:
             print(f"   Warning: AI plan generation failed ({e}), using template plan")
             logger.warning(f"AI plan generation error: {type(e).__name__}: {e}")
             return self._generate_template_plan(hardware_profile, user_requirements)
-    def _build_prompt(self, hardware: Dict, requirements: Dict) -> str:
-        components = []
-        if requirements.get('want_tailscale'):
-            components.append("Tailscale VPN")
-        if requirements.get('want_adguard'):
-            components.append("AdGuard Home")
-        if requirements.get('want_openclaw'):
-            components.append("OpenClaw")
-        if requirements.get('want_immich'):
-            components.append("Immich photo server")
-        if requirements.get('want_jellyfin'):
-            components.append("Jellyfin media server")
+    
+    def generate_plan_stream(self, hardware_profile: Dict,
+                             user_requirements: Dict) -> Iterator[Union[PlanStep, InstallationPlan]]:
+        """
+        Generate a plan, yielding each PlanStep as soon as the AI has written it.
+        
+        The last item is always the complete InstallationPlan, and it is the one
+        to execute: if the finished response turns out to be unusable the plan
+        falls back to the template, whose steps differ from those already yielded.
+        """
+        if not isinstance(hardware_profile, dict):
+            raise ValueError(f"hardware_profile must be dict, got {type(hardware_profile).__name__}")
+        if not isinstance(user_requirements, dict):
+            raise ValueError(f"user_requirements must be dict, got {type(user_requirements).__name__}")
+        
+        plan = None
+        if self.ai_config and self._wants_components(user_requirements):
+            prompt = self._build_prompt(hardware_profile, user_requirements)
+            cache_key = self._plan_cache_key(prompt)
+            
+            try:
+                plan_data = self._load_cached_plan(cache_key)
+                if plan_data is not None:
+                    plan = self._parse_plan(plan_data)
+                    yield from plan.steps
+                else:
+                    from ai_provider import stream_ai_with_config
+                    text = ''
+                    array_pos = None
+                    streamed = 0
+                    chunks = stream_ai_with_config(self.ai_config, self._plan_system_prompt(), prompt,
+                                                   json_schema=PLAN_JSON_SCHEMA)
+                    for chunk in chunks:
+                        text += chunk
+                        if array_pos is None:
+                            match = _STEPS_ARRAY_RE.search(text)
+                            if match is None:
+                                continue
+                            array_pos = match.end()
+                        step_items, array_pos = _decode_array_items(text, array_pos)
+                        for step_data in step_items:
+                            yield self._parse_step(step_data, streamed)
+                            streamed += 1
+                    
+                    if text:
+                        plan_data = json.loads(text)
+                        plan = self._parse_plan(plan_data)
+                        self._store_cached_plan(cache_key, plan_data)
+                    else:
+                        print("   AI call failed, using template plan")
+            except ValueError as e:
+                # Also covers invalid JSON (json.JSONDecodeError)
+                print(f"   Warning: AI plan validation failed ({e}), using template plan")
+                logger.warning(f"AI plan validation error: {e}")
+            except Exception as e:
+                print(f"   Warning: AI plan generation failed ({e}), using template plan")
+                logger.warning(f"AI plan generation error: {type(e).__name__}: {e}")
+        
+        if plan is None:
+            plan = self._generate_template_plan(hardware_profile, user_requirements)
+            yield from plan.steps
+        yield plan
+    
+    async def agenerate_plan(self, hardware_profile: Dict, user_requirements: Dict) -> InstallationPlan:
+        """Async generate_plan(), so several plans can wait on the AI provider at once."""
+        if not self.ai_config:
+            return self._generate_template_plan(hardware_profile, user_requirements)
+        
+        if not isinstance(hardware_profile, dict):
+            raise ValueError(f"hardware_profile must be dict, got {type(hardware_profile).__name__}")
+        if not isinstance(user_requirements, dict):
+            raise ValueError(f"user_requirements must be dict, got {type(user_requirements).__name__}")
+        
+        if not self._wants_components(user_requirements):
+            return self._generate_template_plan(hardware_profile, user_requirements)
+        
+        prompt = self._build_prompt(hardware_profile, user_requirements)
+        cache_key = self._plan_cache_key(prompt)
         
-        return f"""Create an installation plan for a home server with these components: {', '.join(components)}
+        try:
+            plan_data = self._load_cached_plan(cache_key)
+            if plan_data is not None:
+                return self._parse_plan(plan_data)
+            
+            import asyncio
+            from ai_provider import acall_ai_with_config
+            # API errors come back as None; only hung calls are worth retrying
+            call = aretry_with_backoff(
+                max_retries=2,
+                exceptions=(asyncio.TimeoutError,),
+                timeout=self.AI_CALL_TIMEOUT
+            )(acall_ai_with_config)
+            plan_data = await call(
+                self.ai_config,
+                self._plan_system_prompt(),
+                prompt,
+                expect_json=True,
+                json_schema=PLAN_JSON_SCHEMA
+            )
+            if not plan_data:
+                print("   AI call failed, using template plan")
+                return self._generate_template_plan(hardware_profile, user_requirements)
+            
+            plan = self._parse_plan(plan_data)
+            self._store_cached_plan(cache_key, plan_data)
+            return plan
+        except Exception as e:
+            print(f"   Warning: AI plan generation failed ({e}), using template plan")
+            logger.warning(f"AI plan generation error: {type(e).__name__}: {e}")
+            return self._generate_template_plan(hardware_profile, user_requirements)
+    
+    def generate_plans(self, hardware_profile: Dict,
+                       requirements_list: List[Dict]) -> List[InstallationPlan]:
+        """
+        Generate plans for several requirement sets on the same hardware.
+        
+        Up to MAX_PLANS_PER_CALL sets share one AI call, so the system prompt
+        and hardware profile are sent once instead of once per plan. Any set
+        the answer leaves out, or gets wrong, is retried with generate_plan().
+        """
+        if not self.ai_config:
+            return [self._generate_template_plan(hardware_profile, requirements)
+                    for requirements in requirements_list]
+        
+        keys = [self._plan_cache_key(self._build_prompt(hardware_profile, requirements))
+                for requirements in requirements_list]
+        plans: Dict[int, InstallationPlan] = {}
+        for i, key in enumerate(keys):
+            if not self._wants_components(requirements_list[i]):
+                plans[i] = self._generate_template_plan(hardware_profile, requirements_list[i])
+                continue
+            cached = self._load_cached_plan(key)
+            if cached is not None:
+                try:
+                    plans[i] = self._parse_plan(cached)
+                except ValueError:
+                    pass
+        
+        pending = [i for i in range(len(requirements_list)) if i not in plans]
+        for start in range(0, len(pending), self.MAX_PLANS_PER_CALL):
+            chunk = pending[start:start + self.MAX_PLANS_PER_CALL]
+            prompt = self._build_batch_prompt(hardware_profile, [requirements_list[i] for i in chunk])
+            try:
+                from ai_provider import call_ai_with_config
+                data = call_ai_with_config(self.ai_config, self.SYSTEM_PROMPT, prompt, expect_json=True)
+                results = data.get('results', []) if isinstance(data, dict) else []
+            except Exception as e:
+                logger.warning(f"Multi-plan generation error: {type(e).__name__}: {e}")
+                results = []
+            
+            for result in results:
+                task_id = result.get('id') if isinstance(result, dict) else None
+                if not isinstance(task_id, int) or not 0 <= task_id < len(chunk):
+                    continue
+                index = chunk[task_id]
+                try:
+                    plans[index] = self._parse_plan(result.get('plan'))
+                except ValueError:
+                    continue
+                self._store_cached_plan(keys[index], result['plan'])
+        
+        return [plans[i] if i in plans else self.generate_plan(hardware_profile, requirements)
+                for i, requirements in enumerate(requirements_list)]
+    
+    def generate_plan_batch(self, requests: List[Tuple[Dict, Dict]],
+                            timeout: float = 24 * 3600) -> List[InstallationPlan]:
+        """
+        Generate plans for many (hardware_profile, user_requirements) pairs at once.
+        
+        For OpenAI the uncached prompts go out as one Batch API job, which costs
+        half as much but may take hours, so this is for precomputing plans, not
+        interactive setup. Other providers fall back to one generate_plan call
+        per pair. Plans are returned in input order; any pair the batch could
+        not answer gets the template plan.
+        """
+        if not self.ai_config or self.ai_config.provider != 'openai':
+            return [self.generate_plan(hardware, requirements) for hardware, requirements in requests]
+        
+        prompts = [self._build_prompt(hardware, requirements) for hardware, requirements in requests]
+        keys = [self._plan_cache_key(prompt) for prompt in prompts]
+        plan_data: Dict[int, Dict] = {}
+        for i, key in enumerate(keys):
+            cached = self._load_cached_plan(key)
+            if cached is not None:
+                plan_data[i] = cached
+        
+        # Sets without components are left out and get the template plan below
+        pending = {i: prompts[i] for i in range(len(prompts))
+                   if i not in plan_data and self._wants_components(requests[i][1])}
+        if pending:
+            try:
+                from ai_provider import create_ai_client
+                client = create_ai_client(self.ai_config)
+                if client:
+                    batch_id = self._submit_plan_batch(client, pending)
+                    for i, data in self._wait_for_plan_batch(client, batch_id, timeout).items():
+                        plan_data[i] = data
+                        self._store_cached_plan(keys[i], data)
+            except Exception as e:
+                print(f"   Warning: batch plan generation failed ({e}), using template plans")
+                logger.warning(f"Batch plan generation error: {type(e).__name__}: {e}")
+        
+        plans = []
+        for i, (hardware, requirements) in enumerate(requests):
+            try:
+                plans.append(self._parse_plan(plan_data[i]))
+            except (KeyError, ValueError):
+                plans.append(self._generate_template_plan(hardware, requirements))
+        return plans
+    
+    def _submit_plan_batch(self, client, prompts: Dict[int, str]) -> str:
+        """Upload one chat request per prompt as a Batch API job; return the batch ID."""
+        lines = []
+        for i, prompt in prompts.items():
+            lines.append(json.dumps({
+                'custom_id': str(i),
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': {
+                    'model': self.ai_config.model,
+                    'messages': [
+                        {'role': 'system', 'content': self._plan_system_prompt()},
+                        {'role': 'user', 'content': prompt},
+                    ],
+                    'temperature': self.ai_config.temperature,
+                    'max_tokens': self.ai_config.max_tokens,
+                    'response_format': {'type': 'json_schema', 'json_schema': PLAN_JSON_SCHEMA},
+                },
+            }))
+        input_file = client.files.create(
+            file=('plans.jsonl', '\n'.join(lines).encode('utf-8')),
+            purpose='batch'
+        )
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        logger.info(f"Submitted plan batch {batch.id} with {len(lines)} requests")
+        return batch.id
+    
+    def _wait_for_plan_batch(self, client, batch_id: str, timeout: float) -> Dict[int, Dict]:
+        """Poll a batch with exponential backoff; return plan data by request index."""
+        deadline = time.monotonic() + timeout
+        delay = 5.0
+        batch = client.batches.retrieve(batch_id)
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            if time.monotonic() + delay > deadline:
+                logger.warning(f"Plan batch {batch_id} still {batch.status} after {timeout:.0f}s")
+                return {}
+            time.sleep(delay)
+            delay = min(delay * 2, 300.0)
+            batch = client.batches.retrieve(batch_id)
+        
+        if batch.status != 'completed' or not batch.output_file_id:
+            logger.warning(f"Plan batch {batch_id} ended as {batch.status}")
+            return {}
+        
+        results = {}
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                body = record['response']['body']
+                results[int(record['custom_id'])] = json.loads(body['choices'][0]['message']['content'])
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                # Failed requests carry an error instead; they get the template plan
+                logger.warning(f"Unusable batch result: {e}")
+        return results
+    
+    def _plan_system_prompt(self) -> str:
+        """System prompt for single-plan calls, which also send PLAN_JSON_SCHEMA."""
+        if self.ai_config.provider == 'openai':
+            # Enforced server-side, so the structure need not be spelled out
+            return SYSTEM_RULES
+        return self.SYSTEM_PROMPT
+    
+    def _plan_cache_key(self, prompt: str) -> str:
+        """Hash everything that determines the AI's answer: prompts, provider and model."""
+        # A tuple has a fixed order, so nothing needs sorting; the compact
+        # stdlib output matches orjson's byte for byte. The key only names a
+        # local cache file, so a 128-bit BLAKE2b digest is plenty
+        fields = (self._plan_system_prompt(), prompt, self.ai_config.provider, self.ai_config.model)
+        if orjson is not None:
+            data = orjson.dumps(fields)
+        else:
+            data = json.dumps(fields, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+    
+    def _load_cached_plan(self, key: str) -> Optional[Dict]:
+        """Return cached plan data for key, or None if missing, stale or disabled."""
+        if not self.use_cache:
+            return None
+        path = _PLAN_CACHE_DIR / f"{key}.json"
+        try:
+            if time.time() - path.stat().st_mtime >= _PLAN_CACHE_TTL:
+                return None
+            return (orjson or json).loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+    
+    def _store_cached_plan(self, key: str, plan_data: Dict):
+        """Write plan data for key atomically; cache failures are never fatal."""
+        if not self.use_cache:
+            return
+        path = _PLAN_CACHE_DIR / f"{key}.json"
+        try:
+            data = orjson.dumps(plan_data) if orjson is not None else json.dumps(plan_data).encode()
+            # Plans can embed secrets such as the Tailscale auth key, so the
+            # cache is owner-only (older versions created the directory 0755)
+            path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            os.chmod(path.parent, 0o700)
+            tmp_path = path.with_suffix('.tmp')
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.debug(f"Could not write plan cache: {e}")
+    
+    @staticmethod
+    def _wants_components(requirements: Dict) -> bool:
+        """Whether any component is selected; without one there is nothing to ask the AI."""
+        return any(value for key, value in requirements.items() if key.startswith('want_'))
+    
+    @staticmethod
+    def _requested_components(requirements: Dict) -> List[str]:
+        """Display names of the components a requirements dict asks for."""
+        return [name for key, name in _COMPONENT_NAMES if requirements.get(key)]
+    
+    def _build_batch_prompt(self, hardware: Dict, requirements_list: List[Dict]) -> str:
+        """Prompt for one plan per requirements dict, with the hardware profile sent once."""
+        tasks = [
+            {'id': i, 'components': self._requested_components(requirements), 'requirements': requirements}
+            for i, requirements in enumerate(requirements_list)
+        ]
+        return f"""Create {len(tasks)} independent installation plans for the same home server, one per task.
 
 HARDWARE PROFILE:
 ```json
-{json.dumps(hardware, indent=2)}
+{_prompt_json(hardware)}
 ```
 
-USER REQUIREMENTS:
+TASKS:
 ```json
-{json.dumps(requirements, indent=2)}
+{_prompt_json(tasks)}
+```
+
+Each plan follows the plan structure above and covers its task's components: prerequisites check, Docker installation (if needed), each component installation with verification, and post-installation configuration steps.
+
+Respond with a single JSON object of the form {{"results": [{{"id": <task id>, "plan": {{...}}}}]}}, with exactly one result per task id.
+
+The target system is {hardware.get('distro', 'linux')} {hardware.get('distro_version', '')}.
+
+IMPORTANT NOTES:
+- Tailscale needs an auth key or interactive login
+- AdGuard Home uses port 53 which may conflict with systemd-resolved
+- OpenClaw requires a gateway token from the user
+- Media servers should use each task's storage_path, or ~/home-server-data if not specified
+"""
+    
+    def _build_prompt(self, hardware: Dict, requirements: Dict) -> str:
+        components = self._requested_components(requirements)
+        
+        # Parts that only depend on the machine come first, so repeated requests
+        # share the longest possible prefix; the per-request parts go last
+        return f"""Create an installation plan for a home server.
+
+The target system is {hardware.get('distro', 'linux')} {hardware.get('distro_version', '')}.
+
+HARDWARE PROFILE:
+```json
+{_prompt_json(hardware)}
 ```
 
 Generate a complete installation plan as JSON. Include:
@@ -202,45 +901,37 @@ Generate a complete installation plan as JSON. Include:
 3. Each component installation with verification
 4. Post-installation configuration steps
 
-The target system is {hardware.get('distro', 'linux')} {hardware.get('distro_version', '')}.
-
 IMPORTANT NOTES:
 - Tailscale needs an auth key or interactive login
 - AdGuard Home uses port 53 which may conflict with systemd-resolved
 - OpenClaw requires a gateway token from the user
-- Media servers should use the storage path: {requirements.get('storage_path', '/var/lib')} or ~/home-server-data if not specified
+
+COMPONENTS: {', '.join(components)}
+
+USER REQUIREMENTS:
+```json
+{_prompt_json(requirements)}
+```
+
+Media servers should use the storage path: {_storage_path(requirements)}
 """
     
     def _parse_plan(self, data: Dict) -> InstallationPlan:
         """Parse JSON response into InstallationPlan."""
         # Validate required fields
-        if not isinstance(data, dict):
-            raise ValueError(f"Expected dict for plan data, got {type(data).__name__}")
-        
-        if 'steps' not in data:
-            raise ValueError("Plan data missing required 'steps' field")
-        
-        steps = []
-        for i, step_data in enumerate(data.get('steps', [])):
-            if not isinstance(step_data, dict):
-                raise ValueError(f"Step {i} is not a dict: {type(step_data).__name__}")
+        if _plan_data_validator is not None:
+            try:
+                _plan_data_validator(data)
+            except fastjsonschema.JsonSchemaException as e:
+                raise ValueError(f"Invalid plan data: {e.message}") from e
+        else:
+            if not isinstance(data, dict):
+                raise ValueError(f"Expected dict for plan data, got {type(data).__name__}")
             
-            step_number = step_data.get('step_number', i + 1)
-            if not isinstance(step_number, int):
-                step_number = i + 1
-                
-            steps.append(PlanStep(
-                step_number=step_number,
-                name=step_data.get('name', f'Step {step_number}'),
-                description=step_data.get('description', ''),
-                command=step_data.get('command'),
-                commands=step_data.get('commands', []) if isinstance(step_data.get('commands'), list) else [],
-                requires_sudo=bool(step_data.get('requires_sudo', False)),
-                check_command=step_data.get('check_command'),
-                rollback_command=step_data.get('rollback_command'),
-                expected_output=step_data.get('expected_output'),
-                error_hint=step_data.get('error_hint', 'Check logs for details')
-            ))
+            if 'steps' not in data:
+                raise ValueError("Plan data missing required 'steps' field")
+        
+        steps = [self._parse_step(step_data, i) for i, step_data in enumerate(data.get('steps', []))]
         
         return InstallationPlan(
             title=data.get('title', 'Installation Plan'),
@@ -252,182 +943,37 @@ IMPORTANT NOTES:
             post_install_notes=data.get('post_install_notes', [])
         )
     
+    @staticmethod
+    def _parse_step(step_data: Dict, index: int) -> PlanStep:
+        """Parse the step at index of a JSON plan into a PlanStep."""
+        if not isinstance(step_data, dict):
+            raise ValueError(f"Step {index} is not a dict: {type(step_data).__name__}")
+        
+        get = step_data.get
+        step_number = get('step_number')
+        if not isinstance(step_number, int):
+            step_number = index + 1
+        commands = get('commands')
+        
+        return PlanStep(
+            step_number=step_number,
+            name=get('name', f'Step {step_number}'),
+            description=get('description', ''),
+            command=get('command'),
+            commands=commands if isinstance(commands, list) else [],
+            requires_sudo=bool(get('requires_sudo', False)),
+            check_command=get('check_command'),
+            rollback_command=get('rollback_command'),
+            expected_output=get('expected_output'),
+            error_hint=get('error_hint', 'Check logs for details')
+        )
+    
     def _generate_template_plan(self, hardware: Dict, requirements: Dict) -> InstallationPlan:
         """Generate a fallback template plan if GPT fails."""
         steps = []
-        step_num = 1
-        
-        # Get storage path with proper default
-        storage = requirements.get('storage_path') or '~/home-server-data'
-        storage = os.path.expanduser(storage)
-        
-        # Prerequisites
-        if not hardware.get('has_curl'):
-            steps.append(PlanStep(
-                step_number=step_num,
-                name="Install curl",
-                description="Install curl for downloading scripts",
-                command="sudo apt update && sudo apt install -y curl",
-                commands=[],
-                requires_sudo=True,
-                check_command="curl --version",
-                rollback_command=None,
-                expected_output="curl",
-                error_hint="Check internet connection and apt sources"
-            ))
-            step_num += 1
-        
-        # Docker installation if needed
-        docker_needed = requirements.get('want_adguard') or requirements.get('want_immich') or requirements.get('want_jellyfin')
-        
-        if docker_needed and not hardware.get('has_docker'):
-            steps.append(PlanStep(
-                step_number=step_num,
-                name="Install Docker",
-                description="Install Docker using official script",
-                command="curl -fsSL https://get.docker.com | sh",
-                commands=[],
-                requires_sudo=True,
-                check_command="docker --version",
-                rollback_command="sudo apt remove -y docker docker-engine docker.io containerd runc",
-                expected_output="Docker version",
-                error_hint="Check if Docker service is running: sudo systemctl status docker"
-            ))
-            step_num += 1
-            
-            steps.append(PlanStep(
-                step_number=step_num,
-                name="Add user to docker group",
-                description="Add current user to docker group for permissionless access",
-                command="sudo usermod -aG docker $USER",
-                commands=[],
-                requires_sudo=True,
-                check_command="groups $USER | grep docker",
-                rollback_command="sudo gpasswd -d $USER docker",
-                expected_output="docker",
-                error_hint="Log out and back in for group changes to take effect, or run 'newgrp docker'"
-            ))
-            step_num += 1
-            
-            # Note: Docker group changes require re-login, so add a warning step
-            steps.append(PlanStep(
-                step_number=step_num,
-                name="Apply Docker group changes",
-                description="Apply Docker group membership for current session",
-                command="newgrp docker",
-                commands=[],
-                requires_sudo=False,
-                check_command="docker ps",
-                rollback_command=None,
-                expected_output="CONTAINER",
-                error_hint="If this fails, you may need to log out and log back in for Docker permissions to take effect"
-            ))
-            step_num += 1
-        
-        # Tailscale
-        if requirements.get('want_tailscale'):
-            steps.append(PlanStep(
-                step_number=step_num,
-                name="Install Tailscale",
-                description="Install Tailscale VPN",
-                command="curl -fsSL https://tailscale.com/install.sh | sh",
-                commands=[],
-                requires_sudo=True,
-                check_command="tailscale version",
-                rollback_command="sudo apt remove -y tailscale",
-                expected_output="tailscale",
-                error_hint="Check if systemd is running: systemctl status tailscaled"
-            ))
-            step_num += 1
-            
-            auth_key = requirements.get('tailscale_auth_key')
-            if auth_key:
-                steps.append(PlanStep(
-                    step_number=step_num,
-                    name="Connect Tailscale",
-                    description="Connect to Tailscale network",
-                    command=f"sudo tailscale up --authkey={auth_key}",
-                    commands=[],
-                    requires_sudo=True,
-                    check_command="tailscale status",
-                    rollback_command="sudo tailscale down",
-                    expected_output="Connected",
-                    error_hint="Check if auth key is valid and not expired"
-                ))
-                step_num += 1
-        
-        # AdGuard Home
-        if requirements.get('want_adguard'):
-            steps.append(PlanStep(
-                step_number=step_num,
-                name="Install AdGuard Home",
-                description="Install AdGuard Home via Docker",
-                command="docker run -d --name adguardhome --restart=always -p 53:53/tcp -p 53:53/udp -p 3000:3000 -v ~/adguardhome/work:/opt/adguardhome/work -v ~/adguardhome/conf:/opt/adguardhome/conf adguard/adguardhome",
-                commands=[],
-                requires_sudo=False,
-                check_command="docker ps | grep adguardhome",
-                rollback_command="docker stop adguardhome && docker rm adguardhome",
-                expected_output="adguardhome",
-                error_hint="Port 53 may be in use by systemd-resolved. Run: sudo systemctl stop systemd-resolved"
-            ))
-            step_num += 1
-        
-        # OpenClaw
-        if requirements.get('want_openclaw'):
-            steps.append(PlanStep(
-                step_number=step_num,
-                name="Install OpenClaw",
-                description="Download and install OpenClaw",
-                commands=[
-                    "curl -fsSL https://raw.githubusercontent.com/openclaw/agent/main/install.sh | bash",
-                    "openclaw --version"
-                ],
-                command=None,
-                requires_sudo=True,
-                check_command="which openclaw",
-                rollback_command="sudo rm -rf /usr/local/bin/openclaw /opt/openclaw",
-                expected_output="/usr/local/bin/openclaw",
-                error_hint="Check installation logs in /tmp/openclaw-install.log"
-            ))
-            step_num += 1
-        
-        # Jellyfin
-        if requirements.get('want_jellyfin'):
-            storage = requirements.get('storage_path', '~/home-server-data')
-            steps.append(PlanStep(
-                step_number=step_num,
-                name="Install Jellyfin",
-                description="Install Jellyfin media server via Docker",
-                command=f"docker run -d --name jellyfin --restart=always -p 8096:8096 -v {storage}/jellyfin/config:/config -v {storage}/jellyfin/media:/media jellyfin/jellyfin:latest",
-                commands=[],
-                requires_sudo=False,
-                check_command="docker ps | grep jellyfin",
-                rollback_command="docker stop jellyfin && docker rm jellyfin",
-                expected_output="jellyfin",
-                error_hint="Check if port 8096 is available"
-            ))
-            step_num += 1
-        
-        # Immich
-        if requirements.get('want_immich'):
-            storage = requirements.get('storage_path', '~/home-server-data')
-            steps.append(PlanStep(
-                step_number=step_num,
-                name="Install Immich",
-                description="Install Immich photo server",
-                commands=[
-                    f"mkdir -p {storage}/immich",
-                    f"cd {storage}/immich && curl -o docker-compose.yml https://github.com/immich-app/immich/releases/latest/download/docker-compose.yml",
-                    f"cd {storage}/immich && docker compose up -d"
-                ],
-                command=None,
-                requires_sudo=False,
-                check_command="docker ps | grep immich",
-                rollback_command=f"cd {storage}/immich && docker compose down",
-                expected_output="immich",
-                error_hint="Check Immich logs: docker logs immich_server"
-            ))
-            step_num += 1
+        for applies, make_step in _TEMPLATE_STEPS:
+            if applies(hardware, requirements):
+                steps.append(make_step(hardware, requirements, len(steps) + 1))
         
         return InstallationPlan(
             title="Home Server Installation Plan",
@@ -447,6 +993,26 @@ IMPORTANT NOTES:
         )
 
 
+def _decode_array_items(text: str, pos: int) -> Tuple[List, int]:
+    """
+    Decode the complete JSON array items in text from pos onwards.
+    
+    Stops at the end of the array or at an item that has not been fully
+    received yet, returning the items and the position to resume from.
+    """
+    items = []
+    while True:
+        while pos < len(text) and text[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(text) or text[pos] == ']':
+            return items, pos
+        try:
+            item, pos = _JSON_DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            return items, pos
+        items.append(item)
+
+
 def create_plan(hardware_profile: Dict, user_requirements: Dict, api_key: Optional[str] = None, ai_config: Optional[Dict] = None) -> InstallationPlan:
     """Convenience function to create plan.
     
@@ -478,11 +1044,131 @@ def create_plan(hardware_profile: Dict, user_requirements: Dict, api_key: Option
     return plan
 
 
+async def acreate_many(requests: List[Tuple[Dict, Dict]], ai_config: Optional[Dict] = None,
+                       max_concurrency: int = 4) -> List[InstallationPlan]:
+    """
+    Create plans for many (hardware_profile, user_requirements) pairs concurrently.
+    
+    At most max_concurrency AI calls are in flight, to stay under provider
+    rate limits. Plans are returned in input order.
+    """
+    import asyncio
+    
+    engine = PlanningEngine(ai_config=ai_config)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def create_one(hardware_profile: Dict, user_requirements: Dict) -> InstallationPlan:
+        async with semaphore:
+            plan = await engine.agenerate_plan(hardware_profile, user_requirements)
+        domain_config = user_requirements.get('domain_config')
+        if domain_config and domain_config.get('enabled'):
+            plan = add_reverse_proxy_steps(plan, domain_config, user_requirements)
+        return plan
+    
+    return list(await asyncio.gather(*(create_one(hw, req) for hw, req in requests)))
+
+
+# Reverse proxy steps that never vary, renumbered into each plan
+_PROXY_INSTALL_STEPS = {
+    'caddy': PlanStep(
+        step_number=0,
+        name="Install Caddy Reverse Proxy",
+        description="Install Caddy with automatic HTTPS via Let's Encrypt",
+        command="sudo apt install -y debian-keyring debian-archive-keyring apt-transport-https && curl -1sLf 'https://dl.cloudsmith.io/public/caddy/stable/gpg.key' | sudo gpg --dearmor -o /usr/share/keyrings/caddy-stable-archive-keyring.gpg && curl -1sLf 'https://dl.cloudsmith.io/public/caddy/stable/debian.deb.txt' | sudo tee /etc/apt/sources.list.d/caddy-stable.list && sudo apt update && sudo apt install -y caddy",
+        commands=[],
+        requires_sudo=True,
+        check_command="caddy version",
+        rollback_command="sudo apt remove -y caddy && sudo rm -f /etc/apt/sources.list.d/caddy-stable.list",
+        expected_output="v2.",
+        error_hint="Check if GPG key import succeeded. May need to install gnupg first."
+    ),
+    'nginx': PlanStep(
+        step_number=0,
+        name="Install Nginx Reverse Proxy",
+        description="Install Nginx and certbot for HTTPS",
+        command="sudo apt update && sudo apt install -y nginx certbot python3-certbot-nginx",
+        commands=[],
+        requires_sudo=True,
+        check_command="nginx -v",
+        rollback_command="sudo apt remove -y nginx certbot python3-certbot-nginx",
+        expected_output="nginx version",
+        error_hint="Check if nginx service started: sudo systemctl status nginx"
+    ),
+    'traefik': PlanStep(
+        step_number=0,
+        name="Install Traefik Reverse Proxy",
+        description="Install Traefik via Docker",
+        command="docker pull traefik:v3.0",
+        commands=[],
+        requires_sudo=False,
+        check_command="docker images | grep traefik",
+        rollback_command="docker rmi traefik:v3.0",
+        expected_output="traefik",
+        error_hint="Check Docker is running and has network access"
+    ),
+}
+
+_TAILSCALE_FUNNEL_STEP = PlanStep(
+    step_number=0,
+    name="Configure Tailscale Funnel",
+    description="Set up Tailscale Funnel for secure external access",
+    command="sudo tailscale funnel --bg 443",
+    commands=[],
+    requires_sudo=True,
+    check_command="sudo tailscale funnel status",
+    rollback_command="sudo tailscale funnel --off",
+    expected_output="Funnel",
+    error_hint="Ensure Tailscale is connected and you have funnel permissions"
+)
+
+_AUTH_MIDDLEWARE_STEP = PlanStep(
+    step_number=0,
+    name="Configure Authentication Middleware",
+    description="Set up Authelia or basic auth for domain access",
+    command="docker run -d --name authelia --restart=always -p 9091:9091 -v ~/authelia/config:/config authelia/authelia:latest",
+    commands=[],
+    requires_sudo=False,
+    check_command="docker ps | grep authelia",
+    rollback_command="docker stop authelia && docker rm authelia",
+    expected_output="authelia",
+    error_hint="Check Authelia logs: docker logs authelia"
+)
+
+
+# Services that can be proxied under the domain, as (enable flag, subdomain
+# key, default subdomain, local port, router name); the single source for
+# subdomains, every proxy config and the post-install URL list
+_PROXY_SERVICES = (
+    ('use_for_dashboard', 'subdomain_dashboard', 'dashboard', 8080, 'dashboard'),
+    ('use_for_adguard', 'subdomain_adguard', 'adguard', 3000, 'adguard'),
+    ('use_for_jellyfin', 'subdomain_jellyfin', 'jellyfin', 8096, 'jellyfin'),
+    ('use_for_immich', 'subdomain_immich', 'photos', 2283, 'immich'),
+)
+
+# Routers of the _PROXY_SERVICES entries that Nginx and Traefik are configured for
+_MEDIA_PROXY_ROUTERS = frozenset({'jellyfin', 'immich'})
+
+
+def _proxy_hosts(domain_config: Dict, domain: str) -> List[Tuple[str, int, str]]:
+    """(host, local port, router name) of each enabled _PROXY_SERVICES entry."""
+    get = domain_config.get
+    return [
+        (f"{get(subdomain_key, default_subdomain)}.{domain}", port, router)
+        for flag, subdomain_key, default_subdomain, port, router in _PROXY_SERVICES
+        if get(flag)
+    ]
+
+
 def add_reverse_proxy_steps(plan: InstallationPlan, domain_config: Dict, user_requirements: Dict) -> InstallationPlan:
     """Add reverse proxy configuration steps to the plan."""
-    from copy import deepcopy
-    
-    plan = deepcopy(plan)
+    # Only these lists are modified below (steps are appended, never edited),
+    # so copying them is enough to leave the caller's plan untouched
+    plan = replace(
+        plan,
+        steps=list(plan.steps),
+        known_issues=list(plan.known_issues),
+        post_install_notes=list(plan.post_install_notes)
+    )
     reverse_proxy = domain_config.get('reverse_proxy', 'caddy')
     domain_name = domain_config.get('domain_name')
     
@@ -490,45 +1176,9 @@ def add_reverse_proxy_steps(plan: InstallationPlan, domain_config: Dict, user_re
     step_num = len(plan.steps) + 1
     
     # Add reverse proxy installation step
-    if reverse_proxy == 'caddy':
-        plan.steps.append(PlanStep(
-            step_number=step_num,
-            name="Install Caddy Reverse Proxy",
-            description="Install Caddy with automatic HTTPS via Let's Encrypt",
-            command="sudo apt install -y debian-keyring debian-archive-keyring apt-transport-https && curl -1sLf 'https://dl.cloudsmith.io/public/caddy/stable/gpg.key' | sudo gpg --dearmor -o /usr/share/keyrings/caddy-stable-archive-keyring.gpg && curl -1sLf 'https://dl.cloudsmith.io/public/caddy/stable/debian.deb.txt' | sudo tee /etc/apt/sources.list.d/caddy-stable.list && sudo apt update && sudo apt install -y caddy",
-            commands=[],
-            requires_sudo=True,
-            check_command="caddy version",
-            rollback_command="sudo apt remove -y caddy && sudo rm -f /etc/apt/sources.list.d/caddy-stable.list",
-            expected_output="v2.",
-            error_hint="Check if GPG key import succeeded. May need to install gnupg first."
-        ))
-    elif reverse_proxy == 'nginx':
-        plan.steps.append(PlanStep(
-            step_number=step_num,
-            name="Install Nginx Reverse Proxy",
-            description="Install Nginx and certbot for HTTPS",
-            command="sudo apt update && sudo apt install -y nginx certbot python3-certbot-nginx",
-            commands=[],
-            requires_sudo=True,
-            check_command="nginx -v",
-            rollback_command="sudo apt remove -y nginx certbot python3-certbot-nginx",
-            expected_output="nginx version",
-            error_hint="Check if nginx service started: sudo systemctl status nginx"
-        ))
-    elif reverse_proxy == 'traefik':
-        plan.steps.append(PlanStep(
-            step_number=step_num,
-            name="Install Traefik Reverse Proxy",
-            description="Install Traefik via Docker",
-            command="docker pull traefik:v3.0",
-            commands=[],
-            requires_sudo=False,
-            check_command="docker images | grep traefik",
-            rollback_command="docker rmi traefik:v3.0",
-            expected_output="traefik",
-            error_hint="Check Docker is running and has network access"
-        ))
+    install_step = _PROXY_INSTALL_STEPS.get(reverse_proxy)
+    if install_step is not None:
+        plan.steps.append(_renumbered(install_step, step_num))
     
     step_num += 1
     
@@ -552,34 +1202,12 @@ def add_reverse_proxy_steps(plan: InstallationPlan, domain_config: Dict, user_re
     
     # Add Tailscale funnel configuration if enabled
     if domain_config.get('use_tailscale_funnel'):
-        plan.steps.append(PlanStep(
-            step_number=step_num,
-            name="Configure Tailscale Funnel",
-            description="Set up Tailscale Funnel for secure external access",
-            command="sudo tailscale funnel --bg 443",
-            commands=[],
-            requires_sudo=True,
-            check_command="sudo tailscale funnel status",
-            rollback_command="sudo tailscale funnel --off",
-            expected_output="Funnel",
-            error_hint="Ensure Tailscale is connected and you have funnel permissions"
-        ))
+        plan.steps.append(_renumbered(_TAILSCALE_FUNNEL_STEP, step_num))
         step_num += 1
     
     # Add authentication middleware if required
     if domain_config.get('require_auth') and not domain_config.get('use_tailscale_funnel'):
-        plan.steps.append(PlanStep(
-            step_number=step_num,
-            name="Configure Authentication Middleware",
-            description="Set up Authelia or basic auth for domain access",
-            command="docker run -d --name authelia --restart=always -p 9091:9091 -v ~/authelia/config:/config authelia/authelia:latest",
-            commands=[],
-            requires_sudo=False,
-            check_command="docker ps | grep authelia",
-            rollback_command="docker stop authelia && docker rm authelia",
-            expected_output="authelia",
-            error_hint="Check Authelia logs: docker logs authelia"
-        ))
+        plan.steps.append(_renumbered(_AUTH_MIDDLEWARE_STEP, step_num))
         step_num += 1
     
     # Add rate limiting configuration
@@ -597,51 +1225,104 @@ def add_reverse_proxy_steps(plan: InstallationPlan, domain_config: Dict, user_re
     ))
     
     # Add known issues and post-install notes for domain setup
+    hosts = get_configured_subdomains(domain_config)
     plan.known_issues.extend([
         f"DNS records must point to your server IP for {domain_name} and subdomains",
         f"Port 80 and 443 must be open for Let's Encrypt certificate issuance",
-        f"CNAME records needed: {', '.join(get_configured_subdomains(domain_config))}"
+        f"CNAME records needed: {', '.join(hosts)}"
     ])
     
+    plan.post_install_notes.append("Access your services at:")
+    plan.post_install_notes.extend(f"  - https://{host}" for host in hosts)
     plan.post_install_notes.extend([
-        f"Access your services at:",
-        f"  - https://{domain_name}" if domain_config.get('use_for_dashboard') else None,
-        f"  - https://{domain_config.get('subdomain_adguard', 'adguard')}.{domain_name}" if domain_config.get('use_for_adguard') else None,
-        f"  - https://{domain_config.get('subdomain_jellyfin', 'jellyfin')}.{domain_name}" if domain_config.get('use_for_jellyfin') else None,
-        f"  - https://{domain_config.get('subdomain_immich', 'photos')}.{domain_name}" if domain_config.get('use_for_immich') else None,
         "\nDNS Configuration Required:",
         f"  Create A record: {domain_name} → YOUR_SERVER_IP",
         f"  Create CNAME records for each subdomain → {domain_name}"
     ])
     
-    # Remove None values from post_install_notes
-    plan.post_install_notes = [n for n in plan.post_install_notes if n is not None]
-    
     return plan
 
 
 def get_configured_subdomains(domain_config: Dict) -> list:
     """Get list of configured subdomains."""
-    subdomains = []
     domain = domain_config.get('domain_name', 'example.com')
+    return [host for host, port, router in _proxy_hosts(domain_config, domain)]
+
+
+# Writes a config file through a quoted heredoc, so the body needs no shell
+# escaping; {marker} must not occur as a line of its own in {body}
+_HEREDOC_TMPL = """{writer} <<'{marker}'
+{body}
+{marker}"""
+
+# Caddyfile pieces, filled in with str.format_map. Automatic HTTPS is off
+# globally so each site controls its own TLS
+_CADDY_HEADER_TMPL = """# Home Server Caddy Configuration
+
+{{
+    auto_https off
+    email admin@{domain}
+}}
+"""
+
+_CADDY_SITE_TMPL = """
+{host} {{
+    reverse_proxy localhost:{port}
+    tls internal
+}}
+"""
+
+# Nginx server block for one proxied host
+_NGINX_SITE_TMPL = """server {{
+    listen 80;
+    server_name {host};
     
-    if domain_config.get('use_for_adguard'):
-        subdomains.append(f"{domain_config.get('subdomain_adguard', 'adguard')}.{domain}")
-    if domain_config.get('use_for_jellyfin'):
-        subdomains.append(f"{domain_config.get('subdomain_jellyfin', 'jellyfin')}.{domain}")
-    if domain_config.get('use_for_immich'):
-        subdomains.append(f"{domain_config.get('subdomain_immich', 'photos')}.{domain}")
-    if domain_config.get('use_for_dashboard'):
-        subdomains.append(f"{domain_config.get('subdomain_dashboard', 'dashboard')}.{domain}")
-    
-    return subdomains
+    location / {{
+        proxy_pass http://localhost:{port};
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+    }}
+}}"""
+
+_TRAEFIK_COMPOSE_TMPL = """version: '3'
+services:
+  traefik:
+    image: traefik:v3.0
+    command:
+      - --api.insecure=true
+      - --providers.docker=true
+      - --entrypoints.web.address=:80
+      - --entrypoints.websecure.address=:443
+      - --certificatesresolvers.letsencrypt.acme.tlschallenge=true
+      - --certificatesresolvers.letsencrypt.acme.email=admin@{domain}
+      - --certificatesresolvers.letsencrypt.acme.storage=/letsencrypt/acme.json
+    ports:
+      - 80:80
+      - 443:443
+    volumes:
+      - /var/run/docker.sock:/var/run/docker.sock:ro
+      - ./letsencrypt:/letsencrypt
+    networks:
+      - proxy
+    labels:
+      - "traefik.enable=true"
+{service_labels}"""
+
+# Router labels for one service, listed as comments in the compose file
+# because they belong on that service's own container
+_TRAEFIK_ROUTER_LABELS_TMPL = """#   {router}:
+#     - "traefik.http.routers.{router}.rule=Host(`{host}`)"
+#     - "traefik.http.routers.{router}.tls.certresolver=letsencrypt"
+"""
 
 
 def generate_proxy_config(domain_config: Dict, user_requirements: Dict) -> Dict:
     """Generate reverse proxy configuration commands."""
     reverse_proxy = domain_config.get('reverse_proxy', 'caddy')
     domain = domain_config.get('domain_name')
-    storage = user_requirements.get('storage_path', '~/home-server-data')
+    storage = _storage_path(user_requirements)
     
     if reverse_proxy == 'caddy':
         return generate_caddy_config(domain_config, domain, storage)
@@ -655,66 +1336,19 @@ def generate_proxy_config(domain_config: Dict, user_requirements: Dict) -> Dict:
 
 def generate_caddy_config(domain_config: Dict, domain: str, storage: str) -> Dict:
     """Generate Caddy configuration."""
-    config_lines = ["# Home Server Caddy Configuration", ""]
-    
-    # Global options
-    config_lines.extend([
-        "{",
-        "    auto_https off",  # We'll enable per-site for control
-        "    email admin@" + domain,
-        "}",
-        ""
-    ])
-    
-    # Dashboard
-    if domain_config.get('use_for_dashboard'):
-        subdomain = domain_config.get('subdomain_dashboard', 'dashboard')
-        config_lines.extend([
-            f"{subdomain}.{domain} {{",
-            f"    reverse_proxy localhost:8080",
-            "    tls internal",
-            "}",
-            ""
-        ])
-    
-    # AdGuard
-    if domain_config.get('use_for_adguard'):
-        subdomain = domain_config.get('subdomain_adguard', 'adguard')
-        config_lines.extend([
-            f"{subdomain}.{domain} {{",
-            f"    reverse_proxy localhost:3000",
-            "    tls internal",
-            "}",
-            ""
-        ])
-    
-    # Jellyfin
-    if domain_config.get('use_for_jellyfin'):
-        subdomain = domain_config.get('subdomain_jellyfin', 'jellyfin')
-        config_lines.extend([
-            f"{subdomain}.{domain} {{",
-            f"    reverse_proxy localhost:8096",
-            "    tls internal",
-            "}",
-            ""
-        ])
-    
-    # Immich
-    if domain_config.get('use_for_immich'):
-        subdomain = domain_config.get('subdomain_immich', 'photos')
-        config_lines.extend([
-            f"{subdomain}.{domain} {{",
-            f"    reverse_proxy localhost:2283",
-            "    tls internal",
-            "}",
-            ""
-        ])
-    
-    config_content = "\n".join(config_lines)
+    sites = [
+        _CADDY_SITE_TMPL.format_map({'host': host, 'port': port})
+        for host, port, router in _proxy_hosts(domain_config, domain)
+    ]
+    config_content = _CADDY_HEADER_TMPL.format_map({'domain': domain}) + "".join(sites)
     
     return {
         'commands': [
-            f"echo '{config_content}' | sudo tee /etc/caddy/Caddyfile",
+            _HEREDOC_TMPL.format_map({
+                'writer': "sudo tee /etc/caddy/Caddyfile >/dev/null",
+                'marker': 'CADDY_EOF',
+                'body': config_content
+            }),
             "sudo systemctl reload caddy"
         ],
         'check_command': "sudo caddy validate --config /etc/caddy/Caddyfile",
@@ -723,56 +1357,36 @@ def generate_caddy_config(domain_config: Dict, domain: str, storage: str) -> Dic
     }
 
 
+def _media_proxy_hosts(domain_config: Dict, domain: str) -> List[Tuple[str, int, str]]:
+    """_proxy_hosts entries that Nginx and Traefik are configured for."""
+    return [
+        entry for entry in _proxy_hosts(domain_config, domain)
+        if entry[2] in _MEDIA_PROXY_ROUTERS
+    ]
+
+
+def _nginx_site_commands(host: str, port: int) -> Tuple[str, str]:
+    """Commands that write and enable the Nginx site for host."""
+    return (
+        _HEREDOC_TMPL.format_map({
+            'writer': f"sudo tee /etc/nginx/sites-available/{host} >/dev/null",
+            'marker': 'NGINX_EOF',
+            'body': _NGINX_SITE_TMPL.format_map({'host': host, 'port': port})
+        }),
+        f"sudo ln -sf /etc/nginx/sites-available/{host} /etc/nginx/sites-enabled/",
+    )
+
+
 def generate_nginx_config(domain_config: Dict, domain: str, storage: str) -> Dict:
     """Generate Nginx configuration snippets."""
-    commands = ["# Create Nginx site configurations"]
-    
-    configs = []
-    
-    if domain_config.get('use_for_jellyfin'):
-        subdomain = domain_config.get('subdomain_jellyfin', 'jellyfin')
-        configs.append((
-            f"{subdomain}.{domain}",
-            f"""server {{
-    listen 80;
-    server_name {subdomain}.{domain};
-    
-    location / {{
-        proxy_pass http://localhost:8096;
-        proxy_set_header Host $host;
-        proxy_set_header X-Real-IP $remote_addr;
-        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
-        proxy_set_header X-Forwarded-Proto $scheme;
-    }}
-}}"""
-        ))
-    
-    if domain_config.get('use_for_immich'):
-        subdomain = domain_config.get('subdomain_immich', 'photos')
-        configs.append((
-            f"{subdomain}.{domain}",
-            f"""server {{
-    listen 80;
-    server_name {subdomain}.{domain};
-    
-    location / {{
-        proxy_pass http://localhost:2283;
-        proxy_set_header Host $host;
-        proxy_set_header X-Real-IP $remote_addr;
-        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
-        proxy_set_header X-Forwarded-Proto $scheme;
-    }}
-}}"""
-        ))
-    
-    # Generate commands to create config files
-    for server_name, config in configs:
-        escaped_config = config.replace("'", "'\"'\"'")
-        commands.append(f"echo '{escaped_config}' | sudo tee /etc/nginx/sites-available/{server_name}")
-        commands.append(f"sudo ln -sf /etc/nginx/sites-available/{server_name} /etc/nginx/sites-enabled/")
-    
-    commands.append("sudo nginx -t")
-    commands.append("sudo systemctl reload nginx")
+    commands = [
+        "# Create Nginx site configurations",
+        *(command
+          for host, port, router in _media_proxy_hosts(domain_config, domain)
+          for command in _nginx_site_commands(host, port)),
+        "sudo nginx -t",
+        "sudo systemctl reload nginx",
+    ]
     
     return {
         'commands': commands,
@@ -784,46 +1398,23 @@ def generate_nginx_config(domain_config: Dict, domain: str, storage: str) -> Dic
 
 def generate_traefik_config(domain_config: Dict, domain: str, storage: str) -> Dict:
     """Generate Traefik Docker Compose configuration."""
-    config = f"""version: '3'
-services:
-  traefik:
-    image: traefik:v3.0
-    command:
-      - --api.insecure=true
-      - --providers.docker=true
-      - --entrypoints.web.address=:80
-      - --entrypoints.websecure.address=:443
-      - --certificatesresolvers.letsencrypt.acme.tlschallenge=true
-      - --certificatesresolvers.letsencrypt.acme.email=admin@{domain}
-      - --certificatesresolvers.letsencrypt.acme.storage=/letsencrypt/acme.json
-    ports:
-      - 80:80
-      - 443:443
-    volumes:
-      - /var/run/docker.sock:/var/run/docker.sock:ro
-      - ./letsencrypt:/letsencrypt
-    networks:
-      - proxy
-    labels:
-      - "traefik.enable=true"
-"""
-    
-    # Add labels for each service (would be added to service containers)
-    labels = []
-    if domain_config.get('use_for_jellyfin'):
-        subdomain = domain_config.get('subdomain_jellyfin', 'jellyfin')
-        labels.append(f'      - "traefik.http.routers.jellyfin.rule=Host(`{subdomain}.{domain}`)"')
-        labels.append('      - "traefik.http.routers.jellyfin.tls.certresolver=letsencrypt"')
-    
-    if domain_config.get('use_for_immich'):
-        subdomain = domain_config.get('subdomain_immich', 'photos')
-        labels.append(f'      - "traefik.http.routers.immich.rule=Host(`{subdomain}.{domain}`)"')
-        labels.append('      - "traefik.http.routers.immich.tls.certresolver=letsencrypt"')
+    hosts = _media_proxy_hosts(domain_config, domain)
+    service_labels = "".join(
+        _TRAEFIK_ROUTER_LABELS_TMPL.format_map({'router': router, 'host': host})
+        for host, port, router in hosts
+    )
+    if service_labels:
+        service_labels = "\n# Add to the labels of each proxied service container:\n" + service_labels
+    config = _TRAEFIK_COMPOSE_TMPL.format_map({'domain': domain, 'service_labels': service_labels})
     
     return {
         'commands': [
             f"mkdir -p {storage}/traefik",
-            f"echo '{config}' > {storage}/traefik/docker-compose.yml",
+            _HEREDOC_TMPL.format_map({
+                'writer': f"cat > {storage}/traefik/docker-compose.yml",
+                'marker': 'TRAEFIK_EOF',
+                'body': config
+            }),
             f"cd {storage}/traefik && docker compose up -d"
         ],
         'check_command': f"docker ps | grep traefik",
@@ -832,26 +1423,28 @@ services:
     }
 
 
+_RATE_LIMIT_COMMANDS: Dict[str, Tuple[str, ...]] = {
+    'caddy': (
+        "# Caddy rate limiting is configured per-site in Caddyfile",
+        "# Add 'rate_limit' directive to each site block if needed"
+    ),
+    'nginx': (
+        "# Add to nginx.conf http block:",
+        "# limit_req_zone $binary_remote_addr zone=general:10m rate=10r/s;",
+        "# Then add 'limit_req zone=general burst=20 nodelay;' to each server block"
+    ),
+    'traefik': (
+        "# Traefik rate limiting is configured via middleware labels:",
+        "# - 'traefik.http.middlewares.ratelimit.ratelimit.average=100'",
+        "# - 'traefik.http.middlewares.ratelimit.ratelimit.burst=50'"
+    ),
+}
+
+
 def get_rate_limit_commands(reverse_proxy: str) -> List[str]:
     """Get rate limiting configuration commands."""
-    if reverse_proxy == 'caddy':
-        return [
-            "# Caddy rate limiting is configured per-site in Caddyfile",
-            "# Add 'rate_limit' directive to each site block if needed"
-        ]
-    elif reverse_proxy == 'nginx':
-        return [
-            "# Add to nginx.conf http block:",
-            "# limit_req_zone $binary_remote_addr zone=general:10m rate=10r/s;",
-            "# Then add 'limit_req zone=general burst=20 nodelay;' to each server block"
-        ]
-    elif reverse_proxy == 'traefik':
-        return [
-            "# Traefik rate limiting is configured via middleware labels:",
-            "# - 'traefik.http.middlewares.ratelimit.ratelimit.average=100'",
-            "# - 'traefik.http.middlewares.ratelimit.ratelimit.burst=50'"
-        ]
-    return []
+    # A fresh list, as it becomes a PlanStep's commands
+    return list(_RATE_LIMIT_COMMANDS.get(reverse_proxy, ()))
 
 
 if __name__ == "__main__":
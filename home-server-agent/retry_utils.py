@@ -62,6 +62,50 @@ def retry_with_backoff(
     return decorator
 
 
+def aretry_with_backoff(
+    max_retries: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 30.0,
+    exponential_base: float = 2.0,
+    exceptions: Tuple[Type[Exception], ...] = (Exception,),
+    timeout: Optional[float] = None,
+    on_retry: Optional[Callable] = None
+):
+    """
+    Decorator like retry_with_backoff for coroutine functions.
+    
+    Waits with asyncio.sleep, so retries don't block the event loop and
+    concurrent callers back off in parallel. If timeout is set, each attempt
+    is cancelled after that many seconds and raises asyncio.TimeoutError,
+    which is retried when it is in exceptions.
+    """
+    # Imported here so sync-only users of this module don't pay for asyncio
+    import asyncio
+    
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for attempt in range(max_retries + 1):
+                try:
+                    if timeout is None:
+                        return await func(*args, **kwargs)
+                    return await asyncio.wait_for(func(*args, **kwargs), timeout)
+                except exceptions as e:
+                    if attempt >= max_retries:
+                        raise
+                    
+                    delay = min(base_delay * (exponential_base ** attempt), max_delay)
+                    sleep_time = delay + random.uniform(0, delay * 0.1)
+                    
+                    if on_retry:
+                        on_retry(attempt + 1, e, sleep_time)
+                    
+                    await asyncio.sleep(sleep_time)
+        
+        return wrapper
+    return decorator
+
+
 def retry_network_operation(max_retries: int = 3):
     """Specialized retry decorator for network operations."""
     return retry_with_backoff(
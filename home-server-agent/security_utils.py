@@ -8,7 +8,7 @@ import hashlib
 import secrets
 import hmac
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Sequence
 
 
 class SecurityError(Exception):
@@ -30,6 +30,13 @@ class InputValidator:
     
     # Dangerous shell metacharacters
     DANGEROUS_CHARS = set(';|&$`\\<>!\n\r')
+    # Deletion table so a single C-level str.translate pass detects any of them
+    _DANGEROUS_TABLE = str.maketrans(dict.fromkeys(DANGEROUS_CHARS))
+    
+    @classmethod
+    def _has_dangerous_chars(cls, value: str) -> bool:
+        """Return True if value contains any shell metacharacter."""
+        return len(value.translate(cls._DANGEROUS_TABLE)) != len(value)
     
     @classmethod
     def validate_storage_path(cls, path: str) -> Tuple[bool, str]:
@@ -49,7 +56,7 @@ class InputValidator:
             return False, "Path contains null bytes"
         
         # Check for dangerous characters
-        if any(c in path for c in cls.DANGEROUS_CHARS):
+        if cls._has_dangerous_chars(path):
             return False, f"Path contains dangerous characters: {cls.DANGEROUS_CHARS}"
         
         # Check for parent directory traversal
@@ -99,7 +106,7 @@ class InputValidator:
             return False, "Domain too long (max 253 characters)"
         
         # Check for dangerous characters
-        if any(c in domain for c in cls.DANGEROUS_CHARS):
+        if cls._has_dangerous_chars(domain):
             return False, "Domain contains invalid characters"
         
         # Validate format
@@ -185,7 +192,7 @@ class CommandBuilder:
     def build_docker_run(
         image: str,
         name: str,
-        ports: List[Tuple[int, int]] = None,
+        ports: Sequence[Tuple] = None,
         volumes: List[Tuple[str, str, str]] = None,
         env_vars: List[Tuple[str, str]] = None,
         network: str = None,
@@ -200,7 +207,8 @@ class CommandBuilder:
         Args:
             image: Docker image (should be pinned to digest)
             name: Container name
-            ports: List of (host_port, container_port)
+            ports: Sequence of (host_port, container_port) or
+                (host_port, container_port, protocol) where protocol is 'tcp' or 'udp'
             volumes: List of (host_path, container_path, mode) where mode is 'ro' or 'rw'
             env_vars: List of (key, value)
             network: Network name
@@ -240,10 +248,16 @@ class CommandBuilder:
         
         # Ports
         if ports:
-            for host_port, container_port in ports:
+            for port in ports:
+                host_port, container_port = port[0], port[1]
+                protocol = port[2] if len(port) > 2 else 'tcp'
                 if not (1 <= host_port <= 65535 and 1 <= container_port <= 65535):
                     raise SecurityError(f"Invalid port numbers: {host_port}, {container_port}")
-                cmd.extend(['-p', f'{host_port}:{container_port}'])
+                if protocol not in ('tcp', 'udp'):
+                    raise SecurityError(f"Invalid port protocol: {protocol}")
+                # Docker defaults to tcp, so only udp needs an explicit suffix
+                suffix = '/udp' if protocol == 'udp' else ''
+                cmd.extend(['-p', f'{host_port}:{container_port}{suffix}'])
         
         # Volumes
         if volumes:
@@ -5,6 +5,7 @@ import sys
 import os
 import json
 import secrets
+from contextlib import contextmanager
 
 # Add parent to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -29,6 +30,66 @@ def test_interview_imports():
         print(f"✗ interview import failed: {e}")
         return False
 
+def test_interview_domain_validation():
+    """Test the interview's domain validator."""
+    from interview import _validate_domain
+    
+    for domain in ['example.com', 'sub.example.com', 'my-server.io', 'a.b.c.d.example.org']:
+        assert _validate_domain(domain) is None, f"Domain {domain} should be valid"
+    
+    invalid_domains = ['localhost', '-example.com', 'example-.com', 'example..com',
+                       'exa_mple.com', 'ex ample.com', 'exämple.com', 'a' * 64 + '.com',
+                       ('a' * 60 + '.') * 5 + 'com']
+    for domain in invalid_domains:
+        assert _validate_domain(domain) is not None, f"Domain {domain} should be invalid"
+    
+    print("✓ Interview domain validation OK")
+    return True
+
+def test_requirements_from_answers_dict():
+    """Test non-interactive UserRequirements construction."""
+    from interview import UserRequirements
+    
+    requirements = UserRequirements.from_answers_dict({
+        'use_cases': ['media_server'],
+        'want_jellyfin': True,
+        'domain_config': {'domain_name': 'example.com', 'reverse_proxy': 'nginx'},
+        'unknown_key': 'ignored',
+    })
+    assert requirements.want_jellyfin is True
+    assert requirements.want_tailscale is True, "Missing keys should take interview defaults"
+    assert requirements.domain_name == 'example.com'
+    assert requirements.domain_config.reverse_proxy == 'nginx'
+    assert requirements.domain_config.subdomain_jellyfin == 'media'
+    
+    data = requirements.to_dict()
+    assert data['use_cases'] == ['media_server']
+    assert 'unknown_key' not in data
+    assert UserRequirements.from_answers_dict({}).domain_config is None
+    # Non-list values are passed through for the validator to reject
+    assert UserRequirements.from_answers_dict({'use_cases': 'vpn'}).to_dict()['use_cases'] == 'vpn'
+    
+    print("✓ UserRequirements.from_answers_dict OK")
+    return True
+
+def test_requirements_to_dict():
+    """Test UserRequirements.to_dict matches dataclasses.asdict output."""
+    from dataclasses import asdict
+    from interview import UserRequirements
+    
+    requirements = UserRequirements.from_answers_dict({'use_cases': ['vpn']})
+    data = requirements.to_dict()
+    assert data['domain_config'] is None
+    assert data == asdict(requirements)
+    
+    requirements = UserRequirements.from_answers_dict({'domain_config': {'domain_name': 'example.com'}})
+    data = requirements.to_dict()
+    assert data['domain_config'] == requirements.domain_config.to_dict()
+    assert data == asdict(requirements)
+    
+    print("✓ UserRequirements.to_dict OK")
+    return True
+
 def test_planner_imports():
     """Test that planner module imports correctly."""
     try:
@@ -89,9 +150,356 @@ def test_plan_step_structure():
     data = step.to_dict()
     assert data['step_number'] == 1
     assert data['name'] == "Test Step"
+    assert not hasattr(step, '__dict__'), "PlanStep should use __slots__"
+    
+    from dataclasses import FrozenInstanceError
+    try:
+        step.name = "Changed"
+        assert False, "PlanStep should be immutable"
+    except FrozenInstanceError:
+        pass
     print("✓ PlanStep structure OK")
     return True
 
+def test_parse_plan_validation():
+    """Test _parse_plan rejects malformed plans and coerces loose step fields."""
+    from planner import PlanningEngine
+    
+    engine = PlanningEngine(use_cache=False)
+    for bad in ([], {}, {'steps': 'x'}, {'steps': [1]}):
+        try:
+            engine._parse_plan(bad)
+            assert False, f"Expected ValueError for {bad!r}"
+        except ValueError:
+            pass
+    
+    step = engine._parse_plan({'steps': [{'step_number': 'one', 'commands': 'ls'}]}).steps[0]
+    assert step.step_number == 1 and step.commands == []
+    print("✓ Plan parse validation OK")
+    return True
+
+def test_template_plan_steps():
+    """Test template plan steps are selected from the static table and renumbered."""
+    import planner
+    
+    engine = planner.PlanningEngine(use_cache=False)
+    plan = engine._generate_template_plan(
+        {'has_curl': True, 'has_docker': False},
+        {'want_jellyfin': True, 'want_tailscale': True, 'storage_path': '/mnt/data'}
+    )
+    names = [s.name for s in plan.steps]
+    assert names == ["Install Docker", "Add user to docker group", "Apply Docker group changes",
+                     "Install Tailscale", "Install Jellyfin"]
+    assert [s.step_number for s in plan.steps] == [1, 2, 3, 4, 5]
+    assert '/mnt/data/jellyfin/config' in plan.steps[-1].command
+    assert planner._DOCKER_STEP.step_number == 0
+    
+    # An unset storage path falls back to the expanded default
+    import os
+    plan_default = engine._generate_template_plan({}, {'want_immich': True, 'storage_path': None})
+    assert plan_default.steps[-1].commands[0] == f"mkdir -p {os.path.expanduser('~/home-server-data')}/immich"
+    assert engine._requested_components({'want_jellyfin': True, 'want_adguard': True}) == \
+        ["AdGuard Home", "Jellyfin media server"]
+    
+    assert json.loads(plan.to_json()) == plan.to_dict()
+    print("✓ Template plan steps OK")
+    return True
+
+def test_reverse_proxy_steps_copy():
+    """Test add_reverse_proxy_steps leaves the input plan untouched."""
+    from planner import PlanningEngine, add_reverse_proxy_steps
+    
+    plan = PlanningEngine(use_cache=False)._generate_template_plan({}, {'want_jellyfin': True})
+    steps = list(plan.steps)
+    notes = list(plan.post_install_notes)
+    domain_config = {'enabled': True, 'domain_name': 'example.com', 'use_for_jellyfin': True}
+    
+    updated = add_reverse_proxy_steps(plan, domain_config, {})
+    
+    assert plan.steps == steps and plan.post_install_notes == notes
+    assert len(updated.steps) > len(steps)
+    assert updated.steps[0] is plan.steps[0]
+    assert "  - https://jellyfin.example.com" in updated.post_install_notes
+    assert None not in updated.post_install_notes
+    
+    from planner import get_configured_subdomains
+    assert get_configured_subdomains({'domain_name': 'example.com', 'use_for_dashboard': True,
+                                      'use_for_immich': True, 'subdomain_immich': 'pics'}) == \
+        ['dashboard.example.com', 'pics.example.com']
+    print("✓ Reverse proxy steps copy OK")
+    return True
+
+def test_reverse_proxy_configs():
+    """Test generated reverse proxy configs cover the enabled services."""
+    import os
+    import subprocess
+    import tempfile
+    from planner import generate_caddy_config, generate_nginx_config, generate_traefik_config
+    
+    domain_config = {'use_for_jellyfin': True, 'use_for_immich': True, 'subdomain_immich': "pic's"}
+    caddy = generate_caddy_config(domain_config, 'example.com', '/srv')
+    
+    # The Caddyfile reaches the file intact through the shell, quote included
+    with tempfile.TemporaryDirectory() as tmpdir:
+        target = os.path.join(tmpdir, 'Caddyfile')
+        command = caddy['commands'][0].replace('sudo tee /etc/caddy/Caddyfile', f'tee {target}')
+        subprocess.run(command, shell=True, check=True)
+        with open(target) as f:
+            caddyfile = f.read()
+    assert "jellyfin.example.com {\n    reverse_proxy localhost:8096" in caddyfile
+    assert "pic's.example.com {\n    reverse_proxy localhost:2283" in caddyfile
+    assert 'adguard' not in caddyfile
+    
+    nginx = generate_nginx_config(domain_config, 'example.com', '/srv')['commands']
+    assert nginx[0].startswith('#') and nginx[-2:] == ["sudo nginx -t", "sudo systemctl reload nginx"]
+    assert len(nginx) == 3 + 2 * 2, "Each site is written and enabled"
+    assert "proxy_pass http://localhost:8096;" in nginx[1]
+    
+    traefik = generate_traefik_config(domain_config, 'example.com', '/srv')['commands']
+    assert "routers.jellyfin.rule=Host(`jellyfin.example.com`)" in traefik[1]
+    assert "routers.immich.tls.certresolver=letsencrypt" in traefik[1]
+    print("✓ Reverse proxy configs OK")
+    return True
+
+_OPENAI_TEST_CONFIG = {'provider': 'openai', 'model': 'gpt-4o-mini', 'api_key': 'k'}
+
+
+@contextmanager
+def _isolated_plan_cache():
+    """Point the planner's plan cache at a fresh temporary directory."""
+    import tempfile
+    from pathlib import Path
+    from unittest import mock
+    import planner
+    
+    with tempfile.TemporaryDirectory() as tmpdir, \
+         mock.patch.object(planner, '_PLAN_CACHE_DIR', Path(tmpdir)):
+        yield Path(tmpdir)
+
+
+def test_plan_cache():
+    """Test AI plans are cached by prompt, provider and model."""
+    from unittest import mock
+    import planner
+    
+    plan_data = {'title': 'Cached', 'steps': [{'name': 'Install Docker', 'command': 'true'}]}
+    hardware = {'distro': 'ubuntu'}
+    requirements = {'want_jellyfin': True}
+    ai_config = _OPENAI_TEST_CONFIG
+    
+    with _isolated_plan_cache() as cache_dir, \
+         mock.patch('ai_provider.call_ai_with_config', return_value=plan_data) as call_ai:
+        engine = planner.PlanningEngine(ai_config=ai_config)
+        assert engine.generate_plan(hardware, requirements).title == 'Cached'
+        assert engine.generate_plan(hardware, requirements).steps[0].name == 'Install Docker'
+        assert call_ai.call_count == 1, "Second identical request should hit the cache"
+        # Cached plans may carry credentials: owner-only directory and files
+        assert cache_dir.stat().st_mode & 0o777 == 0o700
+        assert all(p.stat().st_mode & 0o777 == 0o600 for p in cache_dir.glob('*.json'))
+        
+        engine.generate_plan(hardware, {'want_immich': True})
+        other_model = planner.PlanningEngine(ai_config=dict(ai_config, model='gpt-4o'))
+        other_model.generate_plan(hardware, requirements)
+        uncached = planner.PlanningEngine(ai_config=ai_config, use_cache=False)
+        uncached.generate_plan(hardware, requirements)
+        assert call_ai.call_count == 4
+        
+        # Nothing selected: the template plan is returned without an AI call
+        empty = engine.generate_plan(hardware, {'want_jellyfin': False, 'storage_path': '/srv'})
+        assert empty.title == "Home Server Installation Plan"
+        assert call_ai.call_count == 4
+    
+    print("✓ Plan cache OK")
+    return True
+
+
+def test_plan_single_flight():
+    """Test identical concurrent generate_plan calls share one AI call."""
+    import threading
+    import time
+    from unittest import mock
+    import planner
+    
+    calls = []
+    
+    def slow_call(*args, **kwargs):
+        calls.append(args)
+        time.sleep(0.1)
+        return {'title': 'Shared', 'steps': []}
+    
+    with mock.patch('ai_provider.call_ai_with_config', side_effect=slow_call):
+        engine = planner.PlanningEngine(ai_config=_OPENAI_TEST_CONFIG, use_cache=False)
+        titles = []
+        threads = [
+            threading.Thread(target=lambda: titles.append(
+                engine.generate_plan({}, {'want_jellyfin': True}).title))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    assert titles == ['Shared'] * 3
+    assert len(calls) == 1, f"Expected one shared AI call, got {len(calls)}"
+    assert not planner._INFLIGHT
+    print("✓ Plan single-flight OK")
+    return True
+
+
+def test_plan_batch():
+    """Test plans for many requests are generated through one Batch API job."""
+    from unittest import mock
+    import planner
+    
+    client = mock.Mock()
+    client.files.create.return_value = mock.Mock(id='file-in')
+    client.batches.create.return_value = mock.Mock(id='batch-1')
+    client.batches.retrieve.side_effect = [
+        mock.Mock(status='in_progress'),
+        mock.Mock(status='completed', output_file_id='file-out'),
+    ]
+    output = "\n".join(json.dumps({
+        'custom_id': custom_id,
+        'response': {'body': {'choices': [{'message': {'content': json.dumps({
+            'title': title, 'steps': []})}}]}},
+    }) for custom_id, title in (('1', 'Immich'), ('0', 'Jellyfin')))
+    client.files.content.return_value = mock.Mock(text=output + '\n{"custom_id": "2", "error": {}}')
+    
+    requests = [({}, {'want_jellyfin': True}), ({}, {'want_immich': True}), ({}, {'want_adguard': True})]
+    with _isolated_plan_cache(), \
+         mock.patch('ai_provider.create_ai_client', return_value=client), \
+         mock.patch('planner.time.sleep') as sleep:
+        engine = planner.PlanningEngine(ai_config=_OPENAI_TEST_CONFIG)
+        plans = engine.generate_plan_batch(requests)
+        
+        assert [p.title for p in plans[:2]] == ['Jellyfin', 'Immich']
+        assert plans[2].title == 'Home Server Installation Plan', "Failed request falls back to template"
+        assert client.batches.create.call_count == 1 and sleep.call_count == 1
+        uploaded = client.files.create.call_args.kwargs['file'][1].decode().splitlines()
+        assert [json.loads(line)['custom_id'] for line in uploaded] == ['0', '1', '2']
+        
+        # Answered requests were cached, so a rerun only submits the failed one
+        client.batches.retrieve.side_effect = [mock.Mock(status='failed', output_file_id=None)]
+        engine.generate_plan_batch(requests)
+        uploaded = client.files.create.call_args.kwargs['file'][1].decode().splitlines()
+        assert [json.loads(line)['custom_id'] for line in uploaded] == ['2']
+    
+    print("✓ Plan batch OK")
+    return True
+
+
+def test_plan_multi_task_prompt():
+    """Test generate_plans packs requirement sets into one call and retries gaps singly."""
+    from unittest import mock
+    import planner
+    
+    batch_answer = {'results': [
+        {'id': 2, 'plan': {'title': 'AdGuard', 'steps': []}},
+        {'id': 0, 'plan': {'title': 'Jellyfin', 'steps': []}},
+        {'id': 7, 'plan': {'title': 'Bogus', 'steps': []}},
+    ]}
+    single_answer = {'title': 'Immich', 'steps': []}
+    requirements = [{'want_jellyfin': True}, {'want_immich': True}, {'want_adguard': True}]
+    
+    with _isolated_plan_cache(), \
+         mock.patch('ai_provider.call_ai_with_config', side_effect=[batch_answer, single_answer]) as call_ai:
+        engine = planner.PlanningEngine(ai_config=_OPENAI_TEST_CONFIG)
+        plans = engine.generate_plans({'distro': 'ubuntu'}, requirements)
+        
+        assert [p.title for p in plans] == ['Jellyfin', 'Immich', 'AdGuard']
+        assert call_ai.call_count == 2
+        batch_prompt = call_ai.call_args_list[0][0][2]
+        assert batch_prompt.count('HARDWARE PROFILE') == 1 and '"id": 2' in batch_prompt
+        assert 'AdGuard Home' in batch_prompt and 'Immich photo server' in batch_prompt
+        
+        # Every plan is now cached, so a rerun makes no calls
+        assert [p.title for p in engine.generate_plans({'distro': 'ubuntu'}, requirements)][1] == 'Immich'
+        assert call_ai.call_count == 2
+    
+    print("✓ Multi-task plan prompt OK")
+    return True
+
+
+def test_plan_stream():
+    """Test generate_plan_stream yields steps before the AI response is complete."""
+    from unittest import mock
+    import planner
+    
+    response = json.dumps({
+        'title': 'Streamed',
+        'steps': [{'name': f'Step {n}', 'command': f'echo "{n}]"'} for n in range(1, 4)]
+    })
+    sent = []
+    
+    def fake_stream(config, system_prompt, prompt, json_schema=None):
+        # OpenAI enforces the schema, so the prompt leaves the structure out
+        assert json_schema is planner.PLAN_JSON_SCHEMA
+        assert system_prompt == planner.SYSTEM_RULES
+        for i in range(0, len(response), 7):
+            sent.append(i)
+            yield response[i:i + 7]
+    
+    ai_config = _OPENAI_TEST_CONFIG
+    with _isolated_plan_cache(), \
+         mock.patch('ai_provider.stream_ai_with_config', side_effect=fake_stream):
+        engine = planner.PlanningEngine(ai_config=ai_config)
+        items = []
+        for item in engine.generate_plan_stream({}, {'want_jellyfin': True}):
+            items.append((item, len(sent)))
+        
+        steps, plan = items[:-1], items[-1][0]
+        assert [s.name for s, _ in steps] == ['Step 1', 'Step 2', 'Step 3']
+        assert steps[0][1] < len(sent), "First step should arrive mid-stream"
+        assert isinstance(plan, planner.InstallationPlan) and plan.title == 'Streamed'
+        
+        # Second run is served from the plan cache
+        cached = list(engine.generate_plan_stream({}, {'want_jellyfin': True}))
+        assert cached[-1].title == 'Streamed' and len(cached) == 4
+    
+    assert planner._decode_array_items('{"a": 1}, {"b": [', 0) == ([{'a': 1}], 10)
+    
+    from ai_provider import AIProviderConfig, _response_format
+    anthropic_engine = planner.PlanningEngine(ai_config={**ai_config, 'provider': 'anthropic'})
+    assert anthropic_engine._plan_system_prompt() == planner.SYSTEM_PROMPT
+    assert _response_format(AIProviderConfig(**ai_config), True, planner.PLAN_JSON_SCHEMA)['type'] == 'json_schema'
+    custom = AIProviderConfig(**{**ai_config, 'provider': 'custom'})
+    assert _response_format(custom, True, planner.PLAN_JSON_SCHEMA) == {'type': 'json_object'}
+    print("✓ Plan streaming OK")
+    return True
+
+def test_plan_async_concurrency():
+    """Test acreate_many overlaps AI calls up to max_concurrency."""
+    import asyncio
+    import time
+    from unittest import mock
+    import planner
+    
+    in_flight = 0
+    peak = 0
+    
+    async def fake_call(config, system_prompt, prompt, expect_json=True, json_schema=None):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return {'title': prompt.splitlines()[0][-8:], 'steps': []}
+    
+    requests = [({}, {'want_jellyfin': True, 'storage_path': f'/data{i}'}) for i in range(6)]
+    with _isolated_plan_cache(), \
+         mock.patch('ai_provider.acall_ai_with_config', side_effect=fake_call):
+        start = time.monotonic()
+        plans = asyncio.run(planner.acreate_many(requests, ai_config=_OPENAI_TEST_CONFIG, max_concurrency=3))
+        elapsed = time.monotonic() - start
+    
+    assert len(plans) == 6 and all(p.title for p in plans)
+    assert peak == 3, f"Expected 3 concurrent calls, saw {peak}"
+    assert elapsed < 0.25, f"Calls should overlap, took {elapsed:.2f}s"
+    print("✓ Async plan generation OK")
+    return True
+
+
 def test_execution_result():
     """Test ExecutionResult dataclass."""
     from executor import ExecutionResult
@@ -269,6 +677,30 @@ def test_config_validation():
     
     return True
 
+
+def test_validate_requirements_schema():
+    """Test validate_requirements with and without the compiled schema."""
+    import config_validator
+    from config_validator import validate_requirements
+    
+    is_valid, errors, _ = validate_requirements({"use_cases": ["vpn"], "want_tailscale": True})
+    assert is_valid, f"Expected valid, got errors: {errors}"
+    
+    is_valid, errors, _ = validate_requirements({"use_cases": ["vpn"], "want_tailscale": "yes"})
+    assert not is_valid and errors, "Non-boolean flag should be rejected"
+    
+    # Semantic errors still come from ConfigValidator after the schema passes
+    is_valid, errors, _ = validate_requirements({"storage_path": "/srv/../etc"})
+    assert not is_valid, "Path traversal should be rejected"
+    
+    schema_flags = {k for k, v in config_validator.REQUIREMENTS_SCHEMA["properties"].items()
+                    if v["type"] == "boolean"}
+    assert schema_flags == {'want_tailscale', 'want_adguard', 'want_openclaw',
+                            'want_immich', 'want_jellyfin'}
+    
+    print("✓ validate_requirements schema fast path OK")
+    return True
+
 def test_retry_backoff_calculation():
     """Test retry delay calculation."""
     from retry_utils import retry_with_backoff
@@ -290,6 +722,44 @@ def test_retry_backoff_calculation():
     print("✓ Retry backoff calculation OK")
     return True
 
+def test_async_retry_backoff():
+    """Test aretry_with_backoff sleeps without blocking concurrent retries."""
+    import asyncio
+    import time
+    from retry_utils import aretry_with_backoff
+    
+    calls = 0
+    
+    @aretry_with_backoff(max_retries=2, base_delay=0.05, exceptions=(ValueError,))
+    async def failing():
+        nonlocal calls
+        calls += 1
+        raise ValueError("fail")
+    
+    async def run_all():
+        return await asyncio.gather(*(failing() for _ in range(20)), return_exceptions=True)
+    
+    start = time.monotonic()
+    results = asyncio.run(run_all())
+    elapsed = time.monotonic() - start
+    assert calls == 60 and all(isinstance(r, ValueError) for r in results)
+    # One caller's backoff is ~0.15s; serialized sleeps would take ~3s
+    assert elapsed < 0.6, f"Retries should back off concurrently, took {elapsed:.2f}s"
+    
+    attempts = 0
+    
+    @aretry_with_backoff(max_retries=1, base_delay=0.01, exceptions=(asyncio.TimeoutError,), timeout=0.05)
+    async def hangs_once():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            await asyncio.sleep(1)
+        return 'ok'
+    
+    assert asyncio.run(hangs_once()) == 'ok' and attempts == 2
+    print("✓ Async retry backoff OK")
+    return True
+
 def test_storage_path_validation():
     """Test storage path validation in config."""
     from config_validator import ConfigValidator
@@ -333,6 +803,67 @@ def test_version_info():
         return False
 
 
+def test_buffered_log_handler():
+    """Test the buffered log handler rotates by encoded size and formats once."""
+    import logging
+    import tempfile
+    from pathlib import Path
+    from unittest import mock
+    import main
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = Path(tmpdir) / "setup.log"
+        handler = main.BufferedRotatingFileHandler(str(log_path), maxBytes=100, backupCount=1, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        record = logging.LogRecord('t', logging.INFO, __file__, 1, "✅" * 10, None, None)
+        with mock.patch.object(handler, 'format', wraps=handler.format) as fmt:
+            handler.handle(record)
+            assert fmt.call_count == 1, "Each record should be formatted once"
+        # 10 characters but 31 bytes; the fourth record must start a new file
+        for _ in range(3):
+            handler.handle(record)
+        handler.close()
+        assert log_path.stat().st_size <= 100
+        assert Path(f"{log_path}.1").stat().st_size == 93
+    
+    print("✓ Buffered log handler OK")
+    return True
+
+
+def test_hardware_cache():
+    """Test hardware detection is served from the cache when fresh."""
+    import tempfile
+    from pathlib import Path
+    from unittest import mock
+    import main
+    from hardware_detector import detect_hardware
+    
+    profile = detect_hardware()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = Path(tmpdir) / "hw.json"
+        machine_id_path = Path(tmpdir) / "machine-id"
+        machine_id_path.write_text("test-machine\n")
+        with mock.patch.object(main, '_HW_CACHE_PATH', cache_path), \
+             mock.patch.object(main, '_MACHINE_ID_PATH', machine_id_path), \
+             mock.patch('hardware_detector.detect_hardware', return_value=profile) as detect:
+            first = main._cached_hardware()
+            second = main._cached_hardware()
+            assert detect.call_count == 1, "Fresh cache should skip detection"
+            assert second == first
+            
+            main._cached_hardware(rescan=True)
+            assert detect.call_count == 2, "rescan should bypass the cache"
+            
+            # Executing a plan changes installed tools and free space
+            main._invalidate_hardware_cache()
+            assert not cache_path.exists()
+            main._cached_hardware()
+            assert detect.call_count == 3, "Invalidated cache should re-detect"
+    
+    print("✓ Hardware cache OK")
+    return True
+
+
 def test_executor_empty_commands():
     """Test executor handles empty command lists."""
     from executor import ExecutionEngine, ExecutionResult
@@ -357,6 +888,74 @@ def test_executor_empty_commands():
     return True
 
 
+def test_executor_precheck_skip():
+    """Test that a passing precheck skips the step's install command."""
+    import tempfile
+    from executor import ExecutionEngine, StateManager
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        state = StateManager(db_path=os.path.join(tmpdir, "test.db"))
+        engine = ExecutionEngine(state_manager=state)
+        engine.session_id = "test-session"
+        marker = os.path.join(tmpdir, "marker")
+        
+        step = {
+            'step_number': 1,
+            'name': 'Precheck Step',
+            'command': ['touch', marker],
+            'precheck': ['true'],
+        }
+        result = engine.execute_step(step)
+        assert result.success is True, f"Expected skipped step to succeed, got: {result}"
+        assert not os.path.exists(marker), "Command should not run when precheck passes"
+        
+        step['precheck'] = ['false']
+        result = engine.execute_step(step)
+        assert result.success is True, f"Expected command to run, got: {result}"
+        assert os.path.exists(marker), "Command should run when precheck fails"
+        state.close()
+    
+    print("✓ Executor precheck skip OK")
+    return True
+
+
+def test_executor_write_file_step():
+    """Test that write_file steps write content in-process with the given mode."""
+    import stat
+    import tempfile
+    from executor import ExecutionEngine, StateManager
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        state = StateManager(db_path=os.path.join(tmpdir, "test.db"))
+        engine = ExecutionEngine(state_manager=state)
+        engine.session_id = "test-session"
+        env_path = os.path.join(tmpdir, ".env")
+        
+        step = {
+            'step_number': 1,
+            'name': 'Write env',
+            'action': 'write_file',
+            'path': env_path,
+            'content': "TOKEN=abc\n",
+            'mode': 0o600,
+        }
+        result = engine.execute_step(step)
+        assert result.success is True, f"Expected write to succeed, got: {result}"
+        with open(env_path) as f:
+            assert f.read() == "TOKEN=abc\n"
+        assert stat.S_IMODE(os.stat(env_path).st_mode) == 0o600
+        
+        # check_command runs after the write, as for command steps
+        checked = []
+        engine._run_command = lambda cmd, timeout: checked.append(cmd) or result
+        engine.execute_step(dict(step, check_command=f"test -s {env_path}"))
+        assert checked == [f"test -s {env_path}"]
+        state.close()
+    
+    print("✓ Executor write_file step OK")
+    return True
+
+
 def test_executor_dangerous_pattern_detection():
     """Test that dangerous commands are blocked."""
     from executor import ExecutionEngine
@@ -407,6 +1006,37 @@ def test_state_manager_close():
         return True
 
 
+def test_state_manager_batched_commits():
+    """Test StateManager defers commits inside batched() and flushes on close."""
+    import tempfile
+    import os
+    import sqlite3
+    from executor import StateManager
+    
+    def session_count(db_path):
+        with sqlite3.connect(db_path) as other:
+            return other.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "test.db")
+        manager = StateManager(db_path=db_path, batch_ms=60000)
+        
+        with manager.batched():
+            manager.create_session("batched", {}, {}, {"steps": []})
+            assert session_count(db_path) == 0, "Commit should wait for the batch to exit"
+        assert session_count(db_path) == 1
+        
+        # Inside the batch window the commit is left to the timer...
+        manager.create_session("deferred", {}, {}, {"steps": []})
+        assert session_count(db_path) == 1
+        # ...and close() must not lose it
+        manager.close()
+        assert session_count(db_path) == 2
+    
+    print("✓ StateManager batched commits OK")
+    return True
+
+
 def test_web_config_stop():
     """Test WebConfigServer stop method."""
     from web_config import WebConfigServer
@@ -420,6 +1050,18 @@ def test_web_config_stop():
         # Should not raise even with None thread
         server.stop()
         
+        # Before serve_forever() starts, shutdown() would block forever
+        from unittest import mock
+        server = WebConfigServer(port=0, config_file="unused.json")
+        http_server = server._http_server = mock.Mock()
+        server.stop()
+        assert not http_server.shutdown.called and http_server.server_close.called
+        
+        http_server = server._http_server = mock.Mock()
+        server._serving.set()
+        server.stop()
+        assert http_server.shutdown.called and server._http_server is None
+        
         print("✓ WebConfigServer stop method OK")
         return True
     except Exception as e:
@@ -427,6 +1069,21 @@ def test_web_config_stop():
         return False
 
 
+def test_web_config_ready_event():
+    """Test wait_for_config wakes on the config_ready event."""
+    from web_config import WebConfigServer
+    
+    server = WebConfigServer(port=0, config_file="unused.json")
+    assert server.wait_for_config(timeout=0) is None
+    
+    server.config_data = {"use_cases": ["media"]}
+    server.config_ready.set()
+    assert server.wait_for_config(timeout=0) == {"use_cases": ["media"]}
+    
+    print("✓ WebConfigServer ready event OK")
+    return True
+
+
 def test_ai_provider_imports():
     """Test ai_provider module imports."""
     try:
@@ -556,6 +1213,489 @@ def test_service_status_dataclass():
     return True
 
 
+def test_service_monitor_parallel_checks():
+    """Test ServiceMonitor runs per-service checks concurrently."""
+    import time
+    from monitoring_dashboard import ServiceMonitor, ServiceStatus
+    
+    class SlowMonitor(ServiceMonitor):
+        def _check_service(self, name, config, now=None):
+            time.sleep(0.2)
+            return ServiceStatus(name=name, installed=True, running=True, healthy=True,
+                                 version=None, ports=[], uptime_seconds=None,
+                                 last_check=now)
+    
+    monitor = SlowMonitor()
+    start = time.monotonic()
+    statuses = monitor.get_all_statuses()
+    elapsed = time.monotonic() - start
+    
+    assert set(statuses) == set(ServiceMonitor.SERVICES)
+    assert elapsed < 0.2 * len(ServiceMonitor.SERVICES) / 2, f"Checks ran serially ({elapsed:.2f}s)"
+    assert list(statuses) == list(ServiceMonitor.SERVICES), "Statuses should keep SERVICES order"
+    assert len({status.last_check for status in statuses.values()}) == 1, "One timestamp per refresh"
+    assert statuses['docker'].last_check == monitor.last_update
+    print("✓ ServiceMonitor parallel checks OK")
+    return True
+
+
+def test_service_monitor_docker_snapshot():
+    """Test container state comes from docker ps, inspecting only new containers."""
+    import subprocess
+    from unittest import mock
+    from monitoring_dashboard import ServiceMonitor
+    
+    ps_output = json.dumps({
+        "ID": "abc123", "Names": "jellyfin", "State": "running",
+        "Image": "jellyfin/jellyfin:10.8.13",
+    }) + "\n"
+    # PID 1 stands in for the container's main process
+    inspect_output = json.dumps({
+        "Id": "abc123", "Name": "/jellyfin",
+        "State": {"Running": True, "Pid": 1, "StartedAt": "2024-01-01T00:00:00Z"},
+    }) + "\n"
+    docker_calls = []
+    
+    def fake_run(cmd, **kwargs):
+        if cmd[:2] == ['docker', 'ps']:
+            docker_calls.append(cmd)
+            return subprocess.CompletedProcess(cmd, 0, ps_output, "")
+        if cmd[:2] == ['docker', 'inspect']:
+            docker_calls.append(cmd)
+            return subprocess.CompletedProcess(cmd, 0, inspect_output, "")
+        return subprocess.CompletedProcess(cmd, 1, "", "")
+    
+    monitor = ServiceMonitor()
+    with mock.patch('monitoring_dashboard.subprocess.run', side_effect=fake_run), \
+         mock.patch.object(ServiceMonitor, '_health_check', return_value=(True, None)):
+        statuses = monitor.get_all_statuses()
+        assert len(docker_calls) == 2, f"Expected ps + inspect, got {len(docker_calls)}"
+        assert docker_calls[1][-1] == 'jellyfin'
+        
+        # Same container, same process: no second inspect
+        docker_calls.clear()
+        monitor.get_all_statuses(force=True)
+        assert len(docker_calls) == 1, f"Expected only docker ps, got {docker_calls}"
+    
+    jellyfin = statuses['jellyfin']
+    assert jellyfin.installed and jellyfin.running
+    assert jellyfin.version == "jellyfin/jellyfin:10.8.13"
+    assert jellyfin.uptime_seconds and jellyfin.uptime_seconds > 0
+    assert not statuses['adguard'].installed
+    print("✓ ServiceMonitor docker snapshot OK")
+    return True
+
+
+def test_service_monitor_health_check_session():
+    """Test health checks reuse one pooled HTTP session."""
+    from unittest import mock
+    from monitoring_dashboard import ServiceMonitor, ServiceConfig
+    
+    fake_requests = mock.MagicMock()
+    fake_requests.RequestException = OSError
+    session = fake_requests.Session.return_value
+    config = ServiceConfig(check_cmd=('docker', 'ps'), health_url='http://localhost:8096')
+    
+    monitor = ServiceMonitor()
+    with mock.patch('monitoring_dashboard.requests', fake_requests), \
+         mock.patch('monitoring_dashboard.HTTPAdapter'):
+        session.head.return_value = mock.Mock(status_code=302)
+        assert monitor._health_check(config) == (True, None)
+        session.head.return_value = mock.Mock(status_code=503)
+        assert monitor._health_check(config) == (False, "HTTP 503")
+        session.head.side_effect = OSError("connection refused")
+        assert monitor._health_check(config) == (False, "connection refused")
+    
+    assert fake_requests.Session.call_count == 1, "Session should be created once"
+    print("✓ ServiceMonitor health check session OK")
+    return True
+
+
+def test_service_monitor_systemd_dbus():
+    """Test systemd state is read over D-Bus when pystemd is available."""
+    import time
+    from unittest import mock
+    from monitoring_dashboard import ServiceMonitor
+    
+    fake_unit_cls = mock.Mock()
+    unit = fake_unit_cls.return_value
+    unit.Unit.ActiveState = b'active'
+    unit.Unit.ActiveEnterTimestamp = int((time.time() - 120) * 1_000_000)
+    config = ServiceMonitor.SERVICES['docker']
+    
+    monitor = ServiceMonitor()
+    with mock.patch('monitoring_dashboard.SystemdUnit', fake_unit_cls), \
+         mock.patch('monitoring_dashboard.subprocess.run') as run:
+        assert monitor._is_running('docker', config)
+        assert 119 <= monitor._get_uptime(config) <= 121
+        run.assert_not_called()
+    
+    fake_unit_cls.assert_called_once_with(b'docker.service')
+    print("✓ ServiceMonitor systemd D-Bus OK")
+    return True
+
+
+def test_service_monitor_systemd_snapshot():
+    """Test systemd state comes from one systemctl call without pystemd."""
+    import time
+    from unittest import mock
+    from monitoring_dashboard import ServiceMonitor
+    
+    started_us = int((time.monotonic() - 300) * 1_000_000)
+    output = (
+        f"Id=tailscaled.service\nActiveState=active\nActiveEnterTimestampMonotonic={started_us}\n\n"
+        "Id=openclaw.service\nActiveState=inactive\nActiveEnterTimestampMonotonic=0\n\n"
+        f"Id=docker.service\nActiveState=active\nActiveEnterTimestampMonotonic={started_us}\n"
+    )
+    monitor = ServiceMonitor()
+    with mock.patch('monitoring_dashboard.SystemdUnit', None), \
+         mock.patch('monitoring_dashboard.subprocess.run',
+                    return_value=mock.Mock(returncode=0, stdout=output)) as run:
+        monitor._refresh_systemd_snapshot()
+        assert run.call_count == 1
+        assert run.call_args[0][0][-3:] == ['tailscaled.service', 'openclaw.service', 'docker.service']
+        
+        tailscale = ServiceMonitor.SERVICES['tailscale']
+        assert monitor._is_running('tailscale', tailscale)
+        assert 299 <= monitor._get_uptime(tailscale) <= 301
+        assert not monitor._is_running('openclaw', ServiceMonitor.SERVICES['openclaw'])
+        assert run.call_count == 1, "Reads should come from the snapshot"
+        
+        # Partial refresh keeps the other units
+        run.return_value = mock.Mock(returncode=0, stdout="Id=openclaw.service\nActiveState=active\n"
+                                                         "ActiveEnterTimestampMonotonic=0\n")
+        monitor._refresh_systemd_snapshot(['openclaw'])
+        assert monitor._systemd_state['openclaw'] == (True, None)
+        assert monitor._systemd_state['tailscaled'][0]
+    
+    print("✓ ServiceMonitor systemd snapshot OK")
+    return True
+
+
+def test_service_monitor_binary_checks():
+    """Test binary install checks use PATH lookups instead of subprocesses."""
+    from unittest import mock
+    from monitoring_dashboard import ServiceMonitor
+    
+    with mock.patch('monitoring_dashboard.shutil.which',
+                    side_effect=lambda b: '/usr/bin/tailscale' if b == 'tailscale' else None):
+        monitor = ServiceMonitor()
+    
+    with mock.patch('monitoring_dashboard.subprocess.run') as run:
+        assert monitor._is_installed(('tailscale', 'version'))
+        assert not monitor._is_installed(('which', 'openclaw'))
+        run.assert_not_called()
+    
+    assert ('docker', 'version') not in monitor._installed_binaries
+    print("✓ ServiceMonitor binary checks OK")
+    return True
+
+
+def test_service_monitor_stream_logs():
+    """Test stream_logs yields the log command's output in chunks."""
+    import time
+    from unittest import mock
+    from monitoring_dashboard import ServiceMonitor
+    
+    monitor = ServiceMonitor()
+    assert b"".join(monitor.stream_logs("nope")) == b"Unknown service: nope"
+    
+    with mock.patch.object(monitor, '_logs_command', return_value=(['printf', 'line1\\nline2\\n'], '')):
+        assert b"".join(monitor.stream_logs("jellyfin")) == b"line1\nline2\n"
+    
+    with mock.patch.object(monitor, '_logs_command', return_value=(['/nonexistent/logs'], '')):
+        assert b"".join(monitor.stream_logs("jellyfin")).startswith(b"Error getting logs")
+    
+    # Output arrives as it is produced, not once 8 KiB have accumulated
+    with mock.patch.object(monitor, '_logs_command', return_value=(['sh', '-c', 'echo first; sleep 30'], '')):
+        start = time.time()
+        stream = monitor.stream_logs("jellyfin", timeout=10)
+        assert next(stream) == b"first\n"
+        assert time.time() - start < 5
+        stream.close()
+    
+    # A hung log command is killed at the deadline
+    with mock.patch.object(monitor, '_logs_command', return_value=(['sleep', '30'], '')):
+        start = time.time()
+        assert b"".join(monitor.stream_logs("jellyfin", timeout=0.2)).endswith(b"[Timed out after 0.2s]\n")
+        assert time.time() - start < 5
+    
+    print("✓ ServiceMonitor stream logs OK")
+    return True
+
+
+def test_service_monitor_status_cache():
+    """Test statuses are served from cache within the TTL."""
+    from unittest import mock
+    from monitoring_dashboard import ServiceMonitor
+    
+    monitor = ServiceMonitor(cache_ttl=60)
+    with mock.patch.object(monitor, '_probe_all', return_value={'docker': mock.Mock()}) as probe:
+        monitor.get_all_statuses()
+        monitor.get_all_statuses()
+        assert probe.call_count == 1, "Second call should hit the cache"
+        monitor.get_all_statuses(force=True)
+        assert probe.call_count == 2, "force should bypass the cache"
+        
+        monitor.cache_ttl = 0
+        monitor.get_all_statuses()
+        assert probe.call_count == 3, "Expired cache should re-probe"
+    
+    print("✓ ServiceMonitor status cache OK")
+    return True
+
+
+def test_service_monitor_refresh_one():
+    """Test refresh_one re-probes a single service and updates the cache."""
+    from unittest import mock
+    from monitoring_dashboard import ServiceMonitor
+    
+    monitor = ServiceMonitor()
+    monitor.status_cache = {'docker': 'old', 'jellyfin': 'old'}
+    with mock.patch.object(monitor, '_check_service', return_value='new') as check, \
+         mock.patch.object(monitor, '_refresh_docker_snapshot') as snapshot:
+        assert monitor.refresh_one('jellyfin') == 'new'
+        check.assert_called_once_with('jellyfin', ServiceMonitor.SERVICES['jellyfin'])
+        snapshot.assert_called_once()
+        
+        monitor.refresh_one('docker')
+        assert snapshot.call_count == 1, "Non-container services don't need the docker snapshot"
+        assert monitor.refresh_one('nope') is None
+    
+    assert monitor.status_cache == {'docker': 'new', 'jellyfin': 'new'}
+    print("✓ ServiceMonitor refresh_one OK")
+    return True
+
+
+def test_service_monitor_control_validation():
+    """Test control_service rejects bad input before spawning anything."""
+    from unittest import mock
+    from monitoring_dashboard import ServiceMonitor
+    
+    monitor = ServiceMonitor()
+    with mock.patch('monitoring_dashboard.subprocess.run') as run:
+        assert monitor.control_service('nope', 'start') == (False, "Unknown service: nope")
+        assert monitor.control_service('jellyfin', 'kill') == (False, "Invalid action: kill")
+        run.assert_not_called()
+        
+        run.return_value = mock.Mock(returncode=0, stderr='')
+        assert monitor.control_service('jellyfin', 'restart')[0]
+        run.assert_called_once()
+        assert run.call_args[0][0] == ['docker', 'restart', 'jellyfin']
+    
+    print("✓ ServiceMonitor control validation OK")
+    return True
+
+
+def test_event_broadcaster():
+    """Test EventBroadcaster fans payloads out to subscribers."""
+    from monitoring_dashboard import EventBroadcaster
+    
+    broadcaster = EventBroadcaster(keepalive=0.01)
+    first = broadcaster.subscribe()
+    second = broadcaster.subscribe()
+    
+    assert next(first) == ": keepalive\n\n", "Idle stream should send keepalives"
+    broadcaster.publish('{"n": 1}')
+    assert next(first) == 'data: {"n": 1}\n\n'
+    assert next(second) == 'data: {"n": 1}\n\n'
+    
+    # Subscribers only see a payload once
+    assert next(first) == ": keepalive\n\n"
+    broadcaster.publish('{"n": 2}')
+    assert next(first) == 'data: {"n": 2}\n\n'
+    
+    # Open streams are counted until the server closes them
+    limited = EventBroadcaster(keepalive=0.01, max_subscribers=1)
+    stream = limited.subscribe()
+    assert not limited.full
+    next(stream)
+    assert limited.full
+    stream.close()
+    assert not limited.full
+    
+    print("✓ EventBroadcaster OK")
+    return True
+
+
+def test_metrics_history():
+    """Test MetricsHistory stores, queries and expires samples."""
+    import tempfile
+    import os
+    from monitoring_dashboard import MetricsHistory, SystemMetrics
+    
+    def sample(cpu):
+        return SystemMetrics(cpu_percent=cpu, cpu_count=4, ram_total_gb=16.0, ram_used_gb=8.0,
+                             ram_percent=50.0, disk_total_gb=100.0, disk_used_gb=25.0,
+                             disk_percent=25.0, load_average=(0.5, 0.6, 0.7),
+                             timestamp="2024-01-01T00:00:00")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        history = MetricsHistory(os.path.join(tmpdir, "metrics.db"), retention_seconds=100)
+        history.record(sample(10.0), ts=1000)
+        history.record(sample(20.0), ts=1050)
+        
+        rows = history.query(1000, 1100)
+        assert [r['cpu_percent'] for r in rows] == [10.0, 20.0]
+        assert rows[0] == {'ts': 1000, 'cpu_percent': 10.0, 'ram_percent': 50.0,
+                           'disk_percent': 25.0, 'load1': 0.5}
+        assert len(history.query(1001, 1100)) == 1
+        
+        # Cleanup runs on the first record after cleanup_interval
+        history.cleanup_interval = 0
+        history.record(sample(30.0), ts=1120)
+        assert [r['ts'] for r in history.query(0, 2000)] == [1050, 1120]
+        history.close()
+    
+    print("✓ MetricsHistory OK")
+    return True
+
+
+def test_dashboard_ttl_cache():
+    """Test MonitoringDashboard._cached reuses values within the TTL."""
+    import threading
+    from unittest import mock
+    from monitoring_dashboard import MonitoringDashboard
+    
+    # Bypass __init__, which needs Flask
+    dashboard = object.__new__(MonitoringDashboard)
+    dashboard._cache_lock = threading.Lock()
+    dashboard._value_cache = (0.0, None)
+    compute = mock.Mock(side_effect=[1, 2])
+    
+    with mock.patch('monitoring_dashboard.time.monotonic', side_effect=[100.0, 100.5, 102.0]):
+        assert dashboard._cached('_value_cache', compute) == 1
+        assert dashboard._cached('_value_cache', compute) == 1
+        assert dashboard._cached('_value_cache', compute) == 2
+    assert compute.call_count == 2
+    
+    print("✓ MonitoringDashboard TTL cache OK")
+    return True
+
+
+def test_dashboard_metrics_sampler():
+    """Test handlers read the background sampler's metrics instead of sampling."""
+    import threading
+    import time
+    from unittest import mock
+    from monitoring_dashboard import MonitoringDashboard
+    
+    dashboard = object.__new__(MonitoringDashboard)
+    dashboard.CACHE_TTL = 0.01
+    dashboard._cache_lock = threading.Lock()
+    dashboard._metrics_cache = (0.0, None)
+    dashboard._sampler = None
+    dashboard._stop_sampler = threading.Event()
+    dashboard.system_monitor = mock.Mock()
+    dashboard.system_monitor.get_metrics.side_effect = lambda: object()
+    
+    dashboard.start_sampler()
+    try:
+        first = dashboard._get_metrics()
+        deadline = time.time() + 2
+        while dashboard._get_metrics() is first and time.time() < deadline:
+            time.sleep(0.01)
+        assert dashboard._get_metrics() is not first, "Sampler should refresh the snapshot"
+    finally:
+        dashboard.stop_sampler()
+    
+    time.sleep(0.05)
+    dashboard._metrics_cache = (0.0, None)
+    calls = dashboard.system_monitor.get_metrics.call_count
+    for _ in range(5):
+        dashboard._get_metrics()
+    assert dashboard.system_monitor.get_metrics.call_count == calls + 1, "Falls back to the TTL cache"
+    
+    print("✓ MonitoringDashboard metrics sampler OK")
+    return True
+
+
+def test_dashboard_session_info():
+    """Test session info is read through one persistent read-only connection."""
+    import os
+    import sqlite3
+    import tempfile
+    import threading
+    from monitoring_dashboard import MonitoringDashboard
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "state.db")
+        dashboard = object.__new__(MonitoringDashboard)
+        dashboard.db_path = db_path
+        dashboard._cache_lock = threading.Lock()
+        dashboard._session_cache = (0.0, None)
+        dashboard._session_conn = None
+        assert dashboard._load_session_info() == {'status': 'no_database'}
+        
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE sessions (session_id TEXT, status TEXT, current_step INTEGER, "
+                     "created_at TEXT, updated_at TEXT)")
+        conn.execute("INSERT INTO sessions VALUES ('abc', 'running', 2, 't0', 't1')")
+        conn.commit()
+        conn.close()
+        
+        info = dashboard._get_session_info()
+        assert info['status'] == 'found' and info['session_id'] == 'abc'
+        session_conn = dashboard._session_conn
+        assert dashboard._load_session_info()['current_step'] == 2
+        assert dashboard._session_conn is session_conn, "Connection should be reused"
+        try:
+            session_conn.execute("DELETE FROM sessions")
+            assert False, "Connection should be read-only"
+        except sqlite3.OperationalError:
+            pass
+        session_conn.close()
+    
+    print("✓ MonitoringDashboard session info OK")
+    return True
+
+
+def test_services_etag():
+    """Test the services ETag only changes on visible status changes."""
+    from monitoring_dashboard import ServiceStatus, _services_payload
+    
+    def status(running=True, uptime=3600, last_check="2024-01-01T00:00:00"):
+        return {'ollama': ServiceStatus(name='ollama', installed=True, running=running, healthy=running,
+                                        version='0.1', ports=[11434], uptime_seconds=uptime,
+                                        last_check=last_check)}
+    
+    payload, etag = _services_payload(status())
+    assert payload['ollama']['uptime_seconds'] == 3600
+    assert etag.startswith('W/"')
+    assert _services_payload(status(uptime=3630, last_check="2024-01-01T00:00:30"))[1] == etag
+    assert _services_payload(status(uptime=3700))[1] != etag
+    assert _services_payload(status(running=False))[1] != etag
+    
+    print("✓ Services ETag OK")
+    return True
+
+
+def test_dashboard_html_variant():
+    """Test the index page encoding follows Accept-Encoding."""
+    import gzip
+    from unittest import mock
+    import monitoring_dashboard as md
+    
+    body, encoding = md._dashboard_html_variant('gzip, deflate')
+    assert encoding == 'gzip' and gzip.decompress(body) == md._DASHBOARD_HTML_BYTES
+    assert md._dashboard_html_variant('') == (md._DASHBOARD_HTML_BYTES, None)
+    assert md._dashboard_html_variant('identity')[1] is None
+    
+    with mock.patch.object(md, '_DASHBOARD_HTML_BR', b'br-body'):
+        assert md._dashboard_html_variant('gzip, deflate, br') == (b'br-body', 'br')
+        assert md._dashboard_html_variant('gzip')[1] == 'gzip'
+    with mock.patch.object(md, '_DASHBOARD_HTML_BR', None):
+        assert md._dashboard_html_variant('br, gzip')[1] == 'gzip', "Falls back without brotli"
+    
+    html = md._DASHBOARD_HTML_BYTES.decode('utf-8')
+    assert '<!--' not in html and '\n ' not in html
+    assert len(html) < len(md.DASHBOARD_HTML) and 'id="services"' in html
+    assert md._minify_html("<p>\n    <!-- note -->\n    // comment\n    x = 1;\n</p>") == "<p>\nx = 1;\n</p>"
+    
+    print("✓ Dashboard HTML encoding OK")
+    return True
+
+
 def test_system_metrics_dataclass():
     """Test SystemMetrics dataclass structure."""
     from monitoring_dashboard import SystemMetrics
@@ -577,10 +1717,35 @@ def test_system_metrics_dataclass():
     assert data['cpu_percent'] == 25.5
     assert data['cpu_count'] == 4
     assert data['ram_percent'] == 50.0
+    
+    dynamic = metrics.dynamic_dict()
+    assert 'cpu_count' not in dynamic and 'ram_total_gb' not in dynamic and 'disk_total_gb' not in dynamic
+    assert dynamic['ram_used_gb'] == 8.0
+    assert set(dynamic) | set(SystemMetrics.STATIC_FIELDS) == set(data)
     print("✓ SystemMetrics structure OK")
     return True
 
 
+def test_system_monitor_cpu_nonblocking():
+    """Test SystemMonitor samples CPU without a blocking interval."""
+    from unittest import mock
+    from monitoring_dashboard import SystemMonitor
+    
+    fake_psutil = mock.MagicMock()
+    fake_psutil.cpu_percent.return_value = 12.5
+    with mock.patch('monitoring_dashboard.psutil', fake_psutil):
+        monitor = SystemMonitor()
+        metrics = monitor.get_metrics()
+    
+    assert metrics.cpu_percent == 12.5
+    for call in fake_psutil.cpu_percent.call_args_list:
+        assert call.kwargs.get('interval') is None, f"Blocking CPU sample: {call}"
+    assert fake_psutil.cpu_percent.call_count == 2, "Expected prime + one read"
+    assert fake_psutil.cpu_count.call_count == 1, "cpu_count should be cached"
+    print("✓ SystemMonitor non-blocking CPU OK")
+    return True
+
+
 def test_update_info_dataclass():
     """Test UpdateInfo dataclass structure."""
     from update_checker import UpdateInfo
@@ -686,6 +1851,14 @@ def test_domain_config_dataclass():
     assert config.domain_name == "example.com"
     assert config.reverse_proxy == "caddy"
     assert config.use_tailscale_funnel is True
+    assert not hasattr(config, '__dict__'), "DomainConfig should use __slots__"
+    
+    from dataclasses import FrozenInstanceError
+    try:
+        config.enabled = False
+        assert False, "DomainConfig should be immutable"
+    except FrozenInstanceError:
+        pass
     print("✓ DomainConfig structure OK")
     return True
 
@@ -900,6 +2073,30 @@ def test_security_utils_csrf():
     return True
 
 
+def test_docker_run_port_protocols():
+    """Test docker run port mappings honour the protocol field."""
+    from security_utils import CommandBuilder, SecurityError
+    
+    cmd = CommandBuilder.build_docker_run(
+        image='example/image:1.0',
+        name='example',
+        ports=((53, 53, 'udp'), (53, 53, 'tcp'), (8080, 80)),
+        cap_drop=False
+    )
+    port_args = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == '-p']
+    assert port_args == ['53:53/udp', '53:53', '8080:80'], f"Unexpected ports: {port_args}"
+    
+    try:
+        CommandBuilder.build_docker_run(image='example/image:1.0', name='example',
+                                        ports=((53, 53, 'sctp'),))
+        assert False, "Unknown protocol should be rejected"
+    except SecurityError:
+        pass
+    
+    print("✓ Docker run port protocols OK")
+    return True
+
+
 def test_storage_device_dataclass():
     """Test StorageDevice dataclass structure."""
     from drive_detector import StorageDevice
@@ -1000,11 +2197,24 @@ def run_all_tests():
     tests = [
         test_hardware_detector_imports,
         test_interview_imports,
+        test_interview_domain_validation,
+        test_requirements_from_answers_dict,
+        test_requirements_to_dict,
         test_planner_imports,
+        test_plan_cache,
+        test_plan_single_flight,
+        test_plan_batch,
+        test_plan_multi_task_prompt,
+        test_plan_stream,
+        test_plan_async_concurrency,
         test_executor_imports,
         test_error_recovery_imports,
         test_web_config_imports,
         test_plan_step_structure,
+        test_parse_plan_validation,
+        test_template_plan_steps,
+        test_reverse_proxy_steps_copy,
+        test_reverse_proxy_configs,
         test_execution_result,
         test_command_validation,
         test_error_recovery_fallback,
@@ -1014,14 +2224,22 @@ def run_all_tests():
         test_retry_utils_imports,
         test_config_validator_imports,
         test_config_validation,
+        test_validate_requirements_schema,
         test_retry_backoff_calculation,
+        test_async_retry_backoff,
         test_storage_path_validation,
         test_main_module_imports,
+        test_buffered_log_handler,
         test_version_info,
+        test_hardware_cache,
         test_executor_empty_commands,
+        test_executor_precheck_skip,
+        test_executor_write_file_step,
         test_executor_dangerous_pattern_detection,
         test_state_manager_close,
+        test_state_manager_batched_commits,
         test_web_config_stop,
+        test_web_config_ready_event,
         test_ai_provider_imports,
         test_ai_provider_config,
         test_preflight_docker_check,
@@ -1030,7 +2248,25 @@ def run_all_tests():
         test_rollback_manager_imports,
         test_update_checker_imports,
         test_service_status_dataclass,
+        test_service_monitor_parallel_checks,
+        test_service_monitor_docker_snapshot,
+        test_service_monitor_health_check_session,
+        test_service_monitor_systemd_dbus,
+        test_service_monitor_systemd_snapshot,
+        test_service_monitor_binary_checks,
+        test_service_monitor_stream_logs,
+        test_service_monitor_status_cache,
+        test_service_monitor_refresh_one,
+        test_service_monitor_control_validation,
+        test_event_broadcaster,
+        test_metrics_history,
+        test_dashboard_ttl_cache,
+        test_dashboard_metrics_sampler,
+        test_dashboard_session_info,
+        test_services_etag,
+        test_dashboard_html_variant,
         test_system_metrics_dataclass,
+        test_system_monitor_cpu_nonblocking,
         test_update_info_dataclass,
         test_web_config_csrf,
         test_sanitization_patterns_precompiled,
@@ -1053,6 +2289,7 @@ def run_all_tests():
         test_security_utils_path_validation,
         test_security_utils_domain_validation,
         test_security_utils_csrf,
+        test_docker_run_port_protocols,
         # New tests for FileBrowser
         test_filebrowser_install_procedure,
     ]
@@ -4,18 +4,20 @@ Simple Flask server for initial configuration with intuitive UI.
 SECURITY: CSRF protection, input validation, security headers
 """
 import json
-import os
 import secrets
 import hashlib
+import threading
 from pathlib import Path
 try:
     from flask import Flask, render_template_string, request, jsonify, g
+    from werkzeug.serving import make_server
 except ImportError:
     Flask = None
     render_template_string = None
     request = None
     jsonify = None
     g = None
+    make_server = None
 
 
 # Apple-inspired HTML Template (unchanged)
@@ -807,6 +809,12 @@ class WebConfigServer:
         self.port = port
         self.config_file = config_file
         self.config_data = None
+        # Set by the /save route so waiters wake immediately instead of polling
+        self.config_ready = threading.Event()
+        self._http_server = None
+        # Set by run() right before serve_forever(); shutdown() would block
+        # forever on a server that never started serving
+        self._serving = threading.Event()
         self.app = Flask(__name__) if Flask else None
         self._secret_key = secrets.token_hex(32)
         self._csrf_token = None
@@ -879,6 +887,7 @@ class WebConfigServer:
                 
                 with open(self.config_file, "w") as f:
                     json.dump(self.config_data, f, indent=2)
+                self.config_ready.set()
                 return jsonify({"status": "ok"})
             except Exception as e:
                 return jsonify({"status": "error", "message": str(e)}), 500
@@ -932,32 +941,35 @@ class WebConfigServer:
             return False
         
         print(f"Starting web config server on http://localhost:{self.port}")
-        self.app.run(host="0.0.0.0", port=self.port, debug=debug)
+        self.app.debug = debug
+        # A werkzeug server object (rather than app.run) can be shut down from stop()
+        http_server = make_server("0.0.0.0", self.port, self.app, threaded=True)
+        self._http_server = http_server
+        self._serving.set()
+        http_server.serve_forever()
         return True
     
     def wait_for_config(self, timeout=300):
         """Wait for configuration to be saved."""
-        import time
-        start = time.time()
-        
         print(f"\nWaiting for configuration...")
         print(f"Please complete the setup in your browser")
         print(f"(Timeout: {timeout}s)\n")
         
-        while time.time() - start < timeout:
-            if self.config_data or os.path.exists(self.config_file):
-                if os.path.exists(self.config_file):
-                    with open(self.config_file, "r") as f:
-                        self.config_data = json.load(f)
-                print("\n✅ Configuration received!")
-                return self.config_data
-            time.sleep(1)
+        if self.config_ready.wait(timeout):
+            print("\n✅ Configuration received!")
+            return self.config_data
         
         print("\n⏱️  Timeout waiting for configuration")
         return None
     
     def stop(self):
-        pass
+        """Shut down the HTTP server and release its socket."""
+        http_server = getattr(self, '_http_server', None)
+        if http_server:
+            self._http_server = None
+            if self._serving.is_set():
+                http_server.shutdown()
+            http_server.server_close()
 
 
 def start_web_config(port=8080, config_file="config.json"):